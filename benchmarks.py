@@ -0,0 +1,463 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE BENCHMARK SUITE
+##############################################################################
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import statistics
+import itertools
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+import numpy as np
+import phase_1 as fp1  # IMPORTED MODULE FROM THE PHASE 1 OF THIS ICA
+import phase_2 as fp2  # IMPORTED MODULE FROM THE PHASE 2 OF THIS ICA
+from db_connections import close_connections, connect, get_connection
+from open_meteo_client import configure_archive_client
+from phase_3 import retrieve_and_store_weather_data
+from query_cache import query_result_cache
+from synthetic_db import generate_database
+from weather_catalog import WeatherCatalog
+from weather_series import load_weather_series
+
+
+############################################
+# DEFAULT BENCHMARK SETTINGS
+############################################
+DEFAULT_DB_PATH = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
+DEFAULT_RESULTS_DIR = "benchmark_results"
+DEFAULT_REPEATS = 5
+
+# Number of days saved by every run of retrieve_and_store_weather_data
+STORE_BENCHMARK_DAYS = 365
+
+# A benchmark is reported as a regression when its median time grows by more than this ratio
+DEFAULT_REGRESSION_RATIO = 1.25
+
+# Medians below this number of seconds are too noisy to be reported as regressions
+MIN_REGRESSION_SECONDS = 0.001
+
+BENCHMARK_GROUPS = ("phase_1", "phase_2", "phase_3")
+
+
+##############################################################################
+# STUBBED OPEN-METEO API - ANSWERS EVERY REQUEST WITHOUT NETWORK ACCESS
+##############################################################################
+class StubArchiveResponse:
+    """
+    HTTP 200 response of the stubbed archive API, with the attributes read by open_meteo_client.
+    """
+
+    def __init__(self, text):
+        self.status_code = 200
+        self.text = text
+        self.headers = {}
+
+
+class StubArchiveSession:
+    """
+    Session answering the archive requests of open_meteo_client with generated daily weather, so that
+    the client, the JSON decoding and the database writes are timed without the network.
+    """
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.requests = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.requests += 1
+        first_day = date.fromisoformat(params["start_date"])
+        days = (date.fromisoformat(params["end_date"]) - first_day).days + 1
+        daily = {"time": [(first_day + timedelta(days=day)).isoformat() for day in range(days)]}
+        for variable in params["daily"].split(","):
+            daily[variable] = np.round(self.rng.uniform(-5.0, 30.0, days), 1).tolist()
+        return StubArchiveResponse(json.dumps({
+            "latitude": params["latitude"], "longitude": params["longitude"], "timezone": params["timezone"],
+            "daily": daily,
+        }))
+
+
+##############################################################################
+# FUNCTIONS TO TIME THE BENCHMARKS
+##############################################################################
+def consume(result):
+    """
+    Reads a query result to the end and returns its number of rows, so the timing includes the fetches.
+    """
+    if result is None:
+        raise RuntimeError("The function returned no result.")
+    if isinstance(result, int):
+        return result
+    if hasattr(result, "fetchall"):
+        return len(result.fetchall())
+    if hasattr(result, "__len__"):
+        return len(result)
+    return None
+
+
+def time_benchmark(function, repeats=DEFAULT_REPEATS, setup=None):
+    """
+    Runs a function several times and measures every run.
+
+    Args:
+        function (callable): Function taking no arguments, returning its result or its number of rows.
+        repeats (int): Number of timed runs.
+        setup (callable, optional): Called before every run, outside of the timing.
+
+    Returns:
+        dict: "runs" (seconds of every run), "min_seconds", "median_seconds", "mean_seconds", "max_seconds"
+        and "rows" (number of rows of the last run, or None).
+    """
+    runs = []
+    rows = None
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        run_start = time.perf_counter()
+        rows = consume(function())
+        runs.append(time.perf_counter() - run_start)
+    return {"runs": runs, "min_seconds": min(runs), "median_seconds": statistics.median(runs),
+            "mean_seconds": statistics.fmean(runs), "max_seconds": max(runs), "rows": rows}
+
+
+def uncached(query_function):
+    """
+    Returns a phase 1 query function without its result cache (see query_cache).
+    """
+    return getattr(query_function, "__wrapped__", query_function)
+
+
+def describe_database(connection):
+    """
+    Returns the size of a database and the scope used by the benchmarks: a city, a year and date ranges.
+
+    Raises:
+        ValueError: If the database holds no daily weather.
+    """
+    row = connection.execute("""
+    SELECT COUNT(*), substr(MIN(date), 1, 10), substr(MAX(date), 1, 10) FROM daily_weather_entries;
+    """).fetchone()
+    if not row[0]:
+        raise ValueError("The database holds no daily weather.")
+    rows, first_date, last_date = row
+    city_id = connection.execute("SELECT MIN(id) FROM cities;").fetchone()[0]
+    years = fp1.db_distinct_years(connection)
+    year = years[len(years) // 2]
+    return {
+        "cities": connection.execute("SELECT COUNT(*) FROM cities;").fetchone()[0],
+        "rows": rows, "first_date": first_date, "last_date": last_date, "years": len(years),
+        "city_id": city_id, "year": year, "first_year": years[0], "last_year": years[-1],
+        "year_from": f"{year}-01-01", "year_to": f"{year}-12-31",
+    }
+
+
+##############################################################################
+# BENCHMARKS OF EVERY QUERY AND PLOT PATH
+##############################################################################
+def phase_1_benchmarks(connection, scope):
+    """
+    Returns the (name, function, setup) of the phase 1 queries, run without the result cache.
+    """
+    city_id, year = scope["city_id"], scope["year"]
+    first_year, last_year = scope["first_year"], scope["last_year"]
+    year_from, year_to = scope["year_from"], scope["year_to"]
+    return [
+        ("select_all_countries", lambda: uncached(fp1.select_all_countries)(connection), None),
+        ("select_all_cities", lambda: uncached(fp1.select_all_cities)(connection), None),
+        ("db_distinct_years", lambda: fp1.db_distinct_years(connection), None),
+        ("average_annual_temperature",
+         lambda: uncached(fp1.average_annual_temperature)(connection, city_id, year), None),
+        ("average_annual_temperature_by_year_range",
+         lambda: uncached(fp1.average_annual_temperature_by_year_range)(connection, city_id, first_year, last_year), None),
+        ("average_annual_temperature_by_city_and_year",
+         lambda: uncached(fp1.average_annual_temperature_by_city_and_year)(connection, first_year, last_year), None),
+        ("average_seven_day_precipitation",
+         lambda: uncached(fp1.average_seven_day_precipitation)(connection, city_id, year_from), None),
+        ("average_seven_day_precipitation_all_cities",
+         lambda: uncached(fp1.average_seven_day_precipitation_all_cities)(connection, year_from), None),
+        ("rolling_window_averages",
+         lambda: uncached(fp1.rolling_window_averages)(connection, city_id, year_from, year_to), None),
+        ("average_mean_temp_by_city",
+         lambda: uncached(fp1.average_mean_temp_by_city)(connection, year_from, year_to), None),
+        ("average_mean_temp_by_city (cached)",
+         lambda: fp1.average_mean_temp_by_city(connection, year_from, year_to), None),
+        ("average_annual_precipitation_by_country",
+         lambda: uncached(fp1.average_annual_precipitation_by_country)(connection, year), None),
+        ("average_annual_precipitation_by_country_and_year_range",
+         lambda: uncached(fp1.average_annual_precipitation_by_country_and_year_range)(connection, first_year, last_year),
+         None),
+    ]
+
+
+def load_catalog(connection):
+    catalog = WeatherCatalog()
+    catalog.load(connection)
+    return len(catalog.dates)
+
+
+def phase_2_benchmarks(connection, scope):
+    """
+    Returns the (name, function, setup) of the data preparation of the phase 2 plots, run with an empty
+    result cache.
+    """
+    city_ids = [row[0] for row in connection.execute("SELECT id FROM cities ORDER BY id;")]
+    years = fp1.db_distinct_years(connection)
+    city_id, first_date, last_date = scope["city_id"], scope["first_date"], scope["last_date"]
+    year_from, year_to = scope["year_from"], scope["year_to"]
+    return [
+        ("catalog load", lambda: load_catalog(connection), None),
+        ("plot 1: calculate_annual_temperatures",
+         lambda: fp2.calculate_annual_temperatures(connection, city_ids, years)["city_annual_temperature"],
+         query_result_cache.clear),
+        ("plot 2: get_mean_temperature_data",
+         lambda: fp2.get_mean_temperature_data(connection, year_from, year_to), query_result_cache.clear),
+        ("plot 3: get_precipitation_averages",
+         lambda: fp2.get_precipitation_averages(connection, city_ids, year_from)[1], query_result_cache.clear),
+        ("plots 4-6: temp_n_prep_by_city (one year)",
+         lambda: fp2.temp_n_prep_by_city(connection, city_id, year_from, year_to), None),
+        ("plots 4-6: temp_n_prep_by_city (whole range)",
+         lambda: fp2.temp_n_prep_by_city(connection, city_id, first_date, last_date), None),
+        ("plots 4-6: load_weather_series from SQL (whole range)",
+         lambda: load_weather_series(connection, city_id, first_date, last_date), None),
+    ]
+
+
+def phase_3_benchmarks(db_path):
+    """
+    Returns the (name, function, setup) of retrieve_and_store_weather_data against the stubbed API, saving
+    STORE_BENCHMARK_DAYS days of a new city and then the same days again.
+    """
+    run_numbers = itertools.count()
+    city_details = {"latitude": 51.5, "longitude": -0.12, "country": "Benchmark Country", "timezone": "Europe/London"}
+    last_day = date(2000, 1, 1) + timedelta(days=STORE_BENCHMARK_DAYS - 1)
+
+    def store(city_name):
+        saved_rows = []
+        with redirect_stdout(io.StringIO()):
+            retrieve_and_store_weather_data(city_name, city_details, db_path, "2000-01-01", last_day.isoformat(),
+                                            progress_callback=lambda *chunk: saved_rows.append(chunk[-1]))
+        if not saved_rows:
+            raise RuntimeError(f"retrieve_and_store_weather_data saved nothing for {city_name}.")
+        return sum(saved_rows)
+
+    return [
+        (f"retrieve_and_store_weather_data (new city, {STORE_BENCHMARK_DAYS} days)",
+         lambda: store(f"Benchmark City {next(run_numbers)}"), None),
+        (f"retrieve_and_store_weather_data (stored days, {STORE_BENCHMARK_DAYS} days)",
+         lambda: store("Benchmark City 0"), None),
+    ]
+
+
+def run_benchmarks(db_path, repeats=DEFAULT_REPEATS, groups=BENCHMARK_GROUPS, progress_callback=None):
+    """
+    Runs the benchmarks of the phase 1 queries, the phase 2 data preparation and the phase 3 storage.
+
+    The phase 3 benchmarks write to a copy of the database in a temporary directory, so the benchmarked
+    database is never changed.
+
+    Args:
+        db_path (str): Path to the SQLite database file, initialized by phase 3.
+        repeats (int): Number of timed runs of every benchmark.
+        groups (iterable): Groups to run, from BENCHMARK_GROUPS.
+        progress_callback (callable, optional): Called after every benchmark with its result.
+
+    Returns:
+        dict: "database" (size and scope of the database) and "results" (one dictionary per benchmark, with
+        its "group", "name" and timings, or its "error").
+    """
+    connection = get_connection(db_path, read_only=True)
+    scope = describe_database(connection)
+    benchmarks = []
+    if "phase_1" in groups:
+        benchmarks += [("phase_1",) + benchmark for benchmark in phase_1_benchmarks(connection, scope)]
+    if "phase_2" in groups:
+        benchmarks += [("phase_2",) + benchmark for benchmark in phase_2_benchmarks(connection, scope)]
+
+    copy_dir = None
+    if "phase_3" in groups:
+        copy_dir = tempfile.mkdtemp(prefix="weather-benchmark-")
+        copy_path = os.path.join(copy_dir, os.path.basename(db_path))
+        copy_connection = connect(copy_path)
+        connection.backup(copy_connection)
+        copy_connection.close()
+        configure_archive_client(session=StubArchiveSession(), max_retries=0)
+        benchmarks += [("phase_3",) + benchmark for benchmark in phase_3_benchmarks(copy_path)]
+
+    results = []
+    try:
+        for group, name, function, setup in benchmarks:
+            result = {"group": group, "name": name}
+            try:
+                result.update(time_benchmark(function, repeats, setup))
+            except (sqlite3.Error, RuntimeError, ValueError) as ex:
+                result["error"] = str(ex)
+            results.append(result)
+            if progress_callback:
+                progress_callback(result)
+    finally:
+        if copy_dir is not None:
+            configure_archive_client()
+            close_connections()
+            shutil.rmtree(copy_dir, ignore_errors=True)
+
+    return {"database": scope, "results": results}
+
+
+##############################################################################
+# FUNCTIONS TO SAVE AND COMPARE THE RESULTS
+##############################################################################
+def git_commit():
+    """
+    Returns the current git commit of the project, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(benchmark_run, results_path):
+    """
+    Writes the results of a run, with the environment they were measured in, to a JSON file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as results_file:
+        json.dump(benchmark_run, results_file, indent=2)
+
+
+def compare_results(baseline_run, benchmark_run, regression_ratio=DEFAULT_REGRESSION_RATIO):
+    """
+    Compares the median times of two runs, benchmark by benchmark. Medians under MIN_REGRESSION_SECONDS
+    are never reported as regressions.
+
+    Returns:
+        list: (name, baseline median, current median, ratio, regression) of the benchmarks found in both runs.
+    """
+    baseline_medians = {}
+    for result in baseline_run["results"]:
+        if "median_seconds" in result:
+            baseline_medians[(result["group"], result["name"])] = result["median_seconds"]
+
+    comparisons = []
+    for result in benchmark_run["results"]:
+        baseline_median = baseline_medians.get((result["group"], result["name"]))
+        if baseline_median is None or "median_seconds" not in result:
+            continue
+        ratio = result["median_seconds"] / baseline_median if baseline_median else float("inf")
+        regression = ratio > regression_ratio and result["median_seconds"] >= MIN_REGRESSION_SECONDS
+        comparisons.append((result["name"], baseline_median, result["median_seconds"], ratio, regression))
+    return comparisons
+
+
+def print_benchmark_result(result):
+    if "error" in result:
+        print(f"{result['group']:<8} {result['name']:<62} FAILED: {result['error']}")
+        return
+    rows = "" if result["rows"] is None else result["rows"]
+    print(f"{result['group']:<8} {result['name']:<62} {result['median_seconds'] * 1000:>10.2f} ms "
+          f"(min {result['min_seconds'] * 1000:.2f} ms) {rows:>8}")
+
+
+#################################################################
+# BENCHMARK COMMAND - REFERENCED AS MAIN
+#################################################################
+def main(argv=None):
+    """
+    Runs the benchmarks and saves their results, for example:
+
+        python benchmarks.py --db db/synthetic-1k-50y.db --repeats 10
+        python benchmarks.py --generate-cities 50 --generate-years 20 --compare benchmark_results/baseline.json
+
+    Returns:
+        int: The exit status, 0 on success and 1 on an error or a regression.
+    """
+    parser = argparse.ArgumentParser(description="Time every phase 1 query, the phase 2 data preparation and the "
+                                                 "phase 3 storage, and save the results as JSON.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="path to the SQLite database")
+    parser.add_argument("--generate-cities", type=int,
+                        help="benchmark a synthetic database of this number of cities instead of --db")
+    parser.add_argument("--generate-years", type=int, default=10, help="years per city of the synthetic database (default: 10)")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                        help=f"timed runs of every benchmark (default: {DEFAULT_REPEATS})")
+    parser.add_argument("--groups", nargs="+", choices=BENCHMARK_GROUPS, default=list(BENCHMARK_GROUPS),
+                        help="benchmark groups to run (default: all)")
+    parser.add_argument("--output", help=f"JSON file of the results (default: a new file in {DEFAULT_RESULTS_DIR})")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--regression-ratio", type=float, default=DEFAULT_REGRESSION_RATIO,
+                        help=f"median time ratio reported as a regression (default: {DEFAULT_REGRESSION_RATIO})")
+    args = parser.parse_args(argv)
+
+    if args.repeats < 1:
+        print("At least one run is required.", file=sys.stderr)
+        return 1
+
+    generated_dir = None
+    db_path = args.db
+    try:
+        if args.generate_cities:
+            generated_dir = tempfile.mkdtemp(prefix="weather-synthetic-")
+            db_path = os.path.join(generated_dir, "synthetic.db")
+            print(f"Generating {args.generate_cities} cities x {args.generate_years} years...")
+            with redirect_stdout(io.StringIO()):
+                generate_database(db_path, args.generate_cities, args.generate_years)
+        elif not os.path.exists(db_path):
+            print(f"Database not found: {db_path}", file=sys.stderr)
+            return 1
+
+        benchmark_run = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "database_path": os.path.abspath(db_path) if generated_dir is None else None,
+            "synthetic": {"cities": args.generate_cities, "years": args.generate_years} if generated_dir else None,
+            "repeats": args.repeats,
+        }
+        benchmark_run.update(run_benchmarks(db_path, args.repeats, args.groups, print_benchmark_result))
+    except (ValueError, sqlite3.Error) as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    finally:
+        close_connections()
+        if generated_dir is not None:
+            shutil.rmtree(generated_dir, ignore_errors=True)
+
+    results_path = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"benchmark-{benchmark_run['commit'] or 'local'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    save_results(benchmark_run, results_path)
+    print(f"\nResults saved to {results_path}")
+
+    status = 1 if any("error" in result for result in benchmark_run["results"]) else 0
+    if args.compare:
+        try:
+            with open(args.compare, encoding="utf-8") as baseline_file:
+                baseline_run = json.load(baseline_file)
+        except (OSError, ValueError) as ex:
+            print(f"The baseline could not be read: {ex}", file=sys.stderr)
+            return 1
+        print(f"\nCompared with {args.compare} (commit {baseline_run.get('commit')}):")
+        if baseline_run.get("database") != benchmark_run["database"]:
+            print("Warning: the baseline was measured on another database, the times may not be comparable.")
+        for name, baseline_median, median, ratio, regression in compare_results(baseline_run, benchmark_run,
+                                                                                 args.regression_ratio):
+            print(f"{name:<71} {baseline_median * 1000:>10.2f} ms -> {median * 1000:>10.2f} ms "
+                  f"x{ratio:.2f}{'  REGRESSION' if regression else ''}")
+            if regression:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE SHARED SQLITE CONNECTIONS
+##############################################################################
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+from query_instrumentation import InstrumentedConnection, instrument_connection, instrumentation_enabled
+
+
+############################################
+# DEFAULT CONNECTION SETTINGS
+############################################
+# WAL lets the readers (queries and plots) work while the ingestion writer commits.
+# A negative cache_size is in KiB, so -65536 is a 64 MiB page cache.
+DEFAULT_PRAGMAS = {
+    "busy_timeout": 5000,
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+# journal_mode and synchronous change how the database is written, so they are not set on read-only connections
+WRITE_ONLY_PRAGMAS = ("journal_mode", "synchronous")
+
+# Number of prepared statements kept by each connection (the sqlite3 default is 128)
+DEFAULT_CACHED_STATEMENTS = 512
+
+# One dictionary of open connections per thread, keyed by (absolute database path, read_only)
+_thread_connections = threading.local()
+
+
+def configure_pragmas(**pragmas):
+    """
+    Changes the PRAGMAs applied to the connections opened from now on.
+
+    Args:
+        **pragmas: PRAGMA names and values, for example cache_size=-131072. A value of None removes the PRAGMA.
+    """
+    for pragma_name, pragma_value in pragmas.items():
+        if pragma_value is None:
+            DEFAULT_PRAGMAS.pop(pragma_name, None)
+        else:
+            DEFAULT_PRAGMAS[pragma_name] = pragma_value
+
+
+##############################################################################
+# FUNCTIONS TO OPEN AND SHARE THE CONNECTIONS
+##############################################################################
+def connect(db_path, read_only=False, pragmas=None, row_factory=sqlite3.Row, isolation_level="",
+            cached_statements=DEFAULT_CACHED_STATEMENTS):
+    """
+    Opens a new connection to the SQLite database with the tuned PRAGMAs applied.
+
+    When the WEATHER_DB_INSTRUMENT environment variable is set to 1, the connection times its statements
+    and captures their query plans (see query_instrumentation).
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        read_only (bool): Opens the database in read-only mode. The database file must exist.
+        pragmas (dict, optional): PRAGMAs applied over DEFAULT_PRAGMAS.
+        row_factory: Row factory of the connection, sqlite3.Row by default.
+        isolation_level (str): Isolation level of the connection. None lets the caller manage the transactions.
+        cached_statements (int): Number of prepared statements kept by the connection.
+
+    Returns:
+        sqlite3.Connection: The new connection.
+
+    Raises:
+        sqlite3.OperationalError: If the database cannot be opened.
+    """
+    instrumented = instrumentation_enabled()
+    factory = InstrumentedConnection if instrumented else sqlite3.Connection
+    if read_only:
+        database_uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+        connection = sqlite3.connect(database_uri, uri=True, isolation_level=isolation_level,
+                                     cached_statements=cached_statements, factory=factory)
+    else:
+        connection = sqlite3.connect(db_path, isolation_level=isolation_level, cached_statements=cached_statements,
+                                     factory=factory)
+    if instrumented:
+        instrument_connection(connection)
+    connection.row_factory = row_factory
+
+    connection_pragmas = dict(DEFAULT_PRAGMAS)
+    connection_pragmas.update(pragmas or {})
+    for pragma_name, pragma_value in connection_pragmas.items():
+        if read_only and pragma_name in WRITE_ONLY_PRAGMAS:
+            continue
+        connection.execute(f"PRAGMA {pragma_name} = {pragma_value};")
+    return connection
+
+
+def get_connection(db_path, read_only=False):
+    """
+    Returns the connection of the current thread to the SQLite database, opening it on the first call.
+
+    The connection is kept open and returned again by the next calls from the same thread, so that the
+    cost of opening it and its prepared statements are reused. A connection closed by its caller is
+    replaced by a new one.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        read_only (bool): Returns a read-only connection, for the query and plot code.
+
+    Returns:
+        sqlite3.Connection: The connection of the current thread, with sqlite3.Row as row factory.
+
+    Raises:
+        sqlite3.OperationalError: If the database cannot be opened.
+    """
+    connections = getattr(_thread_connections, "connections", None)
+    if connections is None:
+        connections = _thread_connections.connections = {}
+
+    connection_key = (os.path.abspath(db_path), read_only)
+    connection = connections.get(connection_key)
+    if connection is not None:
+        try:
+            connection.total_changes
+            return connection
+        except sqlite3.ProgrammingError:
+            # The connection was closed by its caller
+            pass
+
+    connection = connect(db_path, read_only=read_only)
+    connections[connection_key] = connection
+    return connection
+
+
+def close_connections():
+    """
+    Closes the connections of the current thread.
+    """
+    connections = getattr(_thread_connections, "connections", {})
+    for connection in connections.values():
+        try:
+            connection.close()
+        except sqlite3.ProgrammingError:
+            pass
+    connections.clear()
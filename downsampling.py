@@ -0,0 +1,62 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR DOWNSAMPLING THE PLOTTED SERIES
+##############################################################################
+import numpy as np
+
+
+##############################################################################
+# LARGEST-TRIANGLE-THREE-BUCKETS DOWNSAMPLING
+##############################################################################
+def lttb_indices(x, y, threshold):
+    """
+    Selects the points of a series to draw with the Largest-Triangle-Three-Buckets algorithm, which keeps
+    the peaks and the overall shape of the line with only threshold points.
+
+    The first and last points are always kept. The points in between are split into threshold - 2 buckets,
+    and from every bucket the point forming the largest triangle with the previously kept point and the
+    average point of the next bucket is kept. When the series is downsampled, NaN values are never selected.
+
+    Args:
+        x (numpy.ndarray): Increasing x values, as numbers.
+        y (numpy.ndarray): y values, of the same length as x.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        numpy.ndarray: Increasing indices of the kept points.
+    """
+    if threshold >= len(y) or threshold < 3:
+        return np.arange(len(y))
+
+    finite = np.flatnonzero(~np.isnan(y))
+    if threshold >= len(finite):
+        return finite
+
+    x_finite = np.asarray(x, dtype=np.float64)[finite]
+    y_finite = np.asarray(y, dtype=np.float64)[finite]
+    bucket_edges = np.linspace(1, len(finite) - 1, threshold - 1).astype(np.int64)
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    previous = 0
+    for bucket in range(threshold - 2):
+        bucket_start, bucket_end = bucket_edges[bucket], bucket_edges[bucket + 1]
+
+        # Average point of the next bucket, or the last point for the last bucket
+        next_start = bucket_end
+        next_end = bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else len(finite)
+        average_x = x_finite[next_start:next_end].mean()
+        average_y = y_finite[next_start:next_end].mean()
+
+        # Twice the area of the triangles formed with the previous point and the next average point
+        areas = np.abs(
+            (x_finite[previous] - average_x) * (y_finite[bucket_start:bucket_end] - y_finite[previous])
+            - (x_finite[previous] - x_finite[bucket_start:bucket_end]) * (average_y - y_finite[previous])
+        )
+        previous = bucket_start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    kept[-1] = len(finite) - 1
+
+    return finite[kept]
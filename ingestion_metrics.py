@@ -0,0 +1,311 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE INGESTION METRICS
+##############################################################################
+import os
+import json
+import time
+import threading
+
+
+############################################
+# METRICS SETTINGS
+############################################
+# Stages of the ingestion of a chunk: finding the city, waiting for the API (retries and backoff included),
+# decoding the JSON response and saving the rows
+INGESTION_STAGES = ("geocode", "http", "decode", "write")
+
+# What the upsert did with the received rows
+ROW_OUTCOMES = ("inserted", "updated", "skipped")
+
+# Prefix of the metric names of the Prometheus textfile
+PROMETHEUS_PREFIX = "weather_ingest"
+
+
+##############################################################################
+# METRICS OF ONE CITY
+##############################################################################
+class CityMetrics:
+    """
+    Time per ingestion stage, rows, bytes and chunks of one city in an ingestion run.
+
+    The fetching thread and the writer thread of weather_ingestion both update the metrics of a city,
+    so every update holds the lock of the city.
+    """
+
+    def __init__(self, city_name):
+        self.city_name = city_name
+        self.lock = threading.Lock()
+        self.seconds = dict.fromkeys(INGESTION_STAGES, 0.0)
+        self.rows = dict.fromkeys(ROW_OUTCOMES, 0)
+        self.requests = 0
+        self.bytes_downloaded = 0
+        self.saved_chunks = 0
+        self.failed_chunks = 0
+        self.status = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def touch(self):
+        """
+        Extends the elapsed time of the city up to now. Called with the lock held.
+        """
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        self.finished = now
+
+    def start(self):
+        """
+        Starts the elapsed time of the city, used for its throughput.
+        """
+        with self.lock:
+            self.touch()
+
+    def add_seconds(self, stage, seconds):
+        """
+        Adds time spent in one of INGESTION_STAGES.
+        """
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.touch()
+
+    def record_http(self, seconds, requests, bytes_downloaded=0):
+        """
+        Adds a call to the archive API: the wait for the responses, the number of HTTP requests sent
+        (retries included) and the bytes received for all of them.
+        """
+        with self.lock:
+            self.seconds["http"] += seconds
+            self.requests += requests
+            self.bytes_downloaded += bytes_downloaded
+            self.touch()
+
+    def record_chunk(self, write_seconds, row_counts=None, failed=False):
+        """
+        Adds a saved chunk with its write time and the row counts filled by save_weather_data, or a chunk
+        that could not be retrieved or saved.
+        """
+        with self.lock:
+            self.seconds["write"] += write_seconds
+            if failed:
+                self.failed_chunks += 1
+            else:
+                self.saved_chunks += 1
+                for outcome in ROW_OUTCOMES:
+                    self.rows[outcome] += (row_counts or {}).get(outcome, 0)
+            self.touch()
+
+    def elapsed_seconds(self):
+        """
+        Returns the time from the start of the city to its last recorded event.
+        """
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+    def summary(self):
+        """
+        Returns the metrics of the city as a dictionary that can be saved as JSON.
+        """
+        with self.lock:
+            elapsed_seconds = self.elapsed_seconds()
+            rows_received = sum(self.rows.values())
+            return {
+                "status": self.status,
+                "error": self.error,
+                "seconds": {stage: round(seconds, 6) for stage, seconds in self.seconds.items()},
+                "elapsed_seconds": round(elapsed_seconds, 6),
+                "rows": dict(self.rows),
+                "rows_received": rows_received,
+                "rows_per_second": round(rows_received / elapsed_seconds, 3) if elapsed_seconds else 0.0,
+                "requests": self.requests,
+                "bytes_downloaded": self.bytes_downloaded,
+                "saved_chunks": self.saved_chunks,
+                "failed_chunks": self.failed_chunks,
+            }
+
+
+##############################################################################
+# METRICS OF AN INGESTION RUN
+##############################################################################
+class IngestionMetrics:
+    """
+    Metrics of one ingestion run, per city and for the whole run, exported as JSON or as a Prometheus
+    textfile (for the textfile collector of the node exporter).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cities = {}
+        self.started_at = time.time()
+        self.run_start = time.perf_counter()
+        self.duration_seconds = None
+        self.commit_seconds = 0.0
+
+    def city(self, city_name):
+        """
+        Returns the metrics of a city, created on the first call.
+        """
+        with self.lock:
+            city_metrics = self.cities.get(city_name)
+            if city_metrics is None:
+                city_metrics = self.cities[city_name] = CityMetrics(city_name)
+            return city_metrics
+
+    def add_commit_seconds(self, seconds):
+        """
+        Adds the time of a COMMIT, shared by the chunks of several cities.
+        """
+        with self.lock:
+            self.commit_seconds += seconds
+
+    def finish(self, summary=None):
+        """
+        Ends the run, copying the status and error of every city from the summary of ingest_cities.
+        """
+        self.duration_seconds = time.perf_counter() - self.run_start
+        for city_name, city_summary in (summary or {}).items():
+            city_metrics = self.city(city_name)
+            city_metrics.status = city_summary["status"]
+            city_metrics.error = city_summary["error"]
+
+    def summary(self):
+        """
+        Returns the metrics of the run and of every city as a dictionary that can be saved as JSON.
+        """
+        cities = {city_name: city_metrics.summary() for city_name, city_metrics in self.cities.items()}
+        duration_seconds = self.duration_seconds
+        if duration_seconds is None:
+            duration_seconds = time.perf_counter() - self.run_start
+
+        seconds = dict.fromkeys(INGESTION_STAGES, 0.0)
+        rows = dict.fromkeys(ROW_OUTCOMES, 0)
+        statuses = {}
+        for city_summary in cities.values():
+            for stage in INGESTION_STAGES:
+                seconds[stage] += city_summary["seconds"][stage]
+            for outcome in ROW_OUTCOMES:
+                rows[outcome] += city_summary["rows"][outcome]
+            statuses[city_summary["status"]] = statuses.get(city_summary["status"], 0) + 1
+        seconds["commit"] = self.commit_seconds
+        rows_received = sum(rows.values())
+
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "started_at_unix": round(self.started_at, 3),
+            "duration_seconds": round(duration_seconds, 6),
+            "seconds": {stage: round(stage_seconds, 6) for stage, stage_seconds in seconds.items()},
+            "rows": rows,
+            "rows_received": rows_received,
+            "rows_per_second": round(rows_received / duration_seconds, 3) if duration_seconds else 0.0,
+            "requests": sum(city_summary["requests"] for city_summary in cities.values()),
+            "bytes_downloaded": sum(city_summary["bytes_downloaded"] for city_summary in cities.values()),
+            "cities_by_status": statuses,
+            "cities": cities,
+        }
+
+    def write_json(self, file_path):
+        """
+        Saves the metrics as a JSON file.
+        """
+        write_file(file_path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def write_prometheus_textfile(self, file_path):
+        """
+        Saves the metrics in the Prometheus text format, every value being a gauge of the last run.
+        """
+        write_file(file_path, prometheus_text(self.summary()))
+
+
+##############################################################################
+# FUNCTIONS TO EXPORT THE METRICS
+##############################################################################
+def write_file(file_path, text):
+    """
+    Writes a file through a temporary file renamed once complete, so a collector never reads half a file.
+    """
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{file_path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(text)
+    os.replace(temporary_path, file_path)
+
+
+def prometheus_label(value):
+    """
+    Escapes a Prometheus label value.
+    """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(summary):
+    """
+    Builds the Prometheus text format of the summary returned by IngestionMetrics.summary.
+
+    Args:
+        summary (dict): The metrics of the run and of every city.
+
+    Returns:
+        str: One HELP and TYPE line per metric followed by its samples.
+    """
+    metrics = []
+
+    def add_metric(name, help_text, samples):
+        metrics.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        metrics.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(f'{label}="{prometheus_label(label_value)}"' for label, label_value in labels)
+            metrics.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}" if label_text
+                           else f"{PROMETHEUS_PREFIX}_{name} {value}")
+
+    cities = summary["cities"]
+    add_metric("stage_seconds", "Seconds spent in each ingestion stage of a city.",
+               [((("city", city_name), ("stage", stage)), seconds)
+                for city_name, city_summary in cities.items() for stage, seconds in city_summary["seconds"].items()])
+    add_metric("rows", "Received rows of a city by outcome of the upsert.",
+               [((("city", city_name), ("outcome", outcome)), rows)
+                for city_name, city_summary in cities.items() for outcome, rows in city_summary["rows"].items()])
+    add_metric("rows_per_second", "Received rows per second of a city.",
+               [((("city", city_name),), city_summary["rows_per_second"]) for city_name, city_summary in cities.items()])
+    add_metric("downloaded_bytes", "Bytes received from the archive API for a city, retried responses included.",
+               [((("city", city_name),), city_summary["bytes_downloaded"]) for city_name, city_summary in cities.items()])
+    add_metric("requests", "HTTP requests sent for a city, retries included.",
+               [((("city", city_name),), city_summary["requests"]) for city_name, city_summary in cities.items()])
+    add_metric("chunks", "Chunks of a city by result.",
+               [((("city", city_name), ("result", result)), city_summary[f"{result}_chunks"])
+                for city_name, city_summary in cities.items() for result in ("saved", "failed")])
+    add_metric("city_success", "1 when the city was saved or already up to date, 0 otherwise.",
+               [((("city", city_name),), int(city_summary["status"] in ("success", "up to date")))
+                for city_name, city_summary in cities.items()])
+
+    add_metric("run_stage_seconds", "Seconds spent in each ingestion stage, summed over the cities.",
+               [((("stage", stage),), seconds) for stage, seconds in summary["seconds"].items()])
+    add_metric("run_rows", "Received rows by outcome of the upsert.",
+               [((("outcome", outcome),), rows) for outcome, rows in summary["rows"].items()])
+    add_metric("run_rows_per_second", "Received rows per second of the run.", [((), summary["rows_per_second"])])
+    add_metric("run_downloaded_bytes", "Bytes received from the archive API, retried responses included.", [((), summary["bytes_downloaded"])])
+    add_metric("run_duration_seconds", "Duration of the run.", [((), summary["duration_seconds"])])
+    add_metric("run_cities", "Cities of the run by status.",
+               [((("status", status),), count) for status, count in summary["cities_by_status"].items()])
+    add_metric("run_timestamp_seconds", "Unix time of the start of the run.",
+               [((), summary["started_at_unix"])])
+    return "\n".join(metrics) + "\n"
+
+
+def print_ingestion_metrics(metrics):
+    """
+    Prints the totals of an ingestion run.
+    """
+    summary = metrics.summary()
+    seconds = summary["seconds"]
+    print(f"Ingestion metrics: {summary['rows']['inserted']} rows inserted, {summary['rows']['updated']} updated, "
+          f"{summary['rows']['skipped']} skipped, {summary['bytes_downloaded'] / 1048576:.2f} MB downloaded in "
+          f"{summary['requests']} requests, {summary['rows_per_second']:.0f} rows/s over {summary['duration_seconds']:.2f}s "
+          f"(geocode {seconds['geocode']:.2f}s, HTTP {seconds['http']:.2f}s, decode {seconds['decode']:.2f}s, "
+          f"write {seconds['write']:.2f}s, commit {seconds['commit']:.2f}s)")
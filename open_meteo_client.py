@@ -0,0 +1,295 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE OPEN METEO ARCHIVE API CLIENT
+##############################################################################
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+############################################
+# OPEN METEO ARCHIVE API SETTINGS
+############################################
+ARCHIVE_API_URL = "https://archive-api.open-meteo.com/v1/archive"
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Client modes: "live" only calls the API, "record" calls the API and saves every response,
+# "replay" only answers from the saved responses, without any network access
+CLIENT_MODES = ("live", "record", "replay")
+
+
+class ArchiveRequestError(ValueError):
+    """
+    Raised when the archive API does not return the requested data.
+
+    Attributes:
+        status_code (int): HTTP status code of the last response, or None if no response was received.
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+##############################################################################
+# OPEN METEO ARCHIVE API CLIENT
+##############################################################################
+class OpenMeteoArchiveClient:
+    """
+    Client for the Open-Meteo archive API using a keep-alive session, connect and read timeouts,
+    and exponential backoff on HTTP 429 and 5xx responses and on connection errors.
+
+    In "record" mode every successful response is saved under recordings_dir, and in "replay" mode the
+    responses are only read from recordings_dir, so that ingestion can run without network access.
+    """
+
+    def __init__(self, mode="live", recordings_dir=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_seconds=DEFAULT_BACKOFF_SECONDS, session=None, pool_size=16):
+        """
+        Args:
+            mode (str): One of CLIENT_MODES.
+            recordings_dir (str, optional): Directory of the recorded responses, required by "record" and "replay".
+                A relative path is resolved against the current working directory.
+            connect_timeout (float): Seconds to wait for the connection to the API.
+            read_timeout (float): Seconds to wait for the API response.
+            max_retries (int): Number of retries after a connection error or a 429/5xx response.
+            backoff_seconds (float): Delay before the first retry, doubled on every further retry.
+            session (requests.Session, optional): Session to use instead of a new one.
+            pool_size (int): Number of keep-alive connections kept by a new session.
+
+        Raises:
+            ValueError: If the mode is unknown or recordings_dir is missing for "record" and "replay".
+        """
+        if mode not in CLIENT_MODES:
+            raise ValueError(f"Unknown client mode '{mode}'. Choose from: {CLIENT_MODES}.")
+        if mode != "live" and not recordings_dir:
+            raise ValueError(f"A recordings directory is required in '{mode}' mode.")
+
+        self.mode = mode
+        # Absolute, so a later change of the working directory (phase 3 moves to its own) does not move it
+        self.recordings_dir = os.path.abspath(recordings_dir) if recordings_dir else None
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        if session is None and mode != "replay":
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        if mode == "record":
+            os.makedirs(recordings_dir, exist_ok=True)
+
+    def get_daily(self, latitude, longitude, start_date, end_date, timezone, daily_variables, metrics=None):
+        """
+        Gets the daily weather data of a location.
+
+        Args:
+            latitude (float): Latitude of the location.
+            longitude (float): Longitude of the location.
+            start_date (str): Start date (YYYY-MM-DD format).
+            end_date (str): End date (YYYY-MM-DD format).
+            timezone (str): Timezone used by the API to build the days.
+            daily_variables (list): Names of the Open-Meteo daily variables.
+            metrics (CityMetrics, optional): Metrics of the city (see ingestion_metrics), given the HTTP and
+                JSON decoding times and the downloaded bytes.
+
+        Returns:
+            dict: The decoded API response.
+
+        Raises:
+            ArchiveRequestError: If the data could not be retrieved, or is not recorded in "replay" mode.
+        """
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "start_date": start_date,
+            "end_date": end_date,
+            "daily": ",".join(daily_variables),
+            "timezone": timezone,
+        }
+        if self.mode == "replay":
+            # Reading a recording is counted as decoding, nothing is downloaded
+            decode_start = time.perf_counter()
+            daily_weather = self.read_recording(params)
+            if metrics is not None:
+                metrics.add_seconds("decode", time.perf_counter() - decode_start)
+            return daily_weather
+
+        response_text = self.request(params, metrics)
+        if self.mode == "record":
+            self.write_recording(params, response_text)
+        decode_start = time.perf_counter()
+        daily_weather = json.loads(response_text)
+        if metrics is not None:
+            metrics.add_seconds("decode", time.perf_counter() - decode_start)
+        return daily_weather
+
+    def request(self, params, metrics=None):
+        """
+        Sends the request, retrying with exponential backoff, and returns the body of the HTTP 200 response.
+
+        When metrics are given, the time of all the attempts (backoff delays included), the number of requests
+        sent and the bytes received for every response, the retried HTTP 429 and 5xx ones included, are added
+        to them.
+
+        Raises:
+            ArchiveRequestError: If the API answers with another status, or the retries are exhausted.
+        """
+        attempt = 0
+        bytes_downloaded = 0
+        request_start = time.perf_counter()
+        try:
+            while True:
+                retry_after = None
+                try:
+                    response = self.session.get(ARCHIVE_API_URL, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as ex:
+                    if attempt >= self.max_retries:
+                        raise ArchiveRequestError(f"The archive API could not be reached: {ex}") from ex
+                else:
+                    bytes_downloaded += response_size(response)
+                    if response.status_code == 200:
+                        return response.text
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                        raise ArchiveRequestError(
+                            f"The archive API answered with HTTP Status Code: {response.status_code}",
+                            response.status_code,
+                        )
+                    retry_after = response.headers.get("Retry-After")
+
+                time.sleep(self.backoff_delay(attempt, retry_after))
+                attempt += 1
+        finally:
+            if metrics is not None:
+                metrics.record_http(time.perf_counter() - request_start, attempt + 1, bytes_downloaded)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Returns the number of seconds to wait before the next retry.
+
+        The Retry-After header is honoured when it holds a number of seconds, otherwise the delay is
+        backoff_seconds * 2 ** attempt with up to 10% of random jitter, capped to MAX_BACKOFF_SECONDS.
+        """
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), MAX_BACKOFF_SECONDS)
+            except ValueError:
+                pass
+        delay = self.backoff_seconds * (2 ** attempt)
+        return min(delay + random.uniform(0, delay / 10), MAX_BACKOFF_SECONDS)
+
+    def recording_path(self, params):
+        """
+        Returns the path of the recorded response of a request, named after a hash of its parameters.
+        """
+        request_key = json.dumps(params, sort_keys=True)
+        file_name = hashlib.sha256(request_key.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self.recordings_dir, file_name)
+
+    def write_recording(self, params, response_text):
+        """
+        Saves the response of a request into the recordings directory.
+        """
+        recording_path = self.recording_path(params)
+        temporary_path = f"{recording_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as recording_file:
+            json.dump({"params": params, "body": response_text}, recording_file)
+        os.replace(temporary_path, recording_path)
+
+    def read_recording(self, params):
+        """
+        Reads the recorded response of a request.
+
+        Raises:
+            ArchiveRequestError: If the request was not recorded.
+        """
+        recording_path = self.recording_path(params)
+        try:
+            with open(recording_path, encoding="utf-8") as recording_file:
+                recording = json.load(recording_file)
+        except FileNotFoundError:
+            raise ArchiveRequestError(
+                f"No recorded response for {params['start_date']} to {params['end_date']} "
+                f"at ({params['latitude']}, {params['longitude']}) in {self.recordings_dir}."
+            ) from None
+        return json.loads(recording["body"])
+
+
+def response_size(response):
+    """
+    Returns the number of bytes of the body of a response as received, before any gzip decoding.
+
+    The body is read first. The size is the number of bytes read from the connection, then the
+    Content-Length header, and the length of the decoded body when neither is known (a stubbed session).
+    """
+    content = getattr(response, "content", None)
+    raw = getattr(response, "raw", None)
+    if raw is not None and hasattr(raw, "tell"):
+        try:
+            bytes_read = raw.tell()
+        except (OSError, ValueError):
+            bytes_read = 0
+        if bytes_read:
+            return bytes_read
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None and content_length.isdigit():
+        return int(content_length)
+    if isinstance(content, bytes):
+        return len(content)
+    return len(response.text.encode("utf-8"))
+
+
+##############################################################################
+# FUNCTIONS TO SHARE ONE CLIENT PER PROCESS
+##############################################################################
+_archive_client = None
+_archive_client_lock = threading.Lock()
+
+
+def configure_archive_client(**client_options):
+    """
+    Replaces the client shared by the process with a new one built with the given options.
+
+    Args:
+        **client_options: Keyword arguments of OpenMeteoArchiveClient.
+
+    Returns:
+        OpenMeteoArchiveClient: The new shared client.
+    """
+    global _archive_client
+    with _archive_client_lock:
+        _archive_client = OpenMeteoArchiveClient(**client_options)
+        return _archive_client
+
+
+def get_archive_client():
+    """
+    Returns the client shared by the process, creating it on the first call.
+
+    The first client is configured from the OPEN_METEO_MODE ("live", "record" or "replay") and
+    OPEN_METEO_RECORDINGS_DIR environment variables, and defaults to the "live" mode.
+    """
+    global _archive_client
+    with _archive_client_lock:
+        if _archive_client is None:
+            _archive_client = OpenMeteoArchiveClient(
+                mode=os.environ.get("OPEN_METEO_MODE", "live"),
+                recordings_dir=os.environ.get("OPEN_METEO_RECORDINGS_DIR"),
+            )
+        return _archive_client
@@ -6,6 +6,11 @@
 ##############################################################################
 import os
 import sqlite3
+from bisect import bisect_left
+from db_connections import get_connection
+from query_cache import cached_query, window_end
+from weather_aggregates import measure_totals_query, weather_rollups_available
+from weather_catalog import get_catalog
 
 
 # Phase 1 - Starter
@@ -85,6 +90,7 @@ Good
 '''
 
 
+@cached_query(lambda args: (args["city_id"], args["year"], args["year"]))
 def average_annual_temperature(connection, city_id, year):
     """
     Calculates the average annual temperature for a specific city and year.
@@ -101,22 +107,38 @@ def average_annual_temperature(connection, city_id, year):
         sqlite3.OperationalError: If a database query error occurs.
     """
     try:
-        # Define the query
-        query = """
-            SELECT AVG(dw.mean_temp) AS annual_mean_temperature, dw.city_id AS city_id, strftime('%Y', dw.date) AS year, c.name AS city_name
-            FROM [daily_weather_entries] AS dw
-            JOIN cities AS c
-            ON c.id == dw.city_id
-            WHERE city_id == ?
-            AND year like ?
-        """
+        if weather_rollups_available(connection):
+            # Define the query - a whole year is read from the yearly rollups
+            query = """
+                SELECT yr.mean_temp_sum / yr.mean_temp_count AS annual_mean_temperature, yr.city_id AS city_id, yr.year AS year, c.name AS city_name
+                FROM yearly_weather_rollups AS yr
+                JOIN cities AS c
+                ON c.id == yr.city_id
+                WHERE yr.city_id == ?
+                AND yr.year == ?
+            """
+            params = (city_id, f"{int(year):04d}")
+        else:
+            # Define the query - the year is matched with a half-open date range so the (city_id, date) index is used
+            query = """
+                SELECT AVG(dw.mean_temp) AS annual_mean_temperature, dw.city_id AS city_id, ? AS year, c.name AS city_name
+                FROM [daily_weather_entries] AS dw
+                JOIN cities AS c
+                ON c.id == dw.city_id
+                WHERE dw.city_id == ?
+                AND dw.date >= ?
+                AND dw.date < ?
+                GROUP BY dw.city_id
+            """
+            year_start, year_end = year_date_range(year, year)
+            params = (str(year), city_id, year_start, year_end)
 
         # Get a cursor object from the database connection
         # that will be used to execute database query.
         cursor = connection.cursor()
 
         # Execute the query via the cursor object.
-        results = cursor.execute(query, (city_id, year))
+        results = cursor.execute(query, params)
 
         # Return the temperature and other records
         return results
@@ -129,6 +151,123 @@ def average_annual_temperature(connection, city_id, year):
         print(ex)
 
 
+@cached_query(lambda args: (args["city_id"], args["from_year"], args["to_year"]))
+def average_annual_temperature_by_year_range(connection, city_id, from_year, to_year):
+    """
+    Calculates the average annual temperature of a specific city for every year from from_year to to_year.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id: ID of the city.
+        from_year: First year of the range (YYYY).
+        to_year: Last year of the range (YYYY), included.
+
+    Returns:
+        sqlite3.Cursor: Query results ordered by year, iterable to retrieve city details and temperature.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    try:
+        if weather_rollups_available(connection):
+            # Define the query - whole years are read from the yearly rollups
+            query = """
+                SELECT yr.mean_temp_sum / yr.mean_temp_count AS annual_mean_temperature, yr.city_id AS city_id, yr.year AS year, c.name AS city_name
+                FROM yearly_weather_rollups AS yr
+                JOIN cities AS c
+                ON c.id == yr.city_id
+                WHERE yr.city_id == ?
+                AND yr.year >= ?
+                AND yr.year <= ?
+                ORDER BY yr.year
+            """
+            params = (city_id, f"{int(from_year):04d}", f"{int(to_year):04d}")
+        else:
+            # Define the query
+            query = """
+                SELECT AVG(dw.mean_temp) AS annual_mean_temperature, dw.city_id AS city_id, substr(dw.date, 1, 4) AS year, c.name AS city_name
+                FROM [daily_weather_entries] AS dw
+                JOIN cities AS c
+                ON c.id == dw.city_id
+                WHERE dw.city_id == ?
+                AND dw.date >= ?
+                AND dw.date < ?
+                GROUP BY dw.city_id, year
+                ORDER BY year
+            """
+            range_start, range_end = year_date_range(from_year, to_year)
+            params = (city_id, range_start, range_end)
+
+        # Get a cursor object from the database connection
+        # that will be used to execute database query.
+        cursor = connection.cursor()
+
+        # Execute the query via the cursor object.
+        results = cursor.execute(query, params)
+
+        # Return the temperature and other records
+        return results
+
+    except sqlite3.OperationalError as ex:
+        print(ex)
+
+
+@cached_query(lambda args: (None, args["from_year"], args["to_year"]))
+def average_annual_temperature_by_city_and_year(connection, from_year, to_year):
+    """
+    Calculates the average annual temperature of every city for every year from from_year to to_year
+    in a single grouped query.
+
+    Args:
+        connection: SQLite database connection object.
+        from_year: First year of the range (YYYY).
+        to_year: Last year of the range (YYYY), included.
+
+    Returns:
+        sqlite3.Cursor: Query results ordered by city ID and year, iterable to retrieve
+        city_id, year and annual_mean_temperature.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    try:
+        if weather_rollups_available(connection):
+            # Define the query - whole years are read from the yearly rollups
+            query = """
+                SELECT yr.city_id AS city_id, yr.year AS year, yr.mean_temp_sum / yr.mean_temp_count AS annual_mean_temperature
+                FROM yearly_weather_rollups AS yr
+                WHERE yr.year >= ?
+                AND yr.year <= ?
+                ORDER BY yr.city_id, yr.year
+            """
+            params = (f"{int(from_year):04d}", f"{int(to_year):04d}")
+        else:
+            # Define the query
+            query = """
+                SELECT dw.city_id AS city_id, substr(dw.date, 1, 4) AS year, AVG(dw.mean_temp) AS annual_mean_temperature
+                FROM [daily_weather_entries] AS dw
+                WHERE dw.date >= ?
+                AND dw.date < ?
+                GROUP BY dw.city_id, year
+                ORDER BY dw.city_id, year
+            """
+            params = year_date_range(from_year, to_year)
+
+        # Get a cursor object from the database connection
+        # that will be used to execute database query.
+        cursor = connection.cursor()
+
+        # Execute the query via the cursor object.
+        results = cursor.execute(query, params)
+
+        # Return the city, year and temperature records
+        return results
+
+    except sqlite3.OperationalError as ex:
+        print(ex)
+
+
+@cached_query(lambda args: (args["city_id"], args["start_date"], window_end(args["start_date"], 7)))
 def average_seven_day_precipitation(connection, city_id, start_date):
     """
 Calculates the average precipitation over seven days for a specific city, starting from a given date.
@@ -173,15 +312,114 @@ Raises:
     except sqlite3.OperationalError as ex:
         print(ex)
 
+@cached_query(lambda args: (None, args["start_date"], window_end(args["start_date"], args["days"])))
+def average_seven_day_precipitation_all_cities(connection, start_date, days=7):
+    """
+    Calculates the average precipitation of every city over a number of days, starting from a given date,
+    in a single grouped query.
+
+    Args:
+        connection: SQLite database connection object.
+        start_date: Start date (YYYY-MM-DD) of the period.
+        days (int): Length of the period in days, including the start date. Defaults to seven days.
+
+    Returns:
+        sqlite3.Cursor: Query results ordered by city ID, iterable to retrieve city details and precipitation data.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    try:
+        # Define the query
+        query = """
+            SELECT AVG(dw.precipitation) AS average_seven_day_precipitation, dw.city_id AS city_id, ? AS start_date, c.name AS city_name
+            FROM [daily_weather_entries] AS dw
+            JOIN cities AS c
+            ON c.id == dw.city_id
+            WHERE dw.date >= ?
+            AND dw.date < date(?, ?)
+            GROUP BY dw.city_id
+            ORDER BY dw.city_id
+            """
+
+        # Get a cursor object from the database connection
+        # that will be used to execute database query.
+        cursor = connection.cursor()
+
+        # Execute the query via the cursor object.
+        results = cursor.execute(query, (start_date, start_date, start_date, f"+{int(days)} days"))
+
+        # return the city details and precipitation data
+        return results
+
+    except sqlite3.OperationalError as ex:
+        print(ex)
+
+@cached_query(lambda args: (args["city_id"], args["date_from"], window_end(args["date_to"], args["days"])))
+def rolling_window_averages(connection, city_id, date_from, date_to, days=7):
+    """
+    Retrieves the precomputed rolling window averages of a city for every start date in a date range.
+
+    The windows are maintained by phase 3 in the rolling_weather_windows table for the window lengths
+    in weather_aggregates.ROLLING_WINDOW_DAYS, so no daily entries are aggregated by this query.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id: ID of the city.
+        date_from: First start date (YYYY-MM-DD) of the sweep.
+        date_to: Last start date (YYYY-MM-DD) of the sweep.
+        days (int): Window length in days. Defaults to seven days.
+
+    Returns:
+        sqlite3.Cursor: Query results ordered by start date, iterable to retrieve the window averages
+        and the number of daily entries found in each window (day_count).
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    try:
+        # Define the query
+        query = """
+            SELECT rw.city_id AS city_id, c.name AS city_name, rw.start_date AS start_date, rw.window_days AS window_days,
+                   rw.day_count AS day_count, rw.average_precipitation AS average_precipitation,
+                   rw.average_mean_temp AS average_mean_temp, rw.average_min_temp AS average_min_temp,
+                   rw.average_max_temp AS average_max_temp
+            FROM rolling_weather_windows AS rw
+            JOIN cities AS c
+            ON c.id == rw.city_id
+            WHERE rw.city_id == ?
+            AND rw.window_days == ?
+            AND rw.start_date >= ?
+            AND rw.start_date <= ?
+            ORDER BY rw.start_date
+            """
+
+        # Get a cursor object from the database connection
+        # that will be used to execute database query.
+        cursor = connection.cursor()
+
+        # Execute the query via the cursor object.
+        results = cursor.execute(query, (city_id, int(days), date_from, date_to))
+
+        # Return the rolling window averages
+        return results
+
+    except sqlite3.OperationalError as ex:
+        print(ex)
+
 '''
 Very good
 '''
 
 
+@cached_query(lambda args: (None, args["date_from"], args["date_to"]))
 def average_mean_temp_by_city(connection, date_from, date_to):
     """
     Calculates the average mean temperature for all cities within a specified date range.
 
+    When the rollup tables exist, the whole months of the range are read from the monthly rollups and
+    only the partial months at the edges of the range are aggregated from the daily entries.
+
     Args:
         connection: SQLite database connection object.
         date_from: Start date (YYYY-MM-DD) of the range.
@@ -194,23 +432,37 @@ def average_mean_temp_by_city(connection, date_from, date_to):
         sqlite3.OperationalError: If a database query error occurs.
     """
     try:
-        # Define the query
-        query = """
-            SELECT AVG(dw.mean_temp) AS average_mean_temperature, dw.city_id AS city_id, dw.date AS date, c.name AS city_name
-            FROM [daily_weather_entries] AS dw
-            JOIN cities AS c
-            ON c.id == dw.city_id
-            WHERE dw.date >= ?
-            AND dw.date <= ?
-            Group by city_id
-        """
+        if weather_rollups_available(connection):
+            # Define the query - whole months are read from the monthly rollups
+            # and only the partial months at the edges of the range from the daily entries
+            totals_query, totals_params = measure_totals_query("mean_temp", date_from, date_to)
+            query = f"""
+                SELECT TOTAL(t.measure_total) / SUM(t.measure_count) AS average_mean_temperature, t.city_id AS city_id, ? AS date, c.name AS city_name
+                FROM ({totals_query}) AS t
+                JOIN cities AS c
+                ON c.id == t.city_id
+                GROUP BY t.city_id
+            """
+            params = (date_from,) + totals_params
+        else:
+            # Define the query
+            query = """
+                SELECT AVG(dw.mean_temp) AS average_mean_temperature, dw.city_id AS city_id, dw.date AS date, c.name AS city_name
+                FROM [daily_weather_entries] AS dw
+                JOIN cities AS c
+                ON c.id == dw.city_id
+                WHERE dw.date >= ?
+                AND dw.date <= ?
+                Group by city_id
+            """
+            params = (date_from, date_to)
 
         # Get a cursor object from the database connection
         # that will be used to execute database query.
         cursor = connection.cursor()
 
         # Execute the query via the cursor object.
-        results = cursor.execute(query, (date_from, date_to))
+        results = cursor.execute(query, params)
 
         # Return temperature and other information
         return results
@@ -223,6 +475,7 @@ def average_mean_temp_by_city(connection, date_from, date_to):
         print(ex)
 
 
+@cached_query(lambda args: (None, args["year"], args["year"]))
 def average_annual_precipitation_by_country(connection, year):
     """
     Calculates the average annual precipitation for each country for a specified year.
@@ -238,24 +491,41 @@ def average_annual_precipitation_by_country(connection, year):
         sqlite3.OperationalError: If a database query error occurs.
     """
     try:
-        # Define the query
-        query = """
-            SELECT AVG(dw.precipitation) AS average_annual_precipitation, strftime('%Y', dw.date) AS year, ct.id, ct.name
-            FROM [daily_weather_entries] AS dw
-            JOIN cities AS c
-            ON c.id == dw.city_id
-            JOIN countries AS ct
-            ON ct.id == c.country_id
-            WHERE strftime('%Y', dw.date) LIKE ? 
-            GROUP BY ct.id
-            """
+        if weather_rollups_available(connection):
+            # Define the query - a whole year is read from the yearly rollups
+            query = """
+                SELECT TOTAL(yr.precipitation_sum) / SUM(yr.precipitation_count) AS average_annual_precipitation, ? AS year, ct.id, ct.name
+                FROM yearly_weather_rollups AS yr
+                JOIN cities AS c
+                ON c.id == yr.city_id
+                JOIN countries AS ct
+                ON ct.id == c.country_id
+                WHERE yr.year == ?
+                GROUP BY ct.id
+                """
+            params = (str(year), f"{int(year):04d}")
+        else:
+            # Define the query - the year is matched with a half-open date range so the date index is used
+            query = """
+                SELECT AVG(dw.precipitation) AS average_annual_precipitation, ? AS year, ct.id, ct.name
+                FROM [daily_weather_entries] AS dw
+                JOIN cities AS c
+                ON c.id == dw.city_id
+                JOIN countries AS ct
+                ON ct.id == c.country_id
+                WHERE dw.date >= ?
+                AND dw.date < ?
+                GROUP BY ct.id
+                """
+            year_start, year_end = year_date_range(year, year)
+            params = (str(year), year_start, year_end)
 
         # Get a cursor object from the database connection
         # that will be used to execute database query.
         cursor = connection.cursor()
 
         # Execute the query via the cursor object.
-        results = cursor.execute(query, (year,))
+        results = cursor.execute(query, params)
 
         # Return the precipitation and other data
         return results
@@ -267,6 +537,69 @@ def average_annual_precipitation_by_country(connection, year):
     except sqlite3.OperationalError as ex:
         print(ex)
 
+
+@cached_query(lambda args: (None, args["from_year"], args["to_year"]))
+def average_annual_precipitation_by_country_and_year_range(connection, from_year, to_year):
+    """
+    Calculates the average annual precipitation for each country for every year from from_year to to_year.
+
+    Args:
+        connection: SQLite database connection object.
+        from_year: First year of the range (YYYY).
+        to_year: Last year of the range (YYYY), included.
+
+    Returns:
+        sqlite3.Cursor: Query results ordered by year and country, iterable to retrieve country details
+        and precipitation data.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    try:
+        if weather_rollups_available(connection):
+            # Define the query - whole years are read from the yearly rollups
+            query = """
+                SELECT TOTAL(yr.precipitation_sum) / SUM(yr.precipitation_count) AS average_annual_precipitation, yr.year AS year, ct.id, ct.name
+                FROM yearly_weather_rollups AS yr
+                JOIN cities AS c
+                ON c.id == yr.city_id
+                JOIN countries AS ct
+                ON ct.id == c.country_id
+                WHERE yr.year >= ?
+                AND yr.year <= ?
+                GROUP BY yr.year, ct.id
+                ORDER BY yr.year, ct.id
+                """
+            params = (f"{int(from_year):04d}", f"{int(to_year):04d}")
+        else:
+            # Define the query
+            query = """
+                SELECT AVG(dw.precipitation) AS average_annual_precipitation, substr(dw.date, 1, 4) AS year, ct.id, ct.name
+                FROM [daily_weather_entries] AS dw
+                JOIN cities AS c
+                ON c.id == dw.city_id
+                JOIN countries AS ct
+                ON ct.id == c.country_id
+                WHERE dw.date >= ?
+                AND dw.date < ?
+                GROUP BY year, ct.id
+                ORDER BY year, ct.id
+                """
+            params = year_date_range(from_year, to_year)
+
+        # Get a cursor object from the database connection
+        # that will be used to execute database query.
+        cursor = connection.cursor()
+
+        # Execute the query via the cursor object.
+        results = cursor.execute(query, params)
+
+        # Return the precipitation and other data
+        return results
+
+    except sqlite3.OperationalError as ex:
+        print(ex)
+
 '''
 Excellent
 
@@ -289,14 +622,15 @@ def get_date_input():
 
 
 def extract_cities(connection):
-    """Extract all city IDs and city names from the database."""
-    all_cities = select_all_cities(connection)
-
-    city_ids = []
-    city_names = []
-    for city in all_cities:
-        city_ids.append(city['id'])
-        city_names.append(city['name'])
+    """Extract all city IDs and city names from the database, read from the catalog (see weather_catalog)."""
+    try:
+        catalog = get_catalog(connection)
+    except sqlite3.OperationalError as ex:
+        print(ex)
+        return [], []
+
+    city_ids = list(catalog.cities)
+    city_names = list(catalog.cities.values())
     return city_ids, city_names
 
 
@@ -337,10 +671,29 @@ def validate_city_id(city_id, city_ids):
     return True, ""
 
 
+def year_date_range(from_year, to_year):
+    """
+    Converts a range of years into a half-open date range usable against the date index.
+
+    Args:
+        from_year (str or int): First year of the range (YYYY).
+        to_year (str or int): Last year of the range (YYYY), included.
+
+    Returns:
+        tuple: (range_start, range_end) where range_start is the first day of from_year and
+        range_end is the first day of the year after to_year, for use as
+        `date >= range_start AND date < range_end`.
+    """
+    return f"{int(from_year):04d}-01-01", f"{int(to_year) + 1:04d}-01-01"
+
+
 def db_distinct_years(connection):
     """
     Retrieves a list of distinct years from the 'daily_weather_entries' table.
 
+    The first and last years are read from the date index (MIN/MAX lookups) and every year in between
+    is kept only if at least one entry exists in its date range, so the table itself is never scanned.
+
     Args:
         connection: SQLite database connection object.
 
@@ -351,7 +704,22 @@ def db_distinct_years(connection):
         sqlite3.OperationalError: If a database query error occurs.
     """
     try:
-        query = "SELECT DISTINCT(strftime('%Y', date)) AS distinct_year FROM [daily_weather_entries]"
+        query = """
+            WITH RECURSIVE years(year) AS (
+                SELECT CAST(substr((SELECT MIN(date) FROM [daily_weather_entries]), 1, 4) AS INTEGER)
+                UNION ALL
+                SELECT year + 1 FROM years
+                WHERE year < CAST(substr((SELECT MAX(date) FROM [daily_weather_entries]), 1, 4) AS INTEGER)
+            )
+            SELECT printf('%04d', year) AS distinct_year
+            FROM years
+            WHERE EXISTS (
+                SELECT 1 FROM [daily_weather_entries]
+                WHERE date >= printf('%04d-01-01', year)
+                AND date < printf('%04d-01-01', year + 1)
+            )
+            ORDER BY year
+        """
         cursor = connection.cursor()
         results = cursor.execute(query)
 
@@ -368,21 +736,18 @@ def db_distinct_years(connection):
 def select_dates(connection):
     """
     Retrieves all available dates from the database, formatted correctly.
-    """
-    try:
-        query = "SELECT DISTINCT strftime('%Y-%m-%d', date) AS db_date FROM [daily_weather_entries]"
-        cursor = connection.cursor()
-        results = cursor.execute(query)
 
-        available_dates = []
+    The dates are read from the catalog (see weather_catalog), which is only loaded again after new
+    data has been saved.
 
-        for row in results:
-            db_date = row['db_date']
-            available_dates.append(db_date)
-        return available_dates
+    Returns:
+        tuple: The sorted distinct dates (YYYY-MM-DD).
+    """
+    try:
+        return get_catalog(connection).dates
     except sqlite3.OperationalError as ex:
         print(ex)
-        return []
+        return ()
 
 
 def validate_db_dates(date_from, date_to, available_dates):
@@ -392,14 +757,19 @@ def validate_db_dates(date_from, date_to, available_dates):
     Args:
         date_from (str): Start date provided by the user.
         date_to (str): End date provided by the user.
-        available_dates (list): List of valid dates from the database.
+        available_dates (tuple): Sorted valid dates from the database, as returned by select_dates.
 
     Returns:
         bool: True if the dates are valid, False otherwise.
         str: Error message if dates are invalid.
     """
-    if date_from not in available_dates or date_to not in available_dates:
-        return False, f"Invalid dates. Please choose dates within the range: {min(available_dates)} - {max(available_dates)}."
+    if not available_dates:
+        return False, "No available dates found in the database."
+
+    for user_date in (date_from, date_to):
+        position = bisect_left(available_dates, user_date)
+        if position == len(available_dates) or available_dates[position] != user_date:
+            return False, f"Invalid dates. Please choose dates within the range: {available_dates[0]} - {available_dates[-1]}."
     if date_from > date_to:
         return False, "Start date cannot be after the end date. Please re-enter the dates."
     return True, ""
@@ -443,16 +813,15 @@ def validate_user_inputs(connection, date_from, date_to, city_id):
         bool: True if all inputs are valid, False otherwise.
         str: Error message if any input is invalid.
     """
-    available_dates = select_dates(connection)
-    city_ids, _ = extract_cities(connection)
+    # The catalog answers with binary searches and is only loaded again after new data has been saved
+    catalog = get_catalog(connection)
 
-    date_validation, date_error = validate_db_dates(date_from, date_to, available_dates)
+    date_validation, date_error = validate_db_dates(date_from, date_to, catalog.dates)
     if not date_validation:
         return False, date_error
 
-    city_validation, city_error = validate_city_id(city_id, city_ids)
-    if not city_validation:
-        return False, city_error
+    if not catalog.has_city(city_id):
+        return False, f"Invalid City ID. Please choose from the following IDs: {list(catalog.cities)}."
 
     return True, ""
 
@@ -476,8 +845,11 @@ def db_connection(connection):
     """
     Establishes and returns a connection to the SQLite database.
 
+    The read-only connection of the current thread is shared through db_connections, so the queries never
+    block the ingestion writer.
+
     Args:
-        connection: SQLite database connection object.
+        connection: Path to the SQLite database file.
 
     Returns:
         sqlite3.Connection: Active database connection with row factory set.
@@ -486,10 +858,7 @@ def db_connection(connection):
         sqlite3.OperationalError: If a connection error occurs.
     """
     try:
-        with sqlite3.connect(connection) as connection:
-            connection.row_factory = sqlite3.Row
-            connection.commit()
-            return connection
+        return get_connection(connection, read_only=True)
     except sqlite3.OperationalError as ex:
         print(ex)
 
@@ -7,7 +7,15 @@
 import os
 import phase_1 as fp1  # IMPORTED MODULE FROM THE PHASE 1 OF THIS ICA
 import sqlite3
+import numpy as np
+from db_connections import get_connection
+from weather_catalog import get_catalog
+from weather_series import WeatherSeries
+from weather_snapshots import load_city_series
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from downsampling import lttb_indices
+from plot_blitting import BlitManager, MotionThrottle
 from matplotlib.widgets import Slider
 from matplotlib.backend_bases import MouseButton
 from phase_1 import (
@@ -41,8 +49,11 @@ def db_connection(connection):
     """
     Establishes and returns a connection to the SQLite database.
 
+    The read-only connection of the current thread is shared through db_connections, so the queries never
+    block the ingestion writer.
+
     Args:
-        connection: SQLite database connection object.
+        connection: Path to the SQLite database file.
 
     Returns:
         sqlite3.Connection: Active database connection with row factory set.
@@ -51,10 +62,7 @@ def db_connection(connection):
         sqlite3.OperationalError: If a connection error occurs.
     """
     try:
-        with sqlite3.connect(connection) as connection:
-            connection.row_factory = sqlite3.Row
-            connection.commit()
-            return connection
+        return get_connection(connection, read_only=True)
     except sqlite3.OperationalError as ex:
         print(ex)
 
@@ -68,29 +76,58 @@ def db_connection(connection):
 # EXTRACT_CITIES FUNCTION FROM PHASE 1 IS USED IN THIS PLOT 1
 
 def calculate_annual_temperatures(connection, city_ids, years):
-    """Calculate average annual temperature for each city and year."""
-    records = {"city_ids": [], "years": [], "city_annual_temperature": []}
-    for city_id in city_ids:
-        for year in years:
-            avg_annual_mean = fp1.average_annual_temperature(connection, city_id, year)
-            for avg_mean in avg_annual_mean:
-                records["city_ids"].append(city_id)
-                records["years"].append(year)
-                records["city_annual_temperature"].append(round(avg_mean['annual_mean_temperature'], 2))
-    return records
+    """
+    Calculate average annual temperature for each city and year.
 
+    All the averages are read with a single grouped query and placed into a dense city x year matrix.
 
-def plot_annual_temperatures_grouped_bar(city_names, city_annual_temperature_record):
-    """Plot average annual temperatures as a grouped bar chart."""
-    unique_city_ids_set = set(city_annual_temperature_record["city_ids"])
-    unique_city_ids = sorted(unique_city_ids_set)
+    Args:
+        connection: SQLite database connection object.
+        city_ids (list): City IDs, in the order of the matrix rows.
+        years (list): Years (YYYY), in the order of the matrix columns.
 
-    city_positions = list(range(len(unique_city_ids)))
-    width = 0.17
+    Returns:
+        dict: A dictionary with keys "city_ids", "years" and "city_annual_temperature", where
+        "city_annual_temperature" is a 2-D NumPy array of shape (len(city_ids), len(years)) holding
+        the temperatures rounded to 2 decimal places, and NaN where a city has no data for a year.
+    """
+    city_ids = list(city_ids)
+    years = [str(year) for year in years]
+    temperatures = np.full((len(city_ids), len(years)), np.nan)
+
+    if city_ids and years:
+        city_rows = {city_id: row for row, city_id in enumerate(city_ids)}
+        year_columns = {year: column for column, year in enumerate(years)}
+
+        results = fp1.average_annual_temperature_by_city_and_year(connection, min(years), max(years))
+        for record in results or []:
+            row = city_rows.get(record['city_id'])
+            column = year_columns.get(record['year'])
+            if row is not None and column is not None and record['annual_mean_temperature'] is not None:
+                temperatures[row, column] = round(record['annual_mean_temperature'], 2)
 
-    years_set = sorted(set(city_annual_temperature_record["years"]))
+    return {"city_ids": city_ids, "years": years, "city_annual_temperature": temperatures}
+
+
+def plot_annual_temperatures_grouped_bar(city_names, city_annual_temperature_record):
+    """
+    Plot average annual temperatures as a grouped bar chart.
+
+    Args:
+        city_names (list): City names, in the same order as city_annual_temperature_record["city_ids"].
+        city_annual_temperature_record (dict): The city x year matrix returned by calculate_annual_temperatures.
+    """
+    temperatures = city_annual_temperature_record["city_annual_temperature"]
+    years_set = city_annual_temperature_record["years"]
     num_years = len(years_set)
 
+    if temperatures.size == 0:
+        print("No annual temperature data available to plot.")
+        return
+
+    city_positions = np.arange(len(city_annual_temperature_record["city_ids"]))
+    width = 0.17
+
     color_map = plt.get_cmap('Pastel2', num_years)
     colors = []
     for bar_year in range(num_years):
@@ -99,25 +136,16 @@ def plot_annual_temperatures_grouped_bar(city_names, city_annual_temperature_rec
     for year in years_set:
         labels.append(f'Year {year}')
 
-    temperatures = []
-    for nyear in range(num_years):
-        temp = []
-        for t in range(nyear, len(city_annual_temperature_record['city_annual_temperature']), num_years):
-            temp.append(city_annual_temperature_record['city_annual_temperature'][t])
-        temperatures.append(temp)
-
     fig, ax = plt.subplots(figsize=(10, 6))
-    for nyear in range(len(temperatures)):
-        temp = temperatures[nyear]
-        positions = []
-        for pos in city_positions:
-            adjusted_position = pos + (nyear - (num_years - 1) / 2) * width
-            positions.append(adjusted_position)
+    for nyear in range(num_years):
+        temp = temperatures[:, nyear]
+        positions = city_positions + (nyear - (num_years - 1) / 2) * width
         bars = ax.bar(positions, temp, width, label=labels[nyear], color=colors[nyear])
 
-        for bar, temperature, year in zip(bars, temp, [years_set[nyear]] * len(temp)):
+        year = years_set[nyear]
+        for bar, temperature in zip(bars, temp):
             height = bar.get_height()
-            if height:
+            if height and not np.isnan(temperature):
                 ax.text(
                     bar.get_x() + bar.get_width() / 2,
                     bar.get_y() + height / 2,
@@ -278,6 +306,8 @@ def get_precipitation_averages(connection, city_ids, start_date):
     """
     Retrieves the average 7-day precipitation for a list of cities starting from a given date.
 
+    The averages of all the cities are read with a single grouped query.
+
     Args:
         connection: SQLite database connection object.
         city_ids (list): List of city IDs to retrieve precipitation data for.
@@ -291,10 +321,14 @@ def get_precipitation_averages(connection, city_ids, start_date):
     city_names = []
     precipitation_averages = []
 
-    for city_id in city_ids:
-        results = fp1.average_seven_day_precipitation(connection, city_id, start_date)
+    averages_by_city = {}
+    results = fp1.average_seven_day_precipitation_all_cities(connection, start_date, days=7)
+    for row in results or []:
+        averages_by_city[row["city_id"]] = row
 
-        for row in results:
+    for city_id in city_ids:
+        row = averages_by_city.get(city_id)
+        if row is not None:
             city_names.append(row["city_name"])
             precipitation_averages.append(row["average_seven_day_precipitation"])
 
@@ -366,56 +400,38 @@ def plot_seven_day_precipitation_chart(city_names, precipitation_averages, start
 def temp_n_prep_by_city(connection, city_id, date_from, date_to):
     """
     Gets temperature and precipitation data for a specific city within a specified date range.
+
+    Long ranges are read from the memory-mapped snapshot of the city when it is up to date (see weather_snapshots).
+
+    Returns:
+        WeatherSeries: The dates and measures as NumPy columns (see weather_series), empty on a database error.
     """
     try:
-        query = """
-            SELECT dw.mean_temp AS mean_temperature,
-                   dw.min_temp AS min_temperature,
-                   dw.max_temp AS max_temperature,
-                   dw.precipitation AS precipitation,
-                   dw.date AS date
-            FROM [daily_weather_entries] AS dw
-            WHERE dw.city_id = ?
-              AND dw.date >= ?
-              AND dw.date <= ?
-            ORDER BY dw.date
-        """
-        cursor = connection.cursor()
-        results = cursor.execute(query, (city_id, date_from, date_to))
-
-        data = []
-        for row in results:
-            data.append({
-                'date': row['date'],
-                'min_temperature': row['min_temperature'],
-                'max_temperature': row['max_temperature'],
-                'mean_temperature': row['mean_temperature'],
-                'precipitation': row['precipitation']
-            })
-        return data
+        return load_city_series(connection, city_id, date_from, date_to)
     except sqlite3.OperationalError as ex:
         print("Database error:", ex)
-        return []
+        return WeatherSeries.empty()
 
 
 def plot_precipitation_histogram(city_name, data, start_date, end_date):
     """
     Plots a histogram of precipitation data for a specific city,
     including a vertical line for the average precipitation.
+
+    Args:
+        data (WeatherSeries): Daily weather of the city, as returned by temp_n_prep_by_city.
     """
-    if not data:
+    if not len(data):
         print(f"No data available for {city_name} in the specified date range.")
         return
 
-    precipitations = []
-    for row in data:
-        precipitations.append(row['precipitation'])
+    precipitations = data.precipitation[~np.isnan(data.precipitation)]
 
-    if not precipitations:
+    if not precipitations.size:
         print(f"No precipitation data available for {city_name}.")
         return
 
-    avg_precipitation = sum(precipitations) / len(precipitations)
+    avg_precipitation = float(precipitations.mean())
 
     plt.figure(figsize=(10, 6))
     plt.hist(precipitations, bins=20, color='green', alpha=0.7)
@@ -441,20 +457,16 @@ def plot_precipitation_histogram(city_name, data, start_date, end_date):
 def plot_scatter_plot(city_name, data, start_date, end_date):
     """
     Plots a scatter plot of mean_temperature against precipitation for a specific city.
+
+    Args:
+        data (WeatherSeries): Daily weather of the city, as returned by temp_n_prep_by_city.
     """
-    if not data:
+    if not len(data):
         print(f"No data available for {city_name} in the specified date range.")
         return
 
-    mean_temps = []
-    precipitations = []
-
-    for row in data:
-        mean_temps.append(row['mean_temperature'])
-        precipitations.append(row['precipitation'])
-
     plt.figure(figsize=(10, 6))
-    plt.scatter(mean_temps, precipitations, color='purple', alpha=0.6)
+    plt.scatter(data.mean_temperature, data.precipitation, color='purple', alpha=0.6)
     plt.title(f"Mean Temperature vs Precipitation - {city_name}\n({start_date} to {end_date})")
     plt.xlabel("Mean Temperature (°C)")
     plt.ylabel("Precipitation (mm)")
@@ -472,38 +484,65 @@ def plot_scatter_plot(city_name, data, start_date, end_date):
 
 # TEMP_N_PREP_BY_CITY FUNCTION FROM PLOT 4 IS USED IN THIS PLOT 6
 
+# The days are marked with a dot only while at most this many are visible; longer views are drawn as plain lines
+LINE_CHART_MARKER_MAX_DAYS = 60
+
 
 def plot_temperature_line_chart(city_name, data, start_date, end_date):
     """
     Plots temperature data dynamically for the entire input date range,
     with horizontal and vertical sliders and dragging functionality.
-    """
-    if not data:
-        print(f"No data available for {city_name} in the specified date range.")
-        return
 
-    dates = []
-    for row in data:
-        dates.append(row['date'])
+    Only the visible days are drawn. Whenever the visible dates change (slider, drag, zoom or resize), they are
+    drawn again at full resolution, or downsampled with LTTB to the pixel width of the axes when there are more
+    days than pixels. The days are marked with dots only while LINE_CHART_MARKER_MAX_DAYS days or fewer are
+    visible. The date ticks are placed by an AutoDateLocator.
 
-    min_temps = []
-    for row in data:
-        min_temps.append(row['min_temperature'])
+    The slider and drag interactions redraw only the lines, the axes, the legend and the sliders over a cached
+    background (blitting, see plot_blitting), and mouse drags are redrawn at most 30 times per second.
 
-    max_temps = []
-    for row in data:
-        max_temps.append(row['max_temperature'])
+    Args:
+        data (WeatherSeries): Daily weather of the city, as returned by temp_n_prep_by_city.
+    """
+    if not len(data):
+        print(f"No data available for {city_name} in the specified date range.")
+        return
 
-    mean_temps = []
-    for row in data:
-        mean_temps.append(row['mean_temperature'])
+    dates = data.dates
+    date_numbers = mdates.date2num(dates)
+    temperature_series = (data.min_temperature, data.max_temperature, data.mean_temperature)
+    lowest_temp = float(np.nanmin(data.min_temperature))
+    highest_temp = float(np.nanmax(data.max_temperature))
 
     fig, ax = plt.subplots(figsize=(12, 6))
     plt.subplots_adjust(bottom=0.3, left=0.2)
 
-    line_min, = ax.plot(dates, min_temps, label="Min Temp", color='blue', marker='.')
-    line_max, = ax.plot(dates, max_temps, label="Max Temp", color='red', marker='.')
-    line_mean, = ax.plot(dates, mean_temps, label="Mean Temp", color='green', marker='.')
+    line_min, = ax.plot([], [], label="Min Temp", color='blue')
+    line_max, = ax.plot([], [], label="Max Temp", color='red')
+    line_mean, = ax.plot([], [], label="Mean Temp", color='green')
+    lines = (line_min, line_max, line_mean)
+
+    def draw_visible_days(axes):
+        # One day on each side of the view keeps the lines going to the edges
+        view_start, view_end = axes.get_xlim()
+        first = max(int(np.searchsorted(date_numbers, view_start, side='left')) - 1, 0)
+        last = min(int(np.searchsorted(date_numbers, view_end, side='right')) + 1, len(date_numbers))
+        pixel_width = int(axes.bbox.width)
+
+        visible_dates = date_numbers[first:last]
+        marker = '.' if last - first <= LINE_CHART_MARKER_MAX_DAYS + 2 else 'None'
+        for line, temperatures in zip(lines, temperature_series):
+            visible_temperatures = temperatures[first:last]
+            kept = lttb_indices(visible_dates, visible_temperatures, pixel_width)
+            line.set_data(visible_dates[kept], visible_temperatures[kept])
+            line.set_marker(marker)
+
+    ax.callbacks.connect('xlim_changed', draw_visible_days)
+    fig.canvas.mpl_connect('resize_event', lambda event: draw_visible_days(ax))
+
+    date_locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(date_locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(date_locator))
 
     ax.set_title(f"Temperature Trends - {city_name}\n({start_date} to {end_date})")
     ax.set_xlabel(f"Date: from {start_date} to {end_date}", labelpad=10)
@@ -511,31 +550,37 @@ def plot_temperature_line_chart(city_name, data, start_date, end_date):
     ax.grid(True, linestyle='--', alpha=0.7)
     ax.legend()
 
-    ax.set_xlim(dates[0], dates[min(14, len(dates)) - 1])
-    ax.set_xticks(dates[:14])
-    ax.set_xticklabels(dates[:14], rotation=45)
+    ax.set_xlim(date_numbers[0], date_numbers[min(14, len(dates)) - 1])
 
-    ax.set_ylim(min(min_temps) - 5, max(max_temps) + 5)
+    ax.set_ylim(lowest_temp - 5, highest_temp + 5)
 
     ax_slider_x = plt.axes([0.2, 0.15, 0.65, 0.03], facecolor='lightgrey')
     slider_x = Slider(ax_slider_x, 'Horizontal Frame', 0, len(dates) - 14, valinit=0, valstep=1)
 
     ax_slider_y = plt.axes([0.05, 0.25, 0.03, 0.5], facecolor='lightgrey')
-    slider_y = Slider(ax_slider_y, 'Vertical Frame', min(min_temps) - 5, max(max_temps) + 5, valinit=0, orientation='vertical')
+    slider_y = Slider(ax_slider_y, 'Vertical Frame', lowest_temp - 5, highest_temp + 5, valinit=0, orientation='vertical')
 
     ax_slider_y.set_ylabel("Vertical Frame", labelpad=15, rotation=270)
 
+    # The sliders are redrawn by the blit manager instead of repainting the whole figure
+    slider_x.drawon = False
+    slider_y.drawon = False
+    blit_manager = BlitManager(
+        fig.canvas,
+        animated_artists=[*lines, ax.xaxis, ax.yaxis, ax.get_legend(), slider_x.valtext, slider_y.valtext],
+        redrawn_axes=[ax_slider_x, ax_slider_y],
+    )
+    motion_throttle = MotionThrottle()
+
     def update(val):
         frame_x = int(slider_x.val)
         frame_x_end = min(frame_x + 14, len(dates))
-        ax.set_xlim(dates[frame_x], dates[frame_x_end - 1])
-        ax.set_xticks(dates[frame_x:frame_x_end])
-        ax.set_xticklabels(dates[frame_x:frame_x_end], rotation=45)
+        ax.set_xlim(date_numbers[frame_x], date_numbers[frame_x_end - 1])
 
         frame_y = slider_y.val
-        ax.set_ylim(frame_y, max(max_temps) + 5)
+        ax.set_ylim(frame_y, highest_temp + 5)
 
-        fig.canvas.draw_idle()
+        blit_manager.update()
 
     slider_x.on_changed(update)
     slider_y.on_changed(update)
@@ -554,19 +599,27 @@ def plot_temperature_line_chart(city_name, data, start_date, end_date):
 
     def on_release(event):
         nonlocal dragging
+        # Show the last position of a drag whose final motion was skipped by the throttle
+        pending_event = motion_throttle.take_pending()
+        if dragging and pending_event is not None:
+            drag_to(pending_event)
         dragging = False
 
-    def on_motion(event):
-        nonlocal dragging, offset_x, offset_y
-        if not dragging or event.inaxes != ax:
-            return
+    def drag_to(event):
+        nonlocal offset_x, offset_y
         dx = event.xdata - offset_x
         dy = event.ydata - offset_y
         ax.set_xlim(ax.get_xlim()[0] - dx, ax.get_xlim()[1] - dx)
         ax.set_ylim(ax.get_ylim()[0] - dy, ax.get_ylim()[1] - dy)
         offset_x = event.xdata
         offset_y = event.ydata
-        fig.canvas.draw_idle()
+        blit_manager.update()
+
+    def on_motion(event):
+        if not dragging or event.inaxes != ax:
+            return
+        if motion_throttle.ready(event):
+            drag_to(event)
 
     fig.canvas.mpl_connect('button_press_event', on_press)
     fig.canvas.mpl_connect('button_release_event', on_release)
@@ -585,7 +638,8 @@ def prepare_and_plot_chart(connection, plot_function):
     Args:
         connection: The database connection object.
         plot_function: A function that takes (city_name, city_weather_records, date_from, date_to)
-                       as arguments and handles the plotting logic.
+                       as arguments and handles the plotting logic. city_weather_records is a
+                       WeatherSeries.
 
     Returns:
         None
@@ -613,12 +667,18 @@ def prepare_and_plot_chart(connection, plot_function):
                 else:
                     print(city_message)
 
-            available_dates = select_dates(connection)
-            if not available_dates:
+            catalog = get_catalog(connection)
+            first_date, last_date = catalog.date_bounds()
+            if first_date is None:
                 print("No available dates found in the database.")
                 return
 
-            print(f"Available date range: {min(available_dates)} - {max(available_dates)}")
+            city_first_date, city_last_date = catalog.city_date_bounds(city_id)
+            if city_first_date is not None:
+                print(f"Available date range: {first_date} - {last_date} "
+                      f"({catalog.cities[city_id]}: {city_first_date} - {city_last_date})")
+            else:
+                print(f"Available date range: {first_date} - {last_date}")
 
             while True:
                 date_from, date_to = get_date_input()
@@ -635,11 +695,7 @@ def prepare_and_plot_chart(connection, plot_function):
 
             city_weather_records = temp_n_prep_by_city(connection, city_id, date_from, date_to)
 
-            city_name = None
-            for row in fp1.select_all_cities(connection):
-                if row['id'] == city_id:
-                    city_name = row['name']
-                    break
+            city_name = catalog.cities.get(city_id)
 
             if city_name:
                 # Use the provided plot function to plot the chart
@@ -5,11 +5,25 @@
 # IMPORTED LIBRARIES - FOR API WEATHER DATA DOWNLOAD
 ##############################################################################
 import os
+import time
+import argparse
 import sqlite3
-import requests
+from functools import lru_cache
 from geopy.geocoders import Nominatim
 from timezonefinder import TimezoneFinder
 from datetime import datetime, timedelta
+from db_connections import get_connection
+from ingestion_metrics import IngestionMetrics, print_ingestion_metrics
+from open_meteo_client import (
+    ArchiveRequestError,
+    configure_archive_client,
+    get_archive_client,
+)
+from query_cache import bump_data_generations, create_data_generations_table
+from weather_aggregates import (
+    create_weather_aggregate_tables,
+    refresh_weather_aggregates,
+)
 
 
 ##############################################################################
@@ -31,8 +45,11 @@ def db_connection(connection):
     """
     Establishes and returns a connection to the SQLite database.
 
+    The connection of the current thread is shared through db_connections, with WAL journaling and the
+    other tuned PRAGMAs applied.
+
     Args:
-        connection: SQLite database connection object.
+        connection: Path to the SQLite database file.
 
     Returns:
         sqlite3.Connection: Active database connection with row factory set.
@@ -41,10 +58,7 @@ def db_connection(connection):
         sqlite3.OperationalError: If a connection error occurs.
     """
     try:
-        with sqlite3.connect(connection) as connection:
-            connection.row_factory = sqlite3.Row
-            connection.commit()
-            return connection
+        return get_connection(connection)
     except sqlite3.OperationalError as ex:
         print(ex)
 
@@ -54,7 +68,17 @@ def db_connection(connection):
 ##############################################
 def initialize_db(connection):
     """
-    Initializes the database structure by creating necessary columns if required .
+    Initializes the database structure by creating necessary columns, indexes and derived tables if required .
+
+    Indexes created on the daily_weather_entries table:
+        - idx_daily_weather_city_date: UNIQUE (city_id, date), used by the per-city date range queries
+          and by the (date, city_id) existence check during ingestion. Duplicate (city_id, date) rows
+          are merged first (see merge_duplicate_daily_entries) so that the unique index can be built.
+        - idx_daily_weather_date: (date), used by the cross-city date range queries.
+
+    The rolling_weather_windows, monthly_weather_rollups and yearly_weather_rollups tables are created
+    and filled from the existing daily entries the first time, and the geocode_cache and data_generations
+    tables are created.
     """
     with connection:
         cursor = connection.cursor()
@@ -72,13 +96,250 @@ def initialize_db(connection):
             ALTER TABLE daily_weather_entries ADD COLUMN sw_radiation REAL DEFAULT 0 NOT NULL;
             """)
 
+        # Check which indexes already exist on the daily_weather_entries table
+        index_list = cursor.execute("PRAGMA index_list(daily_weather_entries);")
+
+        index_names = []
+        for index in index_list:
+            index_names.append(index['name'])
+
+        if "idx_daily_weather_city_date" not in index_names:
+            # Merge the duplicate (city_id, date) rows into one before adding the unique index
+            removed_rows = merge_duplicate_daily_entries(cursor)
+            if removed_rows:
+                print(f"{removed_rows} duplicate daily weather rows removed, their readings merged into the "
+                      f"remaining row of the same city and date.")
+            cursor.execute("""
+            CREATE UNIQUE INDEX idx_daily_weather_city_date ON daily_weather_entries (city_id, date);
+            """)
+
+        if "idx_daily_weather_date" not in index_names:
+            cursor.execute("""
+            CREATE INDEX idx_daily_weather_date ON daily_weather_entries (date);
+            """)
+
+        # Create the rolling window and rollup tables and fill them from the existing daily entries
+        create_weather_aggregate_tables(connection)
+
+        # Create the geocoding cache
+        create_geocode_cache_table(connection)
+
+        # Create the data generations, bumped on every save to invalidate the cached query results
+        create_data_generations_table(connection)
+
+        # Refresh the query planner statistics for the indexes
+        cursor.execute("PRAGMA optimize;")
+
     print("Database initialized successfully!")
 
 
+def merge_duplicate_daily_entries(cursor):
+    """
+    Merges the daily_weather_entries rows sharing a (city_id, date) into the row with the lowest id, and
+    deletes the others.
+
+    A measure holding zero or NULL in the kept row takes the first non-zero, non-NULL value of the
+    duplicates, in id order, so no reading is lost.
+
+    Args:
+        cursor: SQLite cursor of the open transaction.
+
+    Returns:
+        int: Number of duplicate rows deleted.
+    """
+    measures = [info['name'] for info in cursor.execute("PRAGMA table_info(daily_weather_entries);")
+                if info['name'] not in ("id", "city_id", "date")]
+    cursor.execute("DROP TABLE IF EXISTS temp.duplicate_daily_entries;")
+    cursor.execute(f"""
+    CREATE TEMP TABLE duplicate_daily_entries AS
+    SELECT dw.id, dw.city_id, dw.date, {", ".join(f"dw.{measure}" for measure in measures)}
+    FROM daily_weather_entries AS dw
+    JOIN (
+        SELECT city_id, date FROM daily_weather_entries GROUP BY city_id, date HAVING COUNT(*) > 1
+    ) AS duplicated
+    ON duplicated.city_id = dw.city_id AND duplicated.date = dw.date;
+    """)
+    try:
+        duplicate_rows = cursor.execute("SELECT COUNT(*) FROM temp.duplicate_daily_entries;").fetchone()[0]
+        if not duplicate_rows:
+            return 0
+
+        cursor.execute("CREATE INDEX temp.idx_duplicate_daily_entries ON duplicate_daily_entries (city_id, date, id);")
+        merged_measures = ",\n".join(f"""
+        {measure} = COALESCE((
+            SELECT d.{measure} FROM temp.duplicate_daily_entries AS d
+            WHERE d.city_id = daily_weather_entries.city_id AND d.date = daily_weather_entries.date
+            AND d.{measure} IS NOT NULL AND d.{measure} != 0
+            ORDER BY d.id LIMIT 1
+        ), {measure})""" for measure in measures)
+        cursor.execute(f"""
+        UPDATE daily_weather_entries
+        SET {merged_measures}
+        WHERE id IN (SELECT MIN(id) FROM temp.duplicate_daily_entries GROUP BY city_id, date);
+        """)
+        cursor.execute("""
+        DELETE FROM daily_weather_entries
+        WHERE id IN (SELECT id FROM temp.duplicate_daily_entries)
+        AND id NOT IN (SELECT MIN(id) FROM temp.duplicate_daily_entries GROUP BY city_id, date);
+        """)
+        return cursor.rowcount
+    finally:
+        cursor.execute("DROP TABLE temp.duplicate_daily_entries;")
+
+
+############################################
+# GEOCODING CACHE TIME TO LIVE (IN DAYS)
+############################################
+GEOCODE_CACHE_TTL_DAYS = 30
+
+
+###################################################################
+# FUNCTIONS TO REUSE ONE GEOCODER AND TIMEZONE FINDER PER PROCESS
+###################################################################
+@lru_cache(maxsize=None)
+def get_geolocator():
+    """
+    Returns the Nominatim geocoder shared by the whole process.
+    """
+    return Nominatim(user_agent="onaolapofo")
+
+
+@lru_cache(maxsize=None)
+def get_timezone_finder():
+    """
+    Returns the TimezoneFinder shared by the whole process, so that its polygon data is only loaded once.
+    """
+    return TimezoneFinder()
+
+
+###################################################################
+# FUNCTIONS FOR THE PERSISTENT GEOCODING CACHE
+###################################################################
+def normalize_city_name(city_name):
+    """
+    Normalizes a city name into the key of the geocoding cache (case and extra spaces are ignored).
+    """
+    return " ".join(city_name.split()).casefold()
+
+
+def create_geocode_cache_table(connection):
+    """
+    Creates the geocode_cache table if it does not exist.
+
+    Args:
+        connection: SQLite database connection object.
+    """
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        city_key TEXT PRIMARY KEY,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        country TEXT NOT NULL,
+        timezone TEXT NOT NULL,
+        cached_at TEXT NOT NULL
+    );
+    """)
+
+
+def get_cached_city_details(connection, city_name, ttl_days=GEOCODE_CACHE_TTL_DAYS):
+    """
+    Looks up the details of a city in the geocoding cache.
+
+    Args:
+        connection: SQLite database connection object.
+        city_name (str): Name of the city.
+        ttl_days (int): Maximum age, in days, of a cached entry.
+
+    Returns:
+        dict: The cached latitude, longitude, country and timezone, or None if the city is not cached,
+        the entry is older than ttl_days or the cache table does not exist.
+    """
+    try:
+        cached_row = connection.execute("""
+        SELECT latitude, longitude, country, timezone FROM geocode_cache
+        WHERE city_key = ? AND cached_at >= datetime('now', ?);
+        """, (normalize_city_name(city_name), f"-{int(ttl_days)} days")).fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+    if not cached_row:
+        return None
+    return {"latitude": cached_row[0], "longitude": cached_row[1], "country": cached_row[2], "timezone": cached_row[3]}
+
+
+def cache_city_details(connection, city_name, city_details):
+    """
+    Saves the details of a city into the geocoding cache, replacing any older entry.
+
+    Args:
+        connection: SQLite database connection object.
+        city_name (str): Name of the city.
+        city_details (dict): Dictionary containing the city's latitude, longitude, country and timezone.
+    """
+    connection.execute("""
+    INSERT OR REPLACE INTO geocode_cache (city_key, latitude, longitude, country, timezone, cached_at)
+    VALUES (?, ?, ?, ?, ?, datetime('now'));
+    """, (normalize_city_name(city_name), city_details["latitude"], city_details["longitude"],
+          city_details["country"], city_details["timezone"]))
+
+
+###################################################################
+# FUNCTIONS TO FIND THE CITY DETAILS WITHOUT GEOCODING
+###################################################################
+def stored_city_details(connection, city_name=None):
+    """
+    Returns the details of the cities saved in the cities and countries tables, as used by save_weather_data.
+
+    Args:
+        connection: SQLite database connection object.
+        city_name (str, optional): Only returns this city.
+
+    Returns:
+        dict: City name mapped to its latitude, longitude, country and timezone.
+    """
+    query = """
+        SELECT c.name, c.latitude, c.longitude, co.name, co.timezone
+        FROM cities AS c
+        JOIN countries AS co
+        ON co.id = c.country_id
+    """
+    params = ()
+    if city_name is not None:
+        query += " WHERE c.name = ?"
+        params = (city_name,)
+
+    cities = {}
+    for row in connection.execute(query, params):
+        cities[row[0]] = {"latitude": row[1], "longitude": row[2], "country": row[3], "timezone": row[4]}
+    return cities
+
+
+def lookup_city_details(connection, city_name, ttl_days=GEOCODE_CACHE_TTL_DAYS):
+    """
+    Looks up the details of a city without geocoding, in the geocoding cache and then in the stored cities.
+
+    A city missing from the cache, or cached more than ttl_days ago, but already saved in the cities table
+    keeps the coordinates and the country of its saved row, so it is not geocoded again.
+
+    Args:
+        connection: SQLite database connection object.
+        city_name (str): Name of the city.
+        ttl_days (int): Maximum age, in days, of a cached entry.
+
+    Returns:
+        tuple: (city_details, needs_caching). city_details is None when the city must be geocoded, and
+        needs_caching is True when the details do not come from a valid cache entry.
+    """
+    city_details = get_cached_city_details(connection, city_name, ttl_days)
+    if city_details:
+        return city_details, False
+    return stored_city_details(connection, city_name).get(city_name), True
+
+
 ###################################################################
 # FUNCTION TO GET THE CITY DETAILS FROM GEOPY AND TIMEZONE FINDER
 ###################################################################
-def get_city_details(city_name):
+def geocode_city(city_name):
     """
     Get the latitude, longitude, country name, and timezone of a city using geopy and timezonefinder.
 
@@ -87,17 +348,18 @@ def get_city_details(city_name):
 
     Returns:
         dict: A dictionary containing latitude, longitude, country name, and timezone.
+
+    Raises:
+        ValueError: If the city or its timezone is not found.
     """
-    city_geolocator = Nominatim(user_agent="onaolapofo")
-    city_location = city_geolocator.geocode(city_name)
+    city_location = get_geolocator().geocode(city_name)
 
     if not city_location:
         raise ValueError(f"City '{city_name}' not found.")
 
     city_latitude, city_longitude = city_location.latitude, city_location.longitude
     city_country = city_location.address.split(",")[-1].strip()
-    city_timezone_finder = TimezoneFinder()
-    city_timezone = city_timezone_finder.timezone_at(lat=city_latitude, lng=city_longitude)
+    city_timezone = get_timezone_finder().timezone_at(lat=city_latitude, lng=city_longitude)
 
     if not city_timezone:
         raise ValueError(f"Timezone not found for city '{city_name}'.")
@@ -111,9 +373,51 @@ def get_city_details(city_name):
     return {"latitude": city_latitude, "longitude": city_longitude, "country": city_country, "timezone": city_timezone}
 
 
+def get_city_details(city_name, db_directory_n_name=None, ttl_days=GEOCODE_CACHE_TTL_DAYS):
+    """
+    Get the latitude, longitude, country name, and timezone of a city, from the geocoding cache or the stored
+    cities when possible (see lookup_city_details). Details that do not come from the cache are cached.
+
+    Args:
+        city_name (str): Name of the city.
+        db_directory_n_name (str, optional): Path to the SQLite database holding the geocoding cache.
+                                             The cache is not used when None.
+        ttl_days (int): Maximum age, in days, of a cached entry.
+
+    Returns:
+        dict: A dictionary containing latitude, longitude, country name, and timezone.
+
+    Raises:
+        ValueError: If the city or its timezone is not found.
+    """
+    if db_directory_n_name is None:
+        return geocode_city(city_name)
+
+    connection = get_connection(db_directory_n_name)
+    with connection:
+        city_details, needs_caching = lookup_city_details(connection, city_name, ttl_days)
+        if not needs_caching:
+            return city_details
+
+        if city_details is None:
+            city_details = geocode_city(city_name)
+        try:
+            cache_city_details(connection, city_name, city_details)
+        except sqlite3.OperationalError as ex:
+            print(f"The city details could not be cached: {ex}")
+        return city_details
+
+
 #################################################################
-# FUNCTION TO VALIDATE DATES
+# FUNCTIONS TO VALIDATE DATES
 #################################################################
+def latest_archive_date():
+    """
+    Returns the latest date available in the Open-Meteo archive: two days before today's date.
+    """
+    return datetime.now().date() - timedelta(days=2)
+
+
 def validate_dates(start_date, end_date):
     """
     Validates the start and end dates.
@@ -125,8 +429,7 @@ def validate_dates(start_date, end_date):
     Raises:
         ValueError: If the start date or end date is invalid based on the constraints.
     """
-    current_date = datetime.now().date()
-    two_days_before_today = current_date - timedelta(days=2)
+    two_days_before_today = latest_archive_date()
 
     formatted_start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
     formatted_end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
@@ -141,13 +444,284 @@ def validate_dates(start_date, end_date):
     print("Dates are valid!")
 
 
+#####################################################################
+# OPEN METEO DAILY VARIABLES AND THEIR DATABASE COLUMNS
+#####################################################################
+DAILY_WEATHER_COLUMNS = (
+    ("min_temp", "temperature_2m_min"),
+    ("max_temp", "temperature_2m_max"),
+    ("mean_temp", "temperature_2m_mean"),
+    ("precipitation", "precipitation_sum"),
+    ("sw_radiation", "shortwave_radiation_sum"),
+)
+
+
+#####################################################################
+# FUNCTIONS FOR SAVING THE DAILY WEATHER ROWS IN BULK
+#####################################################################
+def build_daily_weather_rows(city_id, daily_data):
+    """
+    Builds the daily_weather_entries rows of a city from the "daily" section of an Open-Meteo response.
+
+    Args:
+        city_id (int): ID of the city the rows belong to.
+        daily_data (dict): The "daily" section of the response, holding the "time" list and one list per
+                           Open-Meteo variable in DAILY_WEATHER_COLUMNS.
+
+    Returns:
+        list: A list of (date, min_temp, max_temp, mean_temp, precipitation, sw_radiation, city_id) tuples.
+    """
+    columns = [daily_data["time"]]
+    for _, open_meteo_variable in DAILY_WEATHER_COLUMNS:
+        columns.append(daily_data[open_meteo_variable])
+    columns.append([city_id] * len(daily_data["time"]))
+    return list(zip(*columns))
+
+
+def upsert_daily_weather_entries(cursor, daily_weather_rows):
+    """
+    Inserts the daily weather rows, or updates the existing (city_id, date) rows, with one executemany.
+
+    An existing row is only updated in the columns holding zero or NULL, and rows with no such column are
+    left untouched. A missing sw_radiation value is saved as 0, the default of the column.
+
+    Args:
+        cursor: SQLite cursor of the open transaction.
+        daily_weather_rows (list): Rows built by build_daily_weather_rows.
+
+    Raises:
+        sqlite3.OperationalError: If the (city_id, date) unique index created by initialize_db is missing.
+
+    Returns:
+        int: Number of rows inserted or updated.
+    """
+    cursor.executemany("""
+    INSERT INTO daily_weather_entries (
+        date, min_temp, max_temp, mean_temp, precipitation, sw_radiation, city_id
+    ) VALUES (?, ?, ?, ?, ?, COALESCE(?, 0), ?)
+    ON CONFLICT (city_id, date) DO UPDATE
+    SET
+        min_temp = CASE WHEN min_temp = 0 OR min_temp IS NULL THEN excluded.min_temp ELSE min_temp END,
+        max_temp = CASE WHEN max_temp = 0 OR max_temp IS NULL THEN excluded.max_temp ELSE max_temp END,
+        mean_temp = CASE WHEN mean_temp = 0 OR mean_temp IS NULL THEN excluded.mean_temp ELSE mean_temp END,
+        precipitation = CASE WHEN precipitation = 0 OR precipitation IS NULL THEN excluded.precipitation ELSE precipitation END,
+        sw_radiation = CASE WHEN sw_radiation = 0 OR sw_radiation IS NULL THEN excluded.sw_radiation ELSE sw_radiation END
+    WHERE min_temp = 0 OR min_temp IS NULL
+       OR max_temp = 0 OR max_temp IS NULL
+       OR mean_temp = 0 OR mean_temp IS NULL
+       OR precipitation = 0 OR precipitation IS NULL
+       OR sw_radiation = 0 OR sw_radiation IS NULL;
+    """, daily_weather_rows)
+    return cursor.rowcount
+
+
+def count_stored_days(cursor, city_id, daily_data):
+    """
+    Counts the days of a response already stored for the city, which the upsert updates or leaves untouched.
+
+    The archive API returns every day between the first and the last date, so the stored dates of that
+    range written as YYYY-MM-DD are the rows the upsert conflicts with.
+
+    Args:
+        cursor: SQLite cursor of the open transaction.
+        city_id (int): ID of the city.
+        daily_data (dict): The "daily" section of the Open-Meteo response.
+
+    Returns:
+        int: Number of stored days.
+    """
+    if not daily_data["time"]:
+        return 0
+    return cursor.execute("""
+    SELECT COUNT(*)
+    FROM daily_weather_entries
+    WHERE city_id = ? AND date BETWEEN ? AND ? AND length(date) = 10;
+    """, (city_id, daily_data["time"][0], daily_data["time"][-1])).fetchone()[0]
+
+
+#####################################################################
+# FUNCTION TO SAVE THE CITY AND ITS COUNTRY INTO THE DATABASE
+#####################################################################
+def save_city_and_country(cursor, city_name, city_details):
+    """
+    Ensures the country and the city exist in the countries and cities tables, and returns the city ID.
+
+    Args:
+        cursor: SQLite cursor of the open transaction.
+        city_name (str): Name of the city.
+        city_details (dict): Dictionary containing the city's latitude, longitude, country and timezone.
+
+    Returns:
+        int: ID of the city in the cities table.
+    """
+    citi_latitude, citi_longitude = city_details["latitude"], city_details["longitude"]
+    citi_country, citi_timezone = city_details["country"], city_details["timezone"]
+
+    # Check if the country exists, reuse it if found
+    country_id_column = cursor.execute("SELECT id FROM countries WHERE name = ?", (citi_country,))
+    country_id = None
+    for row in country_id_column:
+        country_id = row[0]
+        break
+    if not country_id:
+        cursor.execute("INSERT INTO countries (name, timezone) VALUES (?, ?)", (citi_country, citi_timezone))
+        country_id = cursor.lastrowid
+
+    # Check if the city exists, reuse it if found
+    city_data = cursor.execute("SELECT id, longitude, latitude, country_id FROM cities WHERE name = ?", (city_name,))
+    city_id = None
+    for row in city_data:
+        city_id, existing_longitude, existing_latitude, existing_country_id = row
+
+        # Update the city's longitude and latitude if they differ
+        if existing_longitude != citi_longitude or existing_latitude != citi_latitude:
+            cursor.execute("""
+            UPDATE cities SET longitude = ?, latitude = ? WHERE id = ?;
+            """, (citi_longitude, citi_latitude, city_id))
+
+        # Check if the country ID is different and update if necessary
+        if existing_country_id != country_id:
+            cursor.execute("""
+            UPDATE cities SET country_id = ? WHERE id = ?;
+            """, (country_id, city_id))
+        break
+    else:
+        cursor.execute("""
+        INSERT INTO cities (name, longitude, latitude, country_id)
+        VALUES (?, ?, ?, ?);
+        """, (city_name, citi_longitude, citi_latitude, country_id))
+        city_id = cursor.lastrowid
+
+    return city_id
+
+
+#####################################################################
+# FUNCTION FOR SPLITTING A DATE RANGE INTO CHUNKS
+#####################################################################
+# Number of days requested, and committed, at a time. One year keeps each response small
+DEFAULT_CHUNK_DAYS = 365
+
+
+def split_date_range(start_date, end_date, chunk_days=DEFAULT_CHUNK_DAYS):
+    """
+    Splits a date range into consecutive chunks of at most chunk_days days.
+
+    Args:
+        start_date (str): Start date of the range (YYYY-MM-DD format).
+        end_date (str): End date of the range, included (YYYY-MM-DD format).
+        chunk_days (int): Maximum number of days of a chunk.
+
+    Yields:
+        tuple: (chunk_start_date, chunk_end_date) strings, both included.
+
+    Raises:
+        ValueError: If chunk_days is lower than 1.
+    """
+    if chunk_days < 1:
+        raise ValueError("The chunk size must be at least one day.")
+
+    chunk_start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    last_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    while chunk_start <= last_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), last_date)
+        yield chunk_start.isoformat(), chunk_end.isoformat()
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+#####################################################################
+# FUNCTION FOR RETRIEVING THE DATA FROM THE OPEN METEO API
+#####################################################################
+def fetch_weather_data(city_name, city_details, start_date, end_date, metrics=None):
+    """
+    Gets the daily weather data of a city from the Open-Meteo archive API.
+
+    The request goes through the client shared by the process (see open_meteo_client), which reuses its
+    connections, retries with backoff on HTTP 429 and 5xx responses, and can replay recorded responses.
+
+    Args:
+        city_name (str): Name of the city, used in the error message.
+        city_details (dict): Dictionary containing the city's latitude, longitude, country and timezone.
+        start_date (str): Start date for the weather data to be retrieved (YYYY-MM-DD format).
+        end_date (str): End date for the weather data to be retrieved (YYYY-MM-DD format).
+        metrics (CityMetrics, optional): Metrics of the city, given the HTTP and decoding times and the bytes.
+
+    Returns:
+        dict: The "daily" section of the Open-Meteo response.
+
+    Raises:
+        ArchiveRequestError: A ValueError raised if the data could not be retrieved.
+    """
+    daily_variables = []
+    for _, open_meteo_variable in DAILY_WEATHER_COLUMNS:
+        daily_variables.append(open_meteo_variable)
+
+    try:
+        open_meteo_historical_weather_data = get_archive_client().get_daily(
+            city_details["latitude"], city_details["longitude"], start_date, end_date,
+            city_details["timezone"], daily_variables, metrics,
+        )
+    except ArchiveRequestError as ex:
+        raise ArchiveRequestError(f"Failed to get weather data for {city_name}. {ex}", ex.status_code) from ex
+
+    return open_meteo_historical_weather_data["daily"]
+
+
+#####################################################################
+# FUNCTION FOR SAVING THE RETRIEVED DATA INTO THE DATABASE
+#####################################################################
+def save_weather_data(connection, city_name, city_details, daily_data, start_date, end_date, row_counts=None):
+    """
+    Saves the daily weather data of a city, and refreshes the derived tables of the saved date range.
+
+    The caller is responsible for the transaction.
+
+    Args:
+        connection: SQLite database connection object.
+        city_name (str): Name of the city.
+        city_details (dict): Dictionary containing the city's latitude, longitude, country and timezone.
+        daily_data (dict): The "daily" section of the Open-Meteo response.
+        start_date (str): Start date of the retrieved data (YYYY-MM-DD format).
+        end_date (str): End date of the retrieved data (YYYY-MM-DD format).
+        row_counts (dict, optional): Filled with the number of rows "inserted", "updated" and "skipped" (stored
+            rows with no zero or NULL measure), at the cost of one more query.
+
+    Returns:
+        int: Number of daily rows saved.
+    """
+    cursor = connection.cursor()
+    city_id = save_city_and_country(cursor, city_name, city_details)
+
+    # Build the rows once and save them with a single batched upsert
+    daily_weather_rows = build_daily_weather_rows(city_id, daily_data)
+    if row_counts is None:
+        upsert_daily_weather_entries(cursor, daily_weather_rows)
+    else:
+        stored_days = count_stored_days(cursor, city_id, daily_data)
+        changed_rows = upsert_daily_weather_entries(cursor, daily_weather_rows)
+        row_counts["inserted"] = len(daily_weather_rows) - stored_days
+        row_counts["updated"] = changed_rows - row_counts["inserted"]
+        row_counts["skipped"] = len(daily_weather_rows) - changed_rows
+
+    # Refresh the rolling windows and rollups that depend on the saved dates, in the same transaction
+    refresh_weather_aggregates(connection, city_id, start_date, end_date)
+
+    # Invalidate the cached query results of the saved years
+    bump_data_generations(connection, city_id, start_date, end_date)
+
+    return len(daily_weather_rows)
+
+
 #####################################################################
 # FUNCTION FOR RETRIEVING AND SAVING THE DATA INTO THE DATABASE
 #####################################################################
-def retrieve_and_store_weather_data(city_name, city_details, db_directory_n_name, start_date, end_date):
+def retrieve_and_store_weather_data(city_name, city_details, db_directory_n_name, start_date, end_date,
+                                    chunk_days=DEFAULT_CHUNK_DAYS, progress_callback=None, metrics=None):
     """
     Retrieves weather data for a given city from the Open-Meteo API and stores it in the SQLite database.
 
+    The date range is retrieved in chunks of chunk_days days, each one committed before the next one is
+    requested, so only one chunk is held in memory and a failure only loses the chunk in flight.
+
     Args:
         city_name (str): Name of the city for which weather data is to be retrieved.
         city_details (dict): Dictionary containing the city's details, including:
@@ -158,12 +732,20 @@ def retrieve_and_store_weather_data(city_name, city_details, db_directory_n_name
         db_directory_n_name (str): Connection to the SQLite database file.
         start_date (str): Start date for the weather data to be retrieved (YYYY-MM-DD format).
         end_date (str): End date for the weather data to be retrieved (YYYY-MM-DD format).
+        chunk_days (int): Number of days retrieved and committed at a time.
+        progress_callback (callable, optional): Called after every committed chunk with
+            (city_name, chunk_start_date, chunk_end_date, rows).
+        metrics (IngestionMetrics, optional): Metrics of the run (see ingestion_metrics), given the HTTP,
+            decoding and write times, the bytes and the inserted, updated and skipped rows of the city.
 
     Process:
-        1. Connects to the SQLite database and ensures the country and city exist in the respective tables.
-        2. Updates city details (longitude, latitude, country_id) if discrepancies are found.
-        3. Get weather data from the Open-Meteo API for the specified date range.
-        4. Inserts or updates daily weather entries in the `daily_weather_entries` table, ensuring no duplicate entries.
+        1. Get weather data from the Open-Meteo API for the next chunk of the specified date range.
+        2. Connects to the SQLite database and ensures the country and city exist in the respective tables.
+        3. Updates city details (longitude, latitude, country_id) if discrepancies are found.
+        4. Inserts or updates daily weather entries in the `daily_weather_entries` table with one batched upsert,
+           ensuring no duplicate entries. initialize_db must have been run to create the (city_id, date) unique index.
+        5. Refreshes the rolling weather windows and the monthly and yearly rollups affected by the saved dates.
+        6. Commits the chunk and repeats with the next one.
 
     Raises:
         sqlite3.Error: If any database operation fails.
@@ -173,106 +755,38 @@ def retrieve_and_store_weather_data(city_name, city_details, db_directory_n_name
         - Success messages for saving weather data.
         - Error messages if weather data retrieval fails or a database error occurs.
     """
-    citi_latitude, citi_longitude = city_details["latitude"], city_details["longitude"]
-    citi_country, citi_timezone = city_details["country"], city_details["timezone"]
-
+    city_metrics = metrics.city(city_name) if metrics is not None else None
     try:
-        with sqlite3.connect(db_directory_n_name) as connection:
-            cursor = connection.cursor()
-
-            # Check if the country exists, reuse it if found
-            country_id_column = cursor.execute("SELECT id FROM countries WHERE name = ?", (citi_country,))
-            country_id = None
-            for row in country_id_column:
-                country_id = row[0]
-                break
-            if not country_id:
-                cursor.execute("INSERT INTO countries (name, timezone) VALUES (?, ?)", (citi_country, citi_timezone))
-                country_id = cursor.lastrowid
-
-            # Check if the city exists, reuse it if found
-            city_data = cursor.execute("SELECT id, longitude, latitude, country_id FROM cities WHERE name = ?", (city_name,))
-            city_id = None
-            for row in city_data:
-                city_id, existing_longitude, existing_latitude, existing_country_id = row
-                
-                # Update the city's longitude and latitude if they differ
-                if existing_longitude != citi_longitude or existing_latitude != citi_latitude:
-                    cursor.execute("""
-                    UPDATE cities SET longitude = ?, latitude = ? WHERE id = ?;
-                    """, (citi_longitude, citi_latitude, city_id))
-
-            # Check if the country ID is different and update if necessary
-                if existing_country_id != country_id:
-                    cursor.execute("""
-                    UPDATE cities SET country_id = ? WHERE id = ?;
-                    """, (country_id, city_id))
-                break
-            else:
-                cursor.execute("""
-                INSERT INTO cities (name, longitude, latitude, country_id)
-                VALUES (?, ?, ?, ?);
-                """, (city_name, citi_longitude, citi_latitude, country_id))
-                city_id = cursor.lastrowid
-
-            # OPEN METEO API URL
-            url = (
-                f"https://archive-api.open-meteo.com/v1/archive?"
-                f"latitude={citi_latitude}&longitude={citi_longitude}&start_date={start_date}&end_date={end_date}"
-                f"&daily=temperature_2m_max,temperature_2m_min,temperature_2m_mean,precipitation_sum,shortwave_radiation_sum"
-                f"&timezone={citi_timezone}"
-            )
-
-            response = requests.get(url)
-            if response.status_code == 200:
-                open_meteo_historical_weather_data = response.json()
-
-                # Process and store weather data
-                for retrieved_data, date in enumerate(open_meteo_historical_weather_data["daily"]["time"]):
-                    min_temp = open_meteo_historical_weather_data["daily"]["temperature_2m_min"][retrieved_data]
-                    max_temp = open_meteo_historical_weather_data["daily"]["temperature_2m_max"][retrieved_data]
-                    mean_temp = open_meteo_historical_weather_data["daily"]["temperature_2m_mean"][retrieved_data]
-                    precipitation = open_meteo_historical_weather_data["daily"]["precipitation_sum"][retrieved_data]
-                    radiation = open_meteo_historical_weather_data["daily"]["shortwave_radiation_sum"][retrieved_data]
-
-                    # Check if row already exists with valid date and city_id
-                    cursor.execute("""
-                    SELECT id, date, city_id FROM daily_weather_entries WHERE date = ? AND city_id = ?;
-                    """, (date, city_id))
-                    existing_rows = cursor.execute("""
-                    SELECT id, date, city_id FROM daily_weather_entries WHERE date = ? AND city_id = ?;
-                    """, (date, city_id))
-                    row_exists = False
-                    for _ in existing_rows:
-                        row_exists = True
-                        break
-
-                    if row_exists:
-                        # Update row only if it has null or zero values in any of the columns
-                        cursor.execute("""
-                        UPDATE daily_weather_entries
-                        SET
-                            min_temp = CASE WHEN min_temp = 0 OR min_temp IS NULL THEN ? ELSE min_temp END,
-                            max_temp = CASE WHEN max_temp = 0 OR max_temp IS NULL THEN ? ELSE max_temp END,
-                            mean_temp = CASE WHEN mean_temp = 0 OR mean_temp IS NULL THEN ? ELSE mean_temp END,
-                            precipitation = CASE WHEN precipitation = 0 OR precipitation IS NULL THEN ? ELSE precipitation END,
-                            sw_radiation = CASE WHEN sw_radiation = 0 OR sw_radiation IS NULL THEN ? ELSE sw_radiation END
-                        WHERE date = ? AND city_id = ?;
-                        """, (min_temp, max_temp, mean_temp, precipitation, radiation, date, city_id))
-                    else:
-                        cursor.execute("""
-                        INSERT INTO daily_weather_entries (
-                            date, min_temp, max_temp, mean_temp, precipitation, sw_radiation, city_id
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?);
-                        """, (date, min_temp, max_temp, mean_temp, precipitation, radiation, city_id))
-
-                print(f"Weather data for {city_name} saved successfully!")
-            else:
-                print(f"Failed to get weather data for {city_name}. HTTP Status Code: {response.status_code}")
+        connection = get_connection(db_directory_n_name)
+        for chunk_start, chunk_end in split_date_range(start_date, end_date, chunk_days):
+            daily_data = fetch_weather_data(city_name, city_details, chunk_start, chunk_end, city_metrics)
+
+            write_start = time.perf_counter()
+            row_counts = {} if city_metrics is not None else None
+            with connection:
+                rows = save_weather_data(connection, city_name, city_details, daily_data, chunk_start, chunk_end,
+                                         row_counts)
+            if city_metrics is not None:
+                city_metrics.record_chunk(time.perf_counter() - write_start, row_counts)
+
+            if progress_callback:
+                progress_callback(city_name, chunk_start, chunk_end, rows)
+
+        print(f"Weather data for {city_name} saved successfully!")
+        if city_metrics is not None:
+            city_metrics.status = "success"
     except sqlite3.Error as e:
         print(f"Database error: {e}")
+        if city_metrics is not None:
+            city_metrics.status, city_metrics.error = "failed", f"Database error: {e}"
+    except ValueError as e:
+        print(e)
+        if city_metrics is not None:
+            city_metrics.status, city_metrics.error = "failed", str(e)
     except Exception as e:
         print(f"Error: {e}")
+        if city_metrics is not None:
+            city_metrics.status, city_metrics.error = "failed", f"Error: {e}"
 
 
 ############################################################
@@ -338,11 +852,17 @@ def main():
     2. Establishes a connection to the SQLite database.
     3. Initializes the database / ensures necessary tables are set up.
     4. Optionally swaps longitude and latitude columns if needed.
-    5. Prompts the user to input a date range (start date and end date) for the weather data.
+    5. Prompts the user to input a date range (start date and end date) for the weather data, unless it is
+       given with --start-date and --end-date.
     6. Validates the entered dates to ensure they are within the available range.
-    7. Retrieves weather data for the predefined list of cities.
-    8. For each city, get city details, retrieves weather data from the Open-Meteo API, and stores it in the database.
-    9. Catches and prints any errors encountered during the process.
+    7. Plans the date intervals missing from the database, or holding NULL measures, for the predefined list
+       of cities. --full retrieves the whole range instead, and --incremental extends every city from
+       --start-date, or from its first stored date, up to --end-date or two days before today.
+    8. Gets the city details and the weather data of several cities at the same time (--workers, default 4),
+       while a single writer stores them in the database, one chunk of --chunk-days days (default 365) at a time.
+    9. Prints a success or failure summary for every city and catches any errors encountered during the process.
+    10. Prints the ingestion metrics (time per stage, inserted, updated and skipped rows, bytes, rows per second),
+        and saves them as JSON (--metrics-json) or as a Prometheus textfile (--metrics-textfile) when asked.
 
     Raises:
         ValueError: If the user enters invalid date input.
@@ -353,6 +873,35 @@ def main():
         - Error messages if issues occur.
     """
 
+    # Imported here because the weather_ingestion module imports this module
+    from weather_ingestion import DEFAULT_MAX_WORKERS, ingest_cities, print_chunk_progress, print_ingestion_summary
+    from sync_planner import plan_incremental_sync, plan_sync
+
+    parser = argparse.ArgumentParser(description="Retrieve Open-Meteo weather data into the SQLite database.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"number of cities retrieved at the same time (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--start-date", help="start date (YYYY-MM-DD), asked for when not given")
+    parser.add_argument("--end-date", help="end date (YYYY-MM-DD), asked for when not given")
+    parser.add_argument("--chunk-days", type=int, default=DEFAULT_CHUNK_DAYS,
+                        help=f"number of days requested and committed at a time (default: {DEFAULT_CHUNK_DAYS})")
+    sync_options = parser.add_mutually_exclusive_group()
+    sync_options.add_argument("--incremental", action="store_true",
+                              help="extend every city from --start-date, or from its first stored date, up to --end-date "
+                                   "or two days before today")
+    sync_options.add_argument("--full", action="store_true",
+                              help="retrieve the whole date range, even the dates already stored")
+    recording_options = parser.add_mutually_exclusive_group()
+    recording_options.add_argument("--record-dir", help="save every API response into this directory")
+    recording_options.add_argument("--replay-dir", help="answer from the responses saved in this directory, without network access")
+    parser.add_argument("--metrics-json", help="save the ingestion metrics of the run into this JSON file")
+    parser.add_argument("--metrics-textfile", help="save the ingestion metrics of the run into this Prometheus textfile")
+    args = parser.parse_args()
+
+    if args.record_dir:
+        configure_archive_client(mode="record", recordings_dir=args.record_dir)
+    elif args.replay_dir:
+        configure_archive_client(mode="replay", recordings_dir=args.replay_dir)
+
     change_to_script_directory()
     db_directory_n_name = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
     connection = db_connection(db_directory_n_name)
@@ -370,21 +919,49 @@ def main():
     cities = ["Lagos", "Middlesbrough", "London", "Leeds", "Paris", "Toulouse"]
 
     try:
-        start_date = input("Enter the start date (YYYY-MM-DD): ").strip()
-        end_date = input("Enter the end date (YYYY-MM-DD): ").strip()
+        if args.incremental:
+            end_date = args.end_date or latest_archive_date().isoformat()
+            if args.start_date:
+                validate_dates(args.start_date, end_date)
+            elif datetime.strptime(end_date, "%Y-%m-%d").date() > latest_archive_date():
+                raise ValueError(f"The end date cannot be after two days before today's date: {latest_archive_date()}.")
+
+            initialize_db(connection)
 
-        validate_dates(start_date, end_date)
+            sync_plan, unplanned_cities = plan_incremental_sync(connection, cities, args.start_date, date_to=end_date)
+            for city_name in unplanned_cities:
+                print(f"No weather data is stored for {city_name} yet. Use --start-date to retrieve it.")
+                cities.remove(city_name)
+        else:
+            start_date = args.start_date or input("Enter the start date (YYYY-MM-DD): ").strip()
+            end_date = args.end_date or input("Enter the end date (YYYY-MM-DD): ").strip()
 
-        initialize_db(connection)
+            validate_dates(start_date, end_date)
 
-        for city_name in cities:
-            try:
-                city_details = get_city_details(city_name)
-                retrieve_and_store_weather_data(city_name, city_details, db_directory_n_name, start_date, end_date)
-            except ValueError as e:
-                print(e)
+            initialize_db(connection)
+
+            if args.full:
+                sync_plan = {city_name: [(start_date, end_date)] for city_name in cities}
+            else:
+                sync_plan = plan_sync(connection, cities, start_date, end_date)
+
+        metrics = IngestionMetrics()
+        ingestion_summary = ingest_cities(db_directory_n_name, cities, max_workers=args.workers, sync_plan=sync_plan,
+                                          chunk_days=args.chunk_days, progress_callback=print_chunk_progress,
+                                          metrics=metrics)
+        print_ingestion_summary(ingestion_summary)
+        print_ingestion_metrics(metrics)
     except ValueError as e:
         print(e)
+        return
+
+    try:
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_textfile:
+            metrics.write_prometheus_textfile(args.metrics_textfile)
+    except OSError as e:
+        print(f"The ingestion metrics could not be saved: {e}")
 
 
 if __name__ == "__main__":
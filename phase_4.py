@@ -12,10 +12,10 @@ import sys
 from phase_3 import (
     initialize_db,
     db_connection,
-    get_city_details,
     validate_dates,
-    retrieve_and_store_weather_data,
 )
+from weather_ingestion import ingest_cities, print_ingestion_summary
+from sync_planner import plan_sync
 
 ############################################
 # DEFAULT CITIES
@@ -71,6 +71,9 @@ def setup_database():
 def update_sdi_ica_database(start_date, end_date):
     """
     Updates the database using start date and end date inputs from the GUI.
+
+    Only the dates missing from the database, or holding NULL measures, are retrieved. The cities are
+    retrieved concurrently and a warning lists the cities that could not be stored.
     """
     try:
         validate_dates(start_date, end_date)
@@ -82,19 +85,24 @@ def update_sdi_ica_database(start_date, end_date):
         db_path = get_database_path()
         connection = db_connection(db_path)
         initialize_db(connection)
+        sync_plan = plan_sync(connection, DEFAULT_CITIES, start_date, end_date)
     except Exception as e:
         messagebox.showerror("Database Error", f"Error initializing the database: {e}")
         return
 
     try:
-        for city_name in DEFAULT_CITIES:
-            try:
-                city_details = get_city_details(city_name)
-                retrieve_and_store_weather_data(city_name, city_details, db_path, start_date, end_date)
-            except ValueError as e:
-                print(f"Error fetching data for {city_name}: {e}")
-                continue
-        messagebox.showinfo("Success", "Weather data fetched and stored successfully!")
+        ingestion_summary = ingest_cities(db_path, DEFAULT_CITIES, sync_plan=sync_plan)
+        print_ingestion_summary(ingestion_summary)
+
+        failed_cities = []
+        for city_name, city_summary in ingestion_summary.items():
+            if city_summary["status"] == "failed":
+                failed_cities.append(f"{city_name}: {city_summary['error']}")
+
+        if failed_cities:
+            messagebox.showwarning("Partial Success", "Weather data could not be stored for:\n" + "\n".join(failed_cities))
+        else:
+            messagebox.showinfo("Success", "Weather data fetched and stored successfully!")
     except Exception as e:
         messagebox.showerror("Error", f"An error occurred: {e}")
 
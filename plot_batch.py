@@ -0,0 +1,395 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE HEADLESS BATCH RENDERING OF THE PLOTS
+##############################################################################
+import os
+import sys
+import json
+import time
+import argparse
+import sqlite3
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use("Agg")  # Selected before phase_2 imports pyplot, so no window is ever opened
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import phase_2 as fp2  # IMPORTED MODULE FROM THE PHASE 2 OF THIS ICA
+from phase_1 import validate_db_dates, validate_year
+from weather_catalog import get_catalog
+
+
+############################################
+# DEFAULT BATCH SETTINGS
+############################################
+DEFAULT_DB_PATH = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
+DEFAULT_OUTPUT_DIR = "charts"
+DEFAULT_FORMATS = ("png",)
+DEFAULT_DPI = 100
+OUTPUT_FORMATS = ("png", "svg")
+ALL_PLOTS = (1, 2, 3, 4, 5, 6)
+
+# Plots drawn from the daily weather of one city, rendered together from a single load of the data
+CITY_PLOTS = {
+    4: ("precipitation_histogram", fp2.plot_precipitation_histogram),
+    5: ("temperature_precipitation_scatter", fp2.plot_scatter_plot),
+    6: ("temperature_line_chart", fp2.plot_temperature_line_chart),
+}
+
+TIMINGS_FILE = "render_timings.json"
+
+
+##############################################################################
+# FUNCTIONS TO RENDER ONE FIGURE TO FILES
+##############################################################################
+def init_worker():
+    """
+    Prepares a worker process: the Agg backend is forced, whatever the matplotlib configuration says.
+    """
+    matplotlib.use("Agg", force=True)
+
+
+def render_figure(draw, output_dir, file_name, formats, dpi=DEFAULT_DPI, adjust=None):
+    """
+    Draws a figure with a phase 2 plot function and saves it in every format.
+
+    The phase 2 plot functions end with plt.show(), which does nothing with the Agg backend, so the
+    figure they leave as the current figure is saved and then closed.
+
+    Args:
+        draw (callable): Function drawing the figure, taking no arguments.
+        output_dir (str): Directory the files are written to.
+        file_name (str): File name of the figure, without extension.
+        formats (iterable): File formats, from OUTPUT_FORMATS.
+        dpi (int): Resolution of the PNG files.
+        adjust (callable, optional): Function receiving the figure before it is saved.
+
+    Returns:
+        dict: The "files" written, empty when the plot function drew nothing, and the "render_seconds".
+    """
+    started = time.perf_counter()
+    plt.close("all")
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*non-interactive.*", category=UserWarning)
+        draw()
+
+    files = []
+    if plt.get_fignums():
+        figure = plt.gcf()
+        if adjust is not None:
+            adjust(figure)
+        for file_format in formats:
+            file_path = os.path.join(output_dir, f"{file_name}.{file_format}")
+            figure.savefig(file_path, format=file_format, dpi=dpi)
+            files.append(file_path)
+        plt.close(figure)
+
+    return {"files": files, "render_seconds": time.perf_counter() - started}
+
+
+##############################################################################
+# RENDERING JOBS - EVERY JOB RUNS IN ONE WORKER PROCESS WITH ITS OWN CONNECTION
+##############################################################################
+def render_annual_temperatures(db_path, output_dir, formats, dpi, city_ids, years):
+    """
+    Renders plot 1, the grouped bar chart of the annual mean temperature by city and year.
+    """
+    connection = fp2.db_connection(db_path)
+    started = time.perf_counter()
+    city_names = [get_catalog(connection).cities[city_id] for city_id in city_ids]
+    record = fp2.calculate_annual_temperatures(connection, city_ids, years)
+    load_seconds = time.perf_counter() - started
+
+    plot = render_figure(lambda: fp2.plot_annual_temperatures_grouped_bar(city_names, record), output_dir,
+                         f"plot1_annual_temperatures_{min(years)}-{max(years)}", formats, dpi)
+    return {"job": "annual temperatures", "load_seconds": load_seconds, "plots": {1: plot}}
+
+
+def render_mean_temperatures(db_path, output_dir, formats, dpi, date_from, date_to):
+    """
+    Renders plot 2, the bar chart of the average mean temperature by city with the overall mean.
+    """
+    connection = fp2.db_connection(db_path)
+    started = time.perf_counter()
+    mean_temperature_record = fp2.get_mean_temperature_data(connection, date_from, date_to)
+    data = fp2.process_mean_temperature_data(mean_temperature_record)
+    mean_temperature = fp2.calculate_mean_temperature(data["average_mean_temperatures"])
+    load_seconds = time.perf_counter() - started
+
+    plot = render_figure(lambda: fp2.plot_bar_chart_with_mean(data, mean_temperature, date_from, date_to),
+                         output_dir, f"plot2_mean_temperature_{date_from}_{date_to}", formats, dpi)
+    return {"job": "mean temperature", "load_seconds": load_seconds, "plots": {2: plot}}
+
+
+def render_seven_day_precipitation(db_path, output_dir, formats, dpi, city_ids, start_date):
+    """
+    Renders plot 3, the bar chart of the seven-day precipitation by city.
+    """
+    connection = fp2.db_connection(db_path)
+    started = time.perf_counter()
+    end_date = connection.execute("SELECT date(?, '+6 days');", (start_date,)).fetchone()[0]
+    city_names, precipitation_averages = fp2.get_precipitation_averages(connection, city_ids, start_date)
+    load_seconds = time.perf_counter() - started
+
+    plot = render_figure(
+        lambda: fp2.plot_seven_day_precipitation_chart(city_names, precipitation_averages, start_date, end_date),
+        output_dir, f"plot3_seven_day_precipitation_{start_date}", formats, dpi)
+    return {"job": "seven-day precipitation", "load_seconds": load_seconds, "plots": {3: plot}}
+
+
+def show_whole_range(figure, dates):
+    """
+    Shows every day in the temperature line chart of plot 6, which opens on its first days for the
+    interactive sliders. The visible days are downsampled to the width of the axes when drawn.
+    """
+    if len(dates) > 1:
+        figure.axes[0].set_xlim(mdates.date2num(dates[0]), mdates.date2num(dates[-1]))
+
+
+def render_city_plots(db_path, output_dir, formats, dpi, city_id, city_name, date_from, date_to, plots):
+    """
+    Renders plots 4 to 6 of a city from one load of its daily weather, one figure after the other.
+    """
+    connection = fp2.db_connection(db_path)
+    started = time.perf_counter()
+    data = fp2.temp_n_prep_by_city(connection, city_id, date_from, date_to)
+    load_seconds = time.perf_counter() - started
+
+    rendered_plots = {}
+    for plot_number in plots:
+        plot_name, plot_function = CITY_PLOTS[plot_number]
+        rendered_plots[plot_number] = render_figure(
+            lambda: plot_function(city_name, data, date_from, date_to), output_dir,
+            f"plot{plot_number}_{plot_name}_city{city_id}_{date_from}_{date_to}", formats, dpi,
+            adjust=(lambda figure: show_whole_range(figure, data.dates)) if plot_number == 6 else None)
+    return {"job": f"city {city_id} ({city_name})", "load_seconds": load_seconds, "plots": rendered_plots}
+
+
+##############################################################################
+# FUNCTIONS TO PLAN AND RUN THE BATCH
+##############################################################################
+def load_config(config_path):
+    """
+    Reads the options of a batch from a JSON file, for example:
+
+        {"cities": [1, 2], "years": ["2020", "2021"], "date_from": "2020-01-01", "date_to": "2021-12-31",
+         "seven_day_start": "2021-06-01", "plots": [1, 2, 3, 4, 5, 6], "formats": ["png", "svg"],
+         "output_dir": "charts", "workers": 4}
+
+    Returns:
+        dict: The options.
+
+    Raises:
+        ValueError: If the file is not a JSON object.
+    """
+    with open(config_path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+    if not isinstance(config, dict):
+        raise ValueError(f"The configuration {config_path} must be a JSON object.")
+    return config
+
+
+def plan_render_jobs(connection, options):
+    """
+    Validates the options of a batch against the database and lists the rendering jobs.
+
+    Args:
+        connection: SQLite database connection object.
+        options (dict): Options of the batch. Missing cities, years or dates default to everything stored,
+                        and the seven-day window starts on date_from by default.
+
+    Returns:
+        list: (job function, keyword arguments) of every job, plots 4 to 6 grouped into one job per city.
+
+    Raises:
+        ValueError: If an option is not valid for the database.
+    """
+    catalog = get_catalog(connection)
+    first_date, last_date = catalog.date_bounds()
+    if first_date is None:
+        raise ValueError("No available dates found in the database.")
+
+    plots = sorted({int(plot) for plot in options.get("plots") or ALL_PLOTS})
+    for plot in plots:
+        if plot not in ALL_PLOTS:
+            raise ValueError(f"Unknown plot {plot}. Choose from {list(ALL_PLOTS)}.")
+
+    city_ids = [int(city_id) for city_id in options.get("cities") or catalog.cities]
+    for city_id in city_ids:
+        if not catalog.has_city(city_id):
+            raise ValueError(f"Invalid City ID {city_id}. Please choose from the following IDs: {list(catalog.cities)}.")
+
+    years = [str(year) for year in options.get("years") or catalog.years]
+    for year in years:
+        valid, error_message = validate_year(year, catalog.years)
+        if not valid:
+            raise ValueError(error_message)
+
+    date_from = options.get("date_from") or first_date
+    date_to = options.get("date_to") or last_date
+    seven_day_start = options.get("seven_day_start") or date_from
+    for range_from, range_to in ((date_from, date_to), (seven_day_start, seven_day_start)):
+        valid, error_message = validate_db_dates(range_from, range_to, catalog.dates)
+        if not valid:
+            raise ValueError(error_message)
+
+    jobs = []
+    if 1 in plots:
+        jobs.append((render_annual_temperatures, {"city_ids": city_ids, "years": years}))
+    if 2 in plots:
+        jobs.append((render_mean_temperatures, {"date_from": date_from, "date_to": date_to}))
+    if 3 in plots:
+        jobs.append((render_seven_day_precipitation, {"city_ids": city_ids, "start_date": seven_day_start}))
+    city_plots = [plot for plot in plots if plot in CITY_PLOTS]
+    if city_plots:
+        for city_id in city_ids:
+            jobs.append((render_city_plots, {"city_id": city_id, "city_name": catalog.cities[city_id],
+                                             "date_from": date_from, "date_to": date_to, "plots": city_plots}))
+    return jobs
+
+
+def run_render_jobs(db_path, jobs, output_dir, formats, dpi=DEFAULT_DPI, max_workers=None):
+    """
+    Runs the rendering jobs across a pool of worker processes. Every worker renders one figure at a time
+    with the Agg backend and reads the database through its own read-only connection.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        jobs (list): Jobs returned by plan_render_jobs.
+        output_dir (str): Directory the files are written to.
+        formats (iterable): File formats, from OUTPUT_FORMATS.
+        dpi (int): Resolution of the PNG files.
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs, and 1
+                                     renders in this process.
+
+    Returns:
+        list: The result of every job, in the order of the jobs, with an "error" message for the failed jobs.
+    """
+    db_path = os.path.abspath(db_path)
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    formats = tuple(formats)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs) or 1))
+
+    results = [None] * len(jobs)
+    if max_workers == 1:
+        for position, (job_function, job_arguments) in enumerate(jobs):
+            try:
+                results[position] = job_function(db_path, output_dir, formats, dpi, **job_arguments)
+            except Exception as ex:
+                results[position] = {"job": job_function.__name__, "error": str(ex), "plots": {}}
+        return results
+
+    # Workers are spawned rather than forked, so no connection of this process is shared with them
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker) as executor:
+        futures = {}
+        for position, (job_function, job_arguments) in enumerate(jobs):
+            future = executor.submit(job_function, db_path, output_dir, formats, dpi, **job_arguments)
+            futures[future] = (position, job_function.__name__)
+        for future in as_completed(futures):
+            position, job_name = futures[future]
+            try:
+                results[position] = future.result()
+            except Exception as ex:
+                results[position] = {"job": job_name, "error": str(ex), "plots": {}}
+    return results
+
+
+def print_render_timings(results, total_seconds):
+    """
+    Prints the data load time of every job and the render time and files of every plot.
+    """
+    print(f"\n{'Job':<32} {'Plot':>4} {'Load (s)':>9} {'Render (s)':>11}  Files")
+    for result in results:
+        if result.get("error"):
+            print(f"{result['job']:<32} {'-':>4} {'-':>9} {'-':>11}  FAILED: {result['error']}")
+            continue
+        for plot_number, plot in sorted(result["plots"].items()):
+            files = ", ".join(os.path.basename(file_path) for file_path in plot["files"]) or "no data, nothing drawn"
+            print(f"{result['job']:<32} {plot_number:>4} {result['load_seconds']:>9.2f} "
+                  f"{plot['render_seconds']:>11.2f}  {files}")
+    print(f"\nTotal: {total_seconds:.2f} s")
+
+
+#################################################################
+# BATCH RENDERING COMMAND - REFERENCED AS MAIN
+#################################################################
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render the phase 2 plots to PNG/SVG files without a display.")
+    parser.add_argument("--config", help="JSON file with the options; the command line options take precedence")
+    parser.add_argument("--db", help=f"path to the SQLite database (default: {DEFAULT_DB_PATH})")
+    parser.add_argument("--plots", type=int, nargs="+", choices=ALL_PLOTS, help="plots to render (default: all)")
+    parser.add_argument("--cities", type=int, nargs="+", help="city IDs of plots 1 and 3 to 6 (default: all cities)")
+    parser.add_argument("--years", nargs="+", help="years (YYYY) of plot 1 (default: all years)")
+    parser.add_argument("--date-from", help="start date (YYYY-MM-DD) of plots 2, 4, 5 and 6 (default: first stored date)")
+    parser.add_argument("--date-to", help="end date (YYYY-MM-DD) of plots 2, 4, 5 and 6 (default: last stored date)")
+    parser.add_argument("--seven-day-start", help="start date (YYYY-MM-DD) of plot 3 (default: the start date)")
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS,
+                        help=f"file formats (default: {' '.join(DEFAULT_FORMATS)})")
+    parser.add_argument("--output-dir", help=f"directory the files are written to (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--dpi", type=int, help=f"resolution of the PNG files (default: {DEFAULT_DPI})")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: number of CPUs)")
+    return parser
+
+
+def main(argv=None):
+    """
+    Renders the phase 2 plots without a display, for example:
+
+        python plot_batch.py --cities 1 2 --years 2020 2021 --date-from 2020-01-01 --date-to 2021-12-31 --formats png svg
+        python plot_batch.py --config charts.json --workers 4
+
+    The data load and render times are printed and written to render_timings.json in the output directory.
+
+    Returns:
+        int: The exit status, 0 when every plot was rendered and 1 otherwise.
+    """
+    args = build_parser().parse_args(argv)
+    try:
+        options = load_config(args.config) if args.config else {}
+    except (OSError, ValueError) as ex:
+        print(f"The configuration could not be read: {ex}", file=sys.stderr)
+        return 1
+    for option, value in vars(args).items():
+        if option != "config" and value is not None:
+            options[option] = value
+
+    db_path = options.get("db", DEFAULT_DB_PATH)
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}", file=sys.stderr)
+        return 1
+    output_dir = options.get("output_dir", DEFAULT_OUTPUT_DIR)
+    formats = options.get("formats") or DEFAULT_FORMATS
+    for file_format in formats:
+        if file_format not in OUTPUT_FORMATS:
+            print(f"Unknown format {file_format}. Choose from {', '.join(OUTPUT_FORMATS)}.", file=sys.stderr)
+            return 1
+
+    connection = fp2.db_connection(db_path)
+    if not connection:
+        print("Failed to connect to the database.", file=sys.stderr)
+        return 1
+    try:
+        jobs = plan_render_jobs(connection, options)
+    except (ValueError, sqlite3.Error) as ex:
+        print(ex, file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    results = run_render_jobs(db_path, jobs, output_dir, formats, options.get("dpi", DEFAULT_DPI), options.get("workers"))
+    total_seconds = time.perf_counter() - started
+    print_render_timings(results, total_seconds)
+
+    timings = {"total_seconds": total_seconds, "jobs": results}
+    with open(os.path.join(output_dir, TIMINGS_FILE), "w", encoding="utf-8") as timings_file:
+        json.dump(timings, timings_file, indent=2)
+
+    return 1 if any(result.get("error") for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE BLITTED REDRAWS OF THE INTERACTIVE PLOTS
+##############################################################################
+import time
+
+
+############################################
+# DEFAULT REDRAW SETTINGS
+############################################
+# Mouse motion is redrawn at most this number of times per second
+MAX_MOTION_FRAMES_PER_SECOND = 30
+
+
+##############################################################################
+# BLIT MANAGER - REDRAWS ONLY THE CHANGING ARTISTS OVER A CACHED BACKGROUND
+##############################################################################
+class BlitManager:
+    """
+    Redraws the changing artists of a figure over a cached copy of its static background.
+
+    The changing artists are marked as animated, so a full draw leaves them out: the result is cached
+    as the background, then the artists are drawn over it. An update restores the background, draws the
+    changing artists and the redrawn axes again, and copies ("blits") the figure to the screen.
+
+    Backends that cannot blit, and updates before the first draw, fall back to draw_idle.
+    """
+
+    def __init__(self, canvas, animated_artists=(), redrawn_axes=()):
+        """
+        Args:
+            canvas: Canvas of the figure.
+            animated_artists (iterable): Artists that change, drawn on every update in this order.
+            redrawn_axes (iterable): Axes drawn again on every update, over the background, for example
+                                     the slider axes whose handles move.
+        """
+        self.canvas = canvas
+        self.background = None
+        self.animated_artists = []
+        self.redrawn_axes = list(redrawn_axes)
+        for artist in animated_artists:
+            self.add_artist(artist)
+        self.draw_connection = canvas.mpl_connect("draw_event", self.on_draw)
+
+    def add_artist(self, artist):
+        """
+        Marks an artist as animated and draws it on every update.
+        """
+        artist.set_animated(True)
+        self.animated_artists.append(artist)
+
+    def on_draw(self, event):
+        """
+        Caches the background after every full draw (first show, resize, toolbar zoom), then draws the
+        animated artists over it.
+        """
+        if event is not None and event.canvas is not self.canvas:
+            return
+        if not getattr(self.canvas, "supports_blit", False):
+            return
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        figure = self.canvas.figure
+        for axes in self.redrawn_axes:
+            figure.draw_artist(axes)
+        for artist in self.animated_artists:
+            figure.draw_artist(artist)
+
+    def update(self):
+        """
+        Redraws the animated artists over the cached background, or the whole figure when blitting is not possible.
+        """
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
+
+class MotionThrottle:
+    """
+    Limits how often mouse motion is handled. The latest skipped event is kept so it can be handled
+    later, for example when the mouse button is released.
+    """
+
+    def __init__(self, max_frames_per_second=MAX_MOTION_FRAMES_PER_SECOND):
+        self.frame_interval = 1.0 / max_frames_per_second
+        self.last_frame = 0.0
+        self.pending_event = None
+
+    def ready(self, event):
+        """
+        Returns True if the event should be handled now, otherwise keeps it as the pending event.
+        """
+        now = time.perf_counter()
+        if now - self.last_frame < self.frame_interval:
+            self.pending_event = event
+            return False
+        self.last_frame = now
+        self.pending_event = None
+        return True
+
+    def take_pending(self):
+        """
+        Returns and forgets the latest skipped event, or None.
+        """
+        event, self.pending_event = self.pending_event, None
+        return event
@@ -0,0 +1,226 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE QUERY RESULT CACHE
+##############################################################################
+import inspect
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import wraps
+
+
+############################################
+# DEFAULT CACHE SETTINGS
+############################################
+DEFAULT_CACHE_SIZE = 128
+
+
+##############################################################################
+# DATA GENERATIONS - BUMPED BY THE INGESTION FOR EVERY (CITY, YEAR) IT SAVES
+##############################################################################
+def create_data_generations_table(connection):
+    """
+    Creates the data_generations table counting the saves of every (city, year).
+
+    Args:
+        connection: SQLite database connection object.
+    """
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS data_generations (
+        city_id INTEGER NOT NULL,
+        year TEXT NOT NULL,
+        generation INTEGER NOT NULL,
+        PRIMARY KEY (city_id, year)
+    ) WITHOUT ROWID;
+    """)
+
+
+def bump_data_generations(connection, city_id, date_from, date_to):
+    """
+    Increments the generation of every year of a city between date_from and date_to, so the cached results
+    depending on these years are computed again. Runs in the caller's transaction.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int): ID of the city.
+        date_from (str): Start date (YYYY-MM-DD) of the saved data.
+        date_to (str): End date (YYYY-MM-DD) of the saved data.
+    """
+    years = []
+    for year in range(int(date_from[:4]), int(date_to[:4]) + 1):
+        years.append((city_id, f"{year:04d}"))
+    connection.executemany("""
+    INSERT INTO data_generations (city_id, year, generation) VALUES (?, ?, 1)
+    ON CONFLICT (city_id, year) DO UPDATE SET generation = generation + 1;
+    """, years)
+
+
+def data_generation(connection, city_id=None, from_year=None, to_year=None):
+    """
+    Returns the sum of the generations of a scope. It grows whenever data of the scope is saved.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int, optional): ID of the city, or None for every city.
+        from_year (str, optional): First year (YYYY) of the scope, or None for no lower bound.
+        to_year (str, optional): Last year (YYYY) of the scope, or None for no upper bound.
+
+    Returns:
+        int: The sum of the generations, or None if the data_generations table does not exist.
+    """
+    try:
+        generation_row = connection.execute("""
+        SELECT TOTAL(generation)
+        FROM data_generations
+        WHERE (?1 IS NULL OR city_id = ?1)
+        AND (?2 IS NULL OR year >= ?2)
+        AND (?3 IS NULL OR year <= ?3);
+        """, (city_id, from_year, to_year)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return int(generation_row[0])
+
+
+def window_end(start_date, days):
+    """
+    Returns the last date (YYYY-MM-DD) of a window of a number of days starting on start_date.
+    """
+    return (date.fromisoformat(str(start_date)[:10]) + timedelta(days=int(days) - 1)).isoformat()
+
+
+##############################################################################
+# CACHED RESULTS
+##############################################################################
+class CachedCursor:
+    """
+    Read-only cursor over the cached rows of a query, offering the fetch methods and the description of
+    sqlite3.Cursor, so callers of the cached functions do not change.
+    """
+
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = rows
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position >= len(self.rows):
+            raise StopIteration
+        self.position += 1
+        return self.rows[self.position - 1]
+
+    def fetchone(self):
+        return next(self, None)
+
+    def fetchmany(self, size=1):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+
+class QueryResultCache:
+    """
+    Least recently used cache of query results. Every entry keeps the data generation of its scope and is
+    only returned while that generation is unchanged.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        """
+        Returns the cached (description, rows) of a key, or None if missing or computed for another generation.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generation, result):
+        """
+        Stores the (description, rows) of a key, evicting the least recently used entries over max_size.
+        """
+        with self.lock:
+            self.entries[key] = (generation, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Cache shared by every function decorated with cached_query
+query_result_cache = QueryResultCache()
+
+
+def database_file(connection):
+    """
+    Returns the file of the main database of a connection, which identifies the database in the cache keys.
+    """
+    return connection.execute("PRAGMA database_list;").fetchone()[2]
+
+
+def cached_query(scope):
+    """
+    Decorator caching the rows of a query function returning a cursor, keyed by the function, the database
+    and the arguments.
+
+    The scope function receives the arguments of the query function (without the connection) as a
+    dictionary, and returns (city_id, first, last): the city read by the query, or None for every city, and
+    the first and last years or dates read, or None for no bound. A cached result is computed again once
+    data of its scope has been saved.
+
+    Args:
+        scope (callable): Function returning the (city_id, first, last) scope of the query.
+    """
+    def decorator(query_function):
+        query_signature = inspect.signature(query_function)
+
+        @wraps(query_function)
+        def cached_query_function(connection, *args, **kwargs):
+            bound_arguments = query_signature.bind(connection, *args, **kwargs)
+            bound_arguments.apply_defaults()
+            arguments = dict(bound_arguments.arguments)
+            del arguments["connection"]
+
+            city_id, first, last = scope(arguments)
+            from_year = str(first)[:4] if first is not None else None
+            to_year = str(last)[:4] if last is not None else None
+            generation = data_generation(connection, city_id, from_year, to_year)
+            if generation is None:
+                return query_function(connection, *args, **kwargs)
+
+            key = (query_function.__qualname__, database_file(connection), tuple(sorted(arguments.items())))
+            result = query_result_cache.get(key, generation)
+            if result is None:
+                cursor = query_function(connection, *args, **kwargs)
+                if cursor is None:
+                    return None
+                result = (cursor.description, cursor.fetchall())
+                query_result_cache.put(key, generation, result)
+            return CachedCursor(*result)
+
+        return cached_query_function
+    return decorator
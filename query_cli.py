@@ -0,0 +1,362 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE SCRIPTABLE PHASE 1 QUERIES
+##############################################################################
+import os
+import sys
+import csv
+import json
+import argparse
+import sqlite3
+import phase_1 as fp1  # IMPORTED MODULE FROM THE PHASE 1 OF THIS ICA
+from weather_catalog import get_catalog
+
+
+############################################
+# DEFAULT OUTPUT SETTINGS
+############################################
+DEFAULT_DB_PATH = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
+
+# Rows fetched from the cursor and written at a time
+DEFAULT_BATCH_SIZE = 500
+
+OUTPUT_FORMATS = ("csv", "jsonl", "table")
+
+# Minimum width of the table columns written to the console, widened to fit longer column names
+TABLE_COLUMN_WIDTH = 16
+
+
+##############################################################################
+# FUNCTIONS TO STREAM A CURSOR TO CSV, JSON LINES OR A TABLE
+##############################################################################
+def column_names(cursor):
+    """
+    Returns the column names of a cursor, read from its description.
+    """
+    return [column[0] for column in cursor.description or ()]
+
+
+def fetch_batches(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yields the rows of a cursor in lists of at most batch_size rows, so only one batch is held in memory.
+
+    Args:
+        cursor: sqlite3.Cursor, or any cursor offering fetchmany.
+        batch_size (int): Number of rows fetched at a time.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def format_table_value(value):
+    """
+    Formats a value for the console table, with real numbers to 2 decimal places.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+class RowWriter:
+    """
+    Writes rows to an output file as CSV, JSON Lines or a fixed-width table. The header is written
+    once, before the first rows, so the results of several cursors with the same columns can be
+    written one after the other.
+    """
+
+    def __init__(self, output_file, output_format):
+        """
+        Args:
+            output_file: Text file the rows are written to.
+            output_format (str): One of OUTPUT_FORMATS.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}. Choose from {', '.join(OUTPUT_FORMATS)}.")
+        self.output_file = output_file
+        self.output_format = output_format
+        self.columns = None
+        self.column_widths = None
+        self.csv_writer = csv.writer(output_file) if output_format == "csv" else None
+        self.rows_written = 0
+
+    def write_header(self, columns):
+        """
+        Writes the column names. In a table, each column is as wide as its name, and at least TABLE_COLUMN_WIDTH.
+        """
+        self.columns = list(columns)
+        self.column_widths = [max(TABLE_COLUMN_WIDTH, len(name)) for name in self.columns]
+        if self.output_format == "csv":
+            self.csv_writer.writerow(self.columns)
+        elif self.output_format == "table":
+            header = " ".join(name.ljust(width) for name, width in zip(self.columns, self.column_widths))
+            self.output_file.write(f"{header.rstrip()}\n{'-' * len(header.rstrip())}\n")
+
+    def write_rows(self, rows):
+        """
+        Writes a batch of rows (tuples or sqlite3.Row objects) in the column order of the header.
+        """
+        if self.output_format == "csv":
+            self.csv_writer.writerows(tuple(row) for row in rows)
+        elif self.output_format == "jsonl":
+            for row in rows:
+                self.output_file.write(json.dumps(dict(zip(self.columns, tuple(row))), default=str))
+                self.output_file.write("\n")
+        else:
+            for row in rows:
+                line = " ".join(format_table_value(value).ljust(width)
+                                for value, width in zip(tuple(row), self.column_widths))
+                self.output_file.write(f"{line.rstrip()}\n")
+        self.rows_written += len(rows)
+
+    def write_cursor(self, cursor, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Streams every row of a cursor in fetchmany batches.
+
+        Returns:
+            int: The number of rows written from the cursor.
+        """
+        if cursor is None:
+            return 0
+        if self.columns is None:
+            self.write_header(column_names(cursor))
+        rows_written = 0
+        for rows in fetch_batches(cursor, batch_size):
+            self.write_rows(rows)
+            rows_written += len(rows)
+        return rows_written
+
+
+##############################################################################
+# QUERIES - EVERY COMMAND RETURNS THE CURSORS OF THE PHASE 1 QUERIES TO WRITE
+##############################################################################
+def uncached(query_function):
+    """
+    Returns the query function without its result cache (see query_cache), so its cursor is streamed
+    instead of fetched into memory first.
+    """
+    return getattr(query_function, "__wrapped__", query_function)
+
+
+def selected_city_ids(connection, city_ids):
+    """
+    Returns the given city IDs, or every city ID of the database when none are given.
+
+    Raises:
+        ValueError: If a city ID does not exist.
+    """
+    catalog = get_catalog(connection)
+    if not city_ids:
+        return list(catalog.cities)
+    for city_id in city_ids:
+        if not catalog.has_city(city_id):
+            raise ValueError(f"Invalid City ID {city_id}. Please choose from the following IDs: {list(catalog.cities)}.")
+    return city_ids
+
+
+def selected_years(connection, years):
+    """
+    Returns the given years, or every year stored in the database when none are given.
+
+    Raises:
+        ValueError: If a year is not stored in the database.
+    """
+    distinct_years = get_catalog(connection).years
+    if not years:
+        return list(distinct_years)
+    for year in years:
+        valid, error_message = fp1.validate_year(year, distinct_years)
+        if not valid:
+            raise ValueError(error_message)
+    return years
+
+
+def validated_date_range(connection, date_from, date_to):
+    """
+    Returns the (date_from, date_to) range, defaulting to the whole stored range.
+
+    Raises:
+        ValueError: If a date is not stored in the database.
+    """
+    catalog = get_catalog(connection)
+    first_date, last_date = catalog.date_bounds()
+    date_from = date_from or first_date
+    date_to = date_to or last_date
+    valid, error_message = fp1.validate_db_dates(date_from, date_to, catalog.dates)
+    if not valid:
+        raise ValueError(error_message)
+    return date_from, date_to
+
+
+def query_countries(connection, args):
+    yield uncached(fp1.select_all_countries)(connection)
+
+
+def query_cities(connection, args):
+    yield uncached(fp1.select_all_cities)(connection)
+
+
+def query_annual_temperature(connection, args):
+    years = selected_years(connection, args.years)
+    if args.city_ids:
+        for city_id in selected_city_ids(connection, args.city_ids):
+            if len(years) == 1:
+                yield uncached(fp1.average_annual_temperature)(connection, city_id, years[0])
+            else:
+                yield uncached(fp1.average_annual_temperature_by_year_range)(connection, city_id, min(years), max(years))
+    else:
+        yield uncached(fp1.average_annual_temperature_by_city_and_year)(connection, min(years), max(years))
+
+
+def query_seven_day_precipitation(connection, args):
+    start_date = args.start_date or get_catalog(connection).date_bounds()[0]
+    validated_date_range(connection, start_date, start_date)
+    if args.city_ids:
+        for city_id in selected_city_ids(connection, args.city_ids):
+            yield uncached(fp1.average_seven_day_precipitation)(connection, city_id, start_date)
+    else:
+        yield uncached(fp1.average_seven_day_precipitation_all_cities)(connection, start_date, days=7)
+
+
+def query_rolling_windows(connection, args):
+    date_from, date_to = validated_date_range(connection, args.date_from, args.date_to)
+    for city_id in selected_city_ids(connection, args.city_ids):
+        yield uncached(fp1.rolling_window_averages)(connection, city_id, date_from, date_to, days=args.days)
+
+
+def query_mean_temperature(connection, args):
+    date_from, date_to = validated_date_range(connection, args.date_from, args.date_to)
+    yield uncached(fp1.average_mean_temp_by_city)(connection, date_from, date_to)
+
+
+def query_annual_precipitation(connection, args):
+    years = selected_years(connection, args.years)
+    if len(years) == 1:
+        yield uncached(fp1.average_annual_precipitation_by_country)(connection, years[0])
+    else:
+        yield uncached(fp1.average_annual_precipitation_by_country_and_year_range)(connection, min(years), max(years))
+
+
+# Command name mapped to (query generator, help)
+QUERIES = {
+    "countries": (query_countries, "all the countries"),
+    "cities": (query_cities, "all the cities"),
+    "annual-temperature": (query_annual_temperature,
+                           "average annual temperature by city and year (all cities and years by default)"),
+    "seven-day-precipitation": (query_seven_day_precipitation,
+                                "average seven-day precipitation by city from a start date (all cities by default)"),
+    "rolling-windows": (query_rolling_windows,
+                        "rolling window averages of the cities for every start date of a date range"),
+    "mean-temperature": (query_mean_temperature, "average mean temperature by city over a date range"),
+    "annual-precipitation": (query_annual_precipitation,
+                             "average annual precipitation by country and year (all years by default)"),
+}
+
+
+def run_query(connection, command, args, writer, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Runs the phase 1 queries of a command and streams their cursors to a row writer.
+
+    Args:
+        connection: SQLite database connection object.
+        command (str): Name of the command in QUERIES.
+        args (argparse.Namespace): Options of the command.
+        writer (RowWriter): Writer of the rows.
+        batch_size (int): Number of rows fetched at a time.
+
+    Returns:
+        int: The number of rows written.
+
+    Raises:
+        ValueError: If an option is not valid for the database.
+        sqlite3.OperationalError: If a query could not be run.
+    """
+    query_generator = QUERIES[command][0]
+    rows_written = 0
+    for cursor in query_generator(connection, args):
+        if cursor is None:
+            raise sqlite3.OperationalError(f"The {command} query could not be run.")
+        rows_written += writer.write_cursor(cursor, batch_size)
+    return rows_written
+
+
+#################################################################
+# QUERY COMMAND - REFERENCED AS MAIN
+#################################################################
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the phase 1 queries and write their results as CSV, "
+                                                 "JSON Lines or a table.")
+    parser.add_argument("command", choices=list(QUERIES),
+                        help="; ".join(f"{name}: {description}" for name, (_, description) in QUERIES.items()))
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="path to the SQLite database")
+    parser.add_argument("--city-id", dest="city_ids", type=int, action="append",
+                        help="city ID, repeatable (default: all cities)")
+    parser.add_argument("--year", dest="years", action="append",
+                        help="year (YYYY), repeatable; the range from the first to the last year is queried "
+                             "(default: all years)")
+    parser.add_argument("--start-date", help="start date (YYYY-MM-DD) of the seven-day window (default: first stored date)")
+    parser.add_argument("--date-from", help="start date (YYYY-MM-DD) of the range (default: first stored date)")
+    parser.add_argument("--date-to", help="end date (YYYY-MM-DD) of the range (default: last stored date)")
+    parser.add_argument("--days", type=int, default=7, help="window length in days of rolling-windows (default: 7)")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="table",
+                        help="output format (default: table)")
+    parser.add_argument("--output", help="file the results are written to (default: the console)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"rows fetched at a time (default: {DEFAULT_BATCH_SIZE})")
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs a phase 1 query from the command line, for example:
+
+        python query_cli.py annual-temperature --city-id 1 --year 2020 --format csv --output temperature.csv
+        python query_cli.py mean-temperature --date-from 2020-01-01 --date-to 2020-12-31 --format jsonl
+
+    Returns:
+        int: The exit status, 0 on success and 1 on an error.
+    """
+    args = build_parser().parse_args(argv)
+    if args.batch_size < 1:
+        print("The batch size must be at least 1.", file=sys.stderr)
+        return 1
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}", file=sys.stderr)
+        return 1
+
+    connection = fp1.db_connection(args.db)
+    if not connection:
+        print("Failed to connect to the database.", file=sys.stderr)
+        return 1
+
+    output_file = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = RowWriter(output_file, args.output_format)
+        rows_written = run_query(connection, args.command, args, writer, args.batch_size)
+    except (ValueError, sqlite3.Error) as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The console output was piped into a command that stopped reading, for example head. The console
+        # is pointed at os.devnull so that the flush at exit does not fail again.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+        return 1
+    finally:
+        if args.output:
+            output_file.close()
+
+    if args.output:
+        print(f"{rows_written} row(s) written to {args.output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
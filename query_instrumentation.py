@@ -0,0 +1,490 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE OPT-IN QUERY INSTRUMENTATION
+##############################################################################
+import os
+import re
+import sys
+import time
+import atexit
+import sqlite3
+import threading
+import weakref
+from bisect import bisect_left
+from collections import Counter
+
+
+############################################
+# DEFAULT INSTRUMENTATION SETTINGS
+############################################
+# Set to 1 to instrument every connection opened by db_connections.connect
+INSTRUMENTATION_ENV_VAR = "WEATHER_DB_INSTRUMENT"
+
+# Statements slower than this number of milliseconds are written to the slow-query log
+SLOW_QUERY_ENV_VAR = "WEATHER_DB_SLOW_QUERY_MS"
+DEFAULT_SLOW_QUERY_MS = 100.0
+
+# File the slow-query log is appended to, stderr when not set
+SLOW_QUERY_LOG_ENV_VAR = "WEATHER_DB_SLOW_QUERY_LOG"
+
+# Upper bounds (in ms) of the latency histogram buckets, the last bucket holding the slower statements
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Number of statements listed in the exit report, the slowest in total first
+REPORT_STATEMENTS = 20
+
+# Statements whose query plan is captured; the others (PRAGMA, CREATE, BEGIN...) have no useful plan
+EXPLAINED_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Words that can follow a table name in place of an alias
+SQL_KEYWORDS = {"AS", "WHERE", "JOIN", "LEFT", "INNER", "CROSS", "ON", "USING", "GROUP", "ORDER", "LIMIT",
+                "SET", "VALUES", "UNION", "EXCEPT", "INTERSECT", "NATURAL", "INDEXED", "NOT", "WINDOW", "HAVING"}
+
+
+def instrumentation_enabled():
+    """
+    Returns True when the INSTRUMENTATION_ENV_VAR environment variable turns the instrumentation on.
+    """
+    return os.environ.get(INSTRUMENTATION_ENV_VAR, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def normalized_sql(sql):
+    """
+    Returns the SQL with its whitespace collapsed, used as the key of the statement statistics.
+    """
+    return " ".join(sql.split())
+
+
+def statement_verb(sql):
+    """
+    Returns the first keyword of a statement in upper case, for example "SELECT".
+    """
+    words = sql.lstrip("( \t\r\n").split(None, 1)
+    return words[0].upper().rstrip(";") if words else ""
+
+
+def full_scan_details(sql, plan):
+    """
+    Returns the query plan lines scanning the whole daily_weather_entries table, under its name or an alias.
+
+    Args:
+        sql (str): The explained statement.
+        plan (list): The detail lines of EXPLAIN QUERY PLAN.
+
+    Returns:
+        list: The lines such as "SCAN dw" or "SCAN daily_weather_entries USING INDEX ...".
+    """
+    table_names = {"daily_weather_entries"}
+    for alias in re.findall(r"\bdaily_weather_entries\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE):
+        if alias.upper() not in SQL_KEYWORDS:
+            table_names.add(alias)
+    scans = []
+    for detail in plan:
+        scanned = re.match(r"SCAN (\w+)", detail)
+        if scanned and scanned.group(1) in table_names:
+            scans.append(detail)
+    return scans
+
+
+##############################################################################
+# STATISTICS OF THE STATEMENTS
+##############################################################################
+class StatementStatistics:
+    """
+    Latency histogram, row count and query plan of one distinct SQL statement.
+
+    The latency of a query covers its execute call and the fetches of its rows, so a cursor read a
+    batch at a time is measured until it is exhausted, closed or deleted.
+    """
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.verb = statement_verb(sql)
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.plan = None
+        self.full_scans = []
+
+    def record(self, elapsed_ms, rows, failed=False):
+        """
+        Adds one execution of the statement.
+        """
+        self.calls += 1
+        self.errors += failed
+        self.rows += rows
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.histogram[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile_ms(self, percentile):
+        """
+        Returns the upper bound (in ms) of the histogram bucket holding the given percentile, or the
+        maximum latency when the percentile falls in the last bucket.
+        """
+        threshold = self.calls * percentile / 100
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= threshold:
+                return LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def histogram_counts(self):
+        """
+        Returns the non-empty histogram buckets, labelled by their upper bound, for example {"<=1ms": 12}.
+        """
+        counts = {}
+        for bucket, count in enumerate(self.histogram):
+            if count:
+                if bucket < len(LATENCY_BUCKETS_MS):
+                    counts[f"<={LATENCY_BUCKETS_MS[bucket]:g}ms"] = count
+                else:
+                    counts[f">{LATENCY_BUCKETS_MS[-1]:g}ms"] = count
+        return counts
+
+    def summary(self):
+        """
+        Returns the statistics as a dictionary that can be saved as JSON.
+        """
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": self.percentile_ms(50),
+            "p95_ms": self.percentile_ms(95),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": self.histogram_counts(),
+            "plan": self.plan,
+            "full_scans": self.full_scans,
+        }
+
+
+class QueryStatistics:
+    """
+    Statistics of every statement run through the instrumented connections of the process.
+
+    The statements are counted twice: through the wrapped execute methods, which measure their latency and
+    rows, and through the SQLite trace callback, which also sees the statements the application does not
+    run itself (the implicit BEGIN and COMMIT of the sqlite3 module, the statements of executescript...).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.traced_statements = Counter()
+        self.slow_statements = 0
+        self.slow_query_ms = DEFAULT_SLOW_QUERY_MS
+        self.slow_query_log = None
+        self.active_cursors = weakref.WeakSet()
+        self.report_registered = False
+
+    def configure(self):
+        """
+        Reads the slow-query settings from the environment and registers the exit report once.
+        """
+        with self.lock:
+            try:
+                self.slow_query_ms = float(os.environ.get(SLOW_QUERY_ENV_VAR, DEFAULT_SLOW_QUERY_MS))
+            except ValueError:
+                self.slow_query_ms = DEFAULT_SLOW_QUERY_MS
+            self.slow_query_log = os.environ.get(SLOW_QUERY_LOG_ENV_VAR) or None
+            if not self.report_registered:
+                atexit.register(print_query_report)
+                self.report_registered = True
+
+    def statement(self, connection, sql, parameters=()):
+        """
+        Returns the statistics of a statement, capturing its query plan the first time it is seen.
+
+        Args:
+            connection: The connection running the statement.
+            sql (str): The statement.
+            parameters: Parameters of the statement, bound to the EXPLAIN QUERY PLAN as well.
+
+        Returns:
+            StatementStatistics: The statistics of the statement.
+        """
+        key = normalized_sql(sql)
+        with self.lock:
+            statistics = self.statements.get(key)
+            if statistics is None:
+                statistics = self.statements[key] = StatementStatistics(key)
+            elif statistics.plan is not None or statistics.verb not in EXPLAINED_STATEMENTS:
+                return statistics
+
+        if statistics.verb in EXPLAINED_STATEMENTS and statistics.plan is None:
+            # A plain cursor, so the EXPLAIN itself is not instrumented
+            try:
+                plan = [row[3] for row in sqlite3.Cursor(connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+            except sqlite3.Error as ex:
+                plan = [f"(no query plan: {ex})"]
+            statistics.full_scans = full_scan_details(sql, plan)
+            statistics.plan = plan
+        return statistics
+
+    def record(self, statistics, elapsed_ms, rows, parameters=(), failed=False):
+        """
+        Adds one execution of a statement and writes it to the slow-query log if it is over the threshold.
+        """
+        with self.lock:
+            statistics.record(elapsed_ms, rows, failed)
+            slow = elapsed_ms >= self.slow_query_ms
+            self.slow_statements += slow
+        if slow:
+            self.log_slow_statement(statistics, elapsed_ms, rows, parameters)
+
+    def log_slow_statement(self, statistics, elapsed_ms, rows, parameters):
+        """
+        Writes one line per slow statement to the slow-query log.
+        """
+        flag = " [FULL SCAN OF daily_weather_entries]" if statistics.full_scans else ""
+        line = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} slow query: {elapsed_ms:.1f} ms, {rows} rows{flag}: "
+                f"{statistics.sql[:300]} -- parameters: {str(parameters)[:200]}\n")
+        try:
+            if self.slow_query_log:
+                with open(self.slow_query_log, "a", encoding="utf-8") as log_file:
+                    log_file.write(line)
+            else:
+                sys.stderr.write(line)
+        except OSError:
+            pass
+
+    def trace_statement(self, sql):
+        """
+        Trace callback of the instrumented connections, counting the statements run by SQLite by kind.
+        """
+        if sql.startswith("--"):
+            # Statements run by a trigger are passed as "-- TRIGGER name"
+            kind = "TRIGGER"
+        else:
+            kind = statement_verb(sql)
+            if kind == "EXPLAIN":
+                return
+        with self.lock:
+            self.traced_statements[kind] += 1
+
+    def finish_active_cursors(self):
+        """
+        Records the statements of the cursors that are still being read.
+        """
+        for cursor in list(self.active_cursors):
+            cursor.finish_statement()
+
+    def summary(self):
+        """
+        Returns the statistics of the statements, the slowest in total first, as a dictionary that can be
+        saved as JSON.
+        """
+        self.finish_active_cursors()
+        with self.lock:
+            statements = sorted(self.statements.values(), key=lambda statistics: statistics.total_ms, reverse=True)
+            return {
+                "slow_query_ms": self.slow_query_ms,
+                "slow_statements": self.slow_statements,
+                "traced_statements": dict(self.traced_statements.most_common()),
+                "statements": [statistics.summary() for statistics in statements if statistics.calls],
+            }
+
+    def reset(self):
+        """
+        Clears the statistics, for example between two benchmarks.
+        """
+        with self.lock:
+            self.statements.clear()
+            self.traced_statements.clear()
+            self.slow_statements = 0
+
+
+# The statistics shared by every instrumented connection of the process
+query_statistics = QueryStatistics()
+
+
+##############################################################################
+# INSTRUMENTED CONNECTION AND CURSOR
+##############################################################################
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor measuring the latency and rows of its statements, from the execute call to the last fetch.
+    """
+
+    statistics = None
+
+    def execute(self, sql, parameters=()):
+        self.finish_statement()
+        statistics = query_statistics.statement(self.connection, sql, parameters)
+        execute_start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except sqlite3.Error:
+            query_statistics.record(statistics, (time.perf_counter() - execute_start) * 1000, 0, parameters, True)
+            raise
+        self.start_statement(statistics, time.perf_counter() - execute_start, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.finish_statement()
+        if isinstance(seq_of_parameters, (list, tuple)):
+            statistics = query_statistics.statement(self.connection, sql, seq_of_parameters[0] if seq_of_parameters else ())
+        else:
+            # An iterator cannot be read twice, so the plan is captured without parameters
+            statistics = query_statistics.statement(self.connection, sql, ())
+        execute_start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            query_statistics.record(statistics, (time.perf_counter() - execute_start) * 1000, 0, (), True)
+            raise
+        self.start_statement(statistics, time.perf_counter() - execute_start, "(executemany)")
+        return self
+
+    def executescript(self, sql_script):
+        self.finish_statement()
+        statistics = query_statistics.statement(self.connection, f"-- executescript\n{sql_script}")
+        execute_start = time.perf_counter()
+        try:
+            super().executescript(sql_script)
+        finally:
+            query_statistics.record(statistics, (time.perf_counter() - execute_start) * 1000, 0)
+        return self
+
+    def start_statement(self, statistics, elapsed, parameters):
+        """
+        Starts measuring a statement. Statements without result rows are recorded at once.
+        """
+        if self.description is None:
+            query_statistics.record(statistics, elapsed * 1000, max(self.rowcount, 0), parameters)
+            return
+        self.statistics = statistics
+        self.elapsed = elapsed
+        self.rows_fetched = 0
+        self.parameters = parameters
+        query_statistics.active_cursors.add(self)
+
+    def finish_statement(self):
+        """
+        Records the statement being read, if any.
+        """
+        statistics = self.statistics
+        if statistics is not None:
+            self.statistics = None
+            query_statistics.active_cursors.discard(self)
+            query_statistics.record(statistics, self.elapsed * 1000, self.rows_fetched, self.parameters)
+
+    def fetched(self, elapsed, rows, exhausted):
+        """
+        Adds the time and rows of one fetch to the statement being read.
+        """
+        if self.statistics is not None:
+            self.elapsed += elapsed
+            self.rows_fetched += rows
+            if exhausted:
+                self.finish_statement()
+
+    def __next__(self):
+        fetch_start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.fetched(time.perf_counter() - fetch_start, 0, True)
+            raise
+        self.fetched(time.perf_counter() - fetch_start, 1, False)
+        return row
+
+    def fetchone(self):
+        fetch_start = time.perf_counter()
+        row = super().fetchone()
+        self.fetched(time.perf_counter() - fetch_start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        fetch_start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self.fetched(time.perf_counter() - fetch_start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        fetch_start = time.perf_counter()
+        rows = super().fetchall()
+        self.fetched(time.perf_counter() - fetch_start, len(rows), True)
+        return rows
+
+    def close(self):
+        self.finish_statement()
+        super().close()
+
+    def __del__(self):
+        try:
+            self.finish_statement()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors are InstrumentedCursor objects, opened by db_connections.connect when the
+    instrumentation is turned on.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def instrument_connection(connection):
+    """
+    Sets the trace callback of an InstrumentedConnection and reads the slow-query settings.
+    """
+    query_statistics.configure()
+    connection.set_trace_callback(query_statistics.trace_statement)
+
+
+##############################################################################
+# EXIT REPORT
+##############################################################################
+def print_query_report(file=None, limit=REPORT_STATEMENTS):
+    """
+    Prints the statistics of the slowest statements in total, with their latency histogram and query plan.
+
+    Args:
+        file: Stream the report is written to, stderr by default so that it does not mix with the output
+            of the query commands.
+        limit (int): Number of statements listed.
+    """
+    file = file or sys.stderr
+    summary = query_statistics.summary()
+    if not summary["statements"]:
+        return
+
+    print("\nQUERY INSTRUMENTATION REPORT", file=file)
+    print(f"{len(summary['statements'])} distinct statements, {summary['slow_statements']} executions over "
+          f"{summary['slow_query_ms']:g} ms", file=file)
+    print("Statements run by SQLite: " + ", ".join(f"{kind} {count}" for kind, count
+                                                 in summary["traced_statements"].items()), file=file)
+    for statement in summary["statements"][:limit]:
+        flag = "  FULL SCAN OF daily_weather_entries" if statement["full_scans"] else ""
+        print(f"\n{statement['total_ms']:.1f} ms total, {statement['calls']} calls, {statement['rows']} rows, "
+              f"mean {statement['mean_ms']:.2f} ms, p50 <= {statement['p50_ms']:g} ms, "
+              f"p95 <= {statement['p95_ms']:g} ms, max {statement['max_ms']:.2f} ms{flag}", file=file)
+        print(f"  {statement['sql'][:200]}", file=file)
+        print("  histogram: " + ", ".join(f"{bucket} {count}" for bucket, count in statement["histogram"].items()),
+              file=file)
+        for detail in statement["plan"] or []:
+            print(f"  plan: {detail}", file=file)
@@ -0,0 +1,191 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR PLANNING THE INCREMENTAL WEATHER DATA SYNC
+##############################################################################
+from datetime import date, timedelta
+from phase_3 import latest_archive_date
+
+
+############################################
+# DEFAULT SYNC PLANNING SETTINGS
+############################################
+# Missing intervals closer than this number of days are requested together, to save API requests
+DEFAULT_MERGE_GAP_DAYS = 7
+
+
+#####################################################################
+# FUNCTION TO FIND THE MISSING DATES OF A CITY
+#####################################################################
+def city_coverage_gaps(connection, city_id, date_from, date_to):
+    """
+    Finds the date intervals of a city with no daily entry, or with an entry holding a NULL measure,
+    between date_from and date_to.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int): ID of the city.
+        date_from (str): Start date (YYYY-MM-DD) of the range.
+        date_to (str): End date (YYYY-MM-DD) of the range, included.
+
+    Returns:
+        list: Sorted list of (start_date, end_date) tuples of missing dates, both included.
+    """
+    complete_days = """
+        SELECT DISTINCT substr(date, 1, 10) AS day
+        FROM daily_weather_entries
+        WHERE city_id = ?
+        AND date >= ?
+        AND date < date(?, '+1 day')
+        AND min_temp IS NOT NULL
+        AND max_temp IS NOT NULL
+        AND mean_temp IS NOT NULL
+        AND precipitation IS NOT NULL
+        AND sw_radiation IS NOT NULL
+    """
+    params = (city_id, date_from, date_to)
+
+    first_day, last_day = connection.execute(f"""
+    SELECT MIN(day), MAX(day) FROM ({complete_days});
+    """, params).fetchone()
+    if first_day is None:
+        return [(date_from, date_to)]
+
+    gaps = []
+    if first_day > date_from:
+        gaps.append((date_from, (date.fromisoformat(first_day) - timedelta(days=1)).isoformat()))
+
+    # Gaps between two consecutive complete days, found with the LAG window function
+    inner_gaps = connection.execute(f"""
+    SELECT date(previous_day, '+1 day') AS gap_start, date(day, '-1 day') AS gap_end
+    FROM (
+        SELECT day, LAG(day) OVER (ORDER BY day) AS previous_day
+        FROM ({complete_days})
+    )
+    WHERE previous_day IS NOT NULL
+    AND julianday(day) - julianday(previous_day) > 1
+    ORDER BY day;
+    """, params)
+    for gap_start, gap_end in inner_gaps:
+        gaps.append((gap_start, gap_end))
+
+    if last_day < date_to:
+        gaps.append(((date.fromisoformat(last_day) + timedelta(days=1)).isoformat(), date_to))
+
+    return gaps
+
+
+def merge_intervals(intervals, merge_gap_days=DEFAULT_MERGE_GAP_DAYS):
+    """
+    Merges sorted date intervals separated by fewer than merge_gap_days days.
+
+    Args:
+        intervals (list): Sorted list of (start_date, end_date) tuples.
+        merge_gap_days (int): Maximum number of days between two intervals requested together.
+
+    Returns:
+        list: The merged list of (start_date, end_date) tuples.
+    """
+    merged = []
+    for start_date, end_date in intervals:
+        if merged:
+            previous_start, previous_end = merged[-1]
+            days_between = (date.fromisoformat(start_date) - date.fromisoformat(previous_end)).days - 1
+            if days_between < merge_gap_days:
+                merged[-1] = (previous_start, max(previous_end, end_date))
+                continue
+        merged.append((start_date, end_date))
+    return merged
+
+
+#####################################################################
+# FUNCTIONS TO PLAN THE SYNC OF MANY CITIES
+#####################################################################
+def find_city_id(connection, city_name):
+    """
+    Returns the ID of a city in the cities table, or None if the city is not stored yet.
+    """
+    city_row = connection.execute("SELECT id FROM cities WHERE name = ?", (city_name,)).fetchone()
+    return city_row[0] if city_row else None
+
+
+def plan_city_sync(connection, city_name, date_from, date_to, merge_gap_days=DEFAULT_MERGE_GAP_DAYS):
+    """
+    Plans the date intervals to request for a city, so that only the missing or partially NULL dates
+    between date_from and date_to are downloaded.
+
+    Args:
+        connection: SQLite database connection object.
+        city_name (str): Name of the city.
+        date_from (str): Start date (YYYY-MM-DD) of the range.
+        date_to (str): End date (YYYY-MM-DD) of the range, included.
+        merge_gap_days (int): Maximum number of days between two intervals requested together.
+
+    Returns:
+        list: List of (start_date, end_date) tuples to request, empty if the city is up to date.
+    """
+    if date_from > date_to:
+        return []
+
+    city_id = find_city_id(connection, city_name)
+    if city_id is None:
+        return [(date_from, date_to)]
+    return merge_intervals(city_coverage_gaps(connection, city_id, date_from, date_to), merge_gap_days)
+
+
+def plan_sync(connection, city_names, date_from, date_to, merge_gap_days=DEFAULT_MERGE_GAP_DAYS):
+    """
+    Plans the date intervals to request for every city between date_from and date_to.
+
+    Returns:
+        dict: City name mapped to its list of (start_date, end_date) tuples to request.
+    """
+    sync_plan = {}
+    for city_name in city_names:
+        sync_plan[city_name] = plan_city_sync(connection, city_name, date_from, date_to, merge_gap_days)
+    return sync_plan
+
+
+def plan_incremental_sync(connection, city_names, date_from=None, merge_gap_days=DEFAULT_MERGE_GAP_DAYS,
+                          date_to=None):
+    """
+    Plans the date intervals extending every city up to date_to, by default the latest date available in
+    the archive (two days before today).
+
+    Each city is planned from date_from when given, otherwise from its first stored date. A city with
+    no stored data and no date_from cannot be planned and is given an empty plan.
+
+    Args:
+        connection: SQLite database connection object.
+        city_names (list): Names of the cities.
+        date_from (str, optional): Start date (YYYY-MM-DD) used for every city.
+        merge_gap_days (int): Maximum number of days between two intervals requested together.
+        date_to (str, optional): End date (YYYY-MM-DD) used for every city, included.
+
+    Returns:
+        tuple: (sync_plan, unplanned_cities), where sync_plan maps the city names to their lists of
+        (start_date, end_date) tuples, and unplanned_cities lists the cities with no data and no date_from.
+    """
+    if date_to is None:
+        date_to = latest_archive_date().isoformat()
+
+    sync_plan = {}
+    unplanned_cities = []
+    for city_name in city_names:
+        city_date_from = date_from
+        if city_date_from is None:
+            city_id = find_city_id(connection, city_name)
+            first_day = None
+            if city_id is not None:
+                first_day = connection.execute("""
+                SELECT MIN(date) FROM daily_weather_entries WHERE city_id = ?;
+                """, (city_id,)).fetchone()[0]
+            if first_day is None:
+                unplanned_cities.append(city_name)
+                sync_plan[city_name] = []
+                continue
+            city_date_from = first_day[:10]
+
+        sync_plan[city_name] = plan_city_sync(connection, city_name, city_date_from, date_to, merge_gap_days)
+    return sync_plan, unplanned_cities
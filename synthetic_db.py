@@ -0,0 +1,251 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE SYNTHETIC BENCHMARK DATABASES
+##############################################################################
+import os
+import sys
+import time
+import argparse
+import sqlite3
+import numpy as np
+from db_connections import connect
+from phase_3 import initialize_db
+
+
+############################################
+# DEFAULT GENERATOR SETTINGS
+############################################
+DEFAULT_CITIES = 1000
+DEFAULT_YEARS = 50
+DEFAULT_START_YEAR = 1975
+
+# Share of the measures stored as NULL, as returned by the API for missing readings
+DEFAULT_NULL_RATE = 0.005
+
+# Average number of missing date ranges per city and year, each of 1 to MAX_GAP_DAYS days
+DEFAULT_GAPS_PER_YEAR = 0.2
+MAX_GAP_DAYS = 45
+
+DEFAULT_SEED = 42
+
+SYNTHETIC_TIMEZONES = ("Europe/London", "Europe/Berlin", "Africa/Lagos", "America/New_York", "Asia/Tokyo",
+                       "Australia/Sydney", "America/Sao_Paulo", "Asia/Kolkata")
+
+# Bulk loading settings: the database is rebuilt from scratch if the generation is interrupted
+GENERATOR_PRAGMAS = {"journal_mode": "OFF", "synchronous": "OFF"}
+
+
+##############################################################################
+# SCHEMA OF THE SUBMITTED DATABASE
+##############################################################################
+def create_base_schema(connection):
+    """
+    Creates the countries, cities and daily_weather_entries tables as found in the submitted database,
+    before initialize_db adds its columns, indexes and derived tables.
+    """
+    connection.executescript("""
+    CREATE TABLE IF NOT EXISTS countries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        timezone TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cities (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        longitude TEXT NOT NULL,
+        latitude TEXT NOT NULL,
+        country_id INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS daily_weather_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE NOT NULL,
+        min_temp REAL,
+        max_temp REAL,
+        mean_temp REAL,
+        precipitation REAL,
+        city_id INTEGER NOT NULL
+    );
+    """)
+
+
+##############################################################################
+# FUNCTIONS TO GENERATE REALISTIC DAILY WEATHER
+##############################################################################
+def synthetic_city_weather(rng, latitude, day_of_year, null_rate=DEFAULT_NULL_RATE):
+    """
+    Generates the daily weather of a city: a seasonal cycle depending on the latitude, with day-to-day
+    persistence, and dry spells between wet days.
+
+    Args:
+        rng (numpy.random.Generator): Random number generator.
+        latitude (float): Latitude of the city.
+        day_of_year (numpy.ndarray): Day of the year (0-365) of every day.
+        null_rate (float): Share of the measures replaced by NULL.
+
+    Returns:
+        list: The min_temp, max_temp, mean_temp and precipitation columns, as object arrays holding
+        floats rounded to 1 decimal place and None for the NULL values.
+    """
+    days = len(day_of_year)
+    annual_mean = 28.0 - 0.4 * abs(latitude)
+    amplitude = 2.0 + 0.25 * abs(latitude)
+    # Warmest around mid-July in the north and mid-January in the south
+    season = np.cos(2 * np.pi * (day_of_year - 196) / 365.25) * np.sign(latitude or 1.0)
+
+    # Day-to-day persistence: noise smoothed with an exponentially decaying kernel
+    persistence = 0.7 ** np.arange(20)
+    noise = np.convolve(rng.normal(0.0, 2.5, days), persistence)[:days] * np.sqrt(1 - 0.7 ** 2)
+
+    mean_temp = annual_mean + amplitude * season + noise
+    daily_range = rng.uniform(4.0, 12.0, days)
+    min_temp = mean_temp - daily_range / 2
+    max_temp = mean_temp + daily_range / 2
+
+    wet_days = rng.random(days) < 0.35 + 0.1 * season
+    precipitation = np.where(wet_days, rng.gamma(0.8, 5.0, days), 0.0)
+
+    columns = []
+    for values in (min_temp, max_temp, mean_temp, precipitation):
+        column = np.round(values, 1).astype(object)
+        column[rng.random(days) < null_rate] = None
+        columns.append(column)
+    return columns
+
+
+def synthetic_gaps(rng, days, gaps_per_year=DEFAULT_GAPS_PER_YEAR):
+    """
+    Returns a boolean mask of the stored days, with random missing date ranges removed.
+    """
+    stored = np.ones(days, dtype=bool)
+    for _ in range(rng.poisson(gaps_per_year * days / 365.25)):
+        gap_start = int(rng.integers(0, days))
+        stored[gap_start:gap_start + int(rng.integers(1, MAX_GAP_DAYS + 1))] = False
+    return stored
+
+
+def generate_database(db_path, cities=DEFAULT_CITIES, years=DEFAULT_YEARS, start_year=DEFAULT_START_YEAR,
+                      null_rate=DEFAULT_NULL_RATE, gaps_per_year=DEFAULT_GAPS_PER_YEAR, seed=DEFAULT_SEED,
+                      initialize=True, progress_callback=None):
+    """
+    Builds a database with the schema of the submitted database, filled with synthetic daily weather.
+
+    Every city is saved in its own transaction with one executemany. The indexes and derived tables are
+    built afterwards by initialize_db, which is faster than maintaining them during the load.
+
+    Args:
+        db_path (str): Path of the new database file. It must not exist.
+        cities (int): Number of cities.
+        years (int): Number of years of daily weather per city.
+        start_year (int): First year of the daily weather.
+        null_rate (float): Share of the measures stored as NULL.
+        gaps_per_year (float): Average number of missing date ranges per city and year.
+        seed (int): Seed of the random number generator, the same seed building the same database.
+        initialize (bool): Runs initialize_db once the data is loaded, as phase 3 does.
+        progress_callback (callable, optional): Called after every saved city with (city_number, cities, rows).
+
+    Returns:
+        int: The number of daily rows saved.
+
+    Raises:
+        ValueError: If the database file already exists or a setting is not valid.
+    """
+    if os.path.exists(db_path):
+        raise ValueError(f"{db_path} already exists.")
+    if cities < 1 or years < 1:
+        raise ValueError("At least one city and one year are required.")
+
+    rng = np.random.default_rng(seed)
+    dates = np.arange(np.datetime64(f"{start_year:04d}-01-01"), np.datetime64(f"{start_year + years:04d}-01-01"))
+    date_strings = np.datetime_as_string(dates, unit="D").astype(object)
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(int)
+
+    connection = connect(db_path, pragmas=GENERATOR_PRAGMAS)
+    total_rows = 0
+    try:
+        create_base_schema(connection)
+        with connection:
+            countries = max(1, min(cities // 20, 200))
+            connection.executemany("INSERT INTO countries (id, name, timezone) VALUES (?, ?, ?);", [
+                (country_id, f"Country {country_id:03d}", SYNTHETIC_TIMEZONES[country_id % len(SYNTHETIC_TIMEZONES)])
+                for country_id in range(1, countries + 1)
+            ])
+
+        for city_id in range(1, cities + 1):
+            latitude = round(float(rng.uniform(-55.0, 70.0)), 4)
+            longitude = round(float(rng.uniform(-180.0, 180.0)), 4)
+            stored = synthetic_gaps(rng, len(dates), gaps_per_year)
+            columns = [column[stored] for column in synthetic_city_weather(rng, latitude, day_of_year, null_rate)]
+            city_rows = list(zip(date_strings[stored], *columns, [city_id] * int(stored.sum())))
+
+            with connection:
+                connection.execute("""
+                INSERT INTO cities (id, name, longitude, latitude, country_id) VALUES (?, ?, ?, ?, ?);
+                """, (city_id, f"City {city_id:05d}", str(longitude), str(latitude), (city_id - 1) % countries + 1))
+                connection.executemany("""
+                INSERT INTO daily_weather_entries (date, min_temp, max_temp, mean_temp, precipitation, city_id)
+                VALUES (?, ?, ?, ?, ?, ?);
+                """, city_rows)
+
+            total_rows += len(city_rows)
+            if progress_callback:
+                progress_callback(city_id, cities, total_rows)
+    finally:
+        connection.close()
+
+    if initialize:
+        initialization_connection = connect(db_path)
+        try:
+            initialize_db(initialization_connection)
+        finally:
+            initialization_connection.close()
+
+    return total_rows
+
+
+#################################################################
+# GENERATOR COMMAND - REFERENCED AS MAIN
+#################################################################
+def main(argv=None):
+    """
+    Builds a synthetic database, for example:
+
+        python synthetic_db.py db/synthetic-1k-50y.db --cities 1000 --years 50
+
+    Returns:
+        int: The exit status, 0 on success and 1 on an error.
+    """
+    parser = argparse.ArgumentParser(description="Build a database with the schema of the submitted database, "
+                                                 "filled with synthetic daily weather.")
+    parser.add_argument("db", help="path of the new database file")
+    parser.add_argument("--cities", type=int, default=DEFAULT_CITIES, help=f"number of cities (default: {DEFAULT_CITIES})")
+    parser.add_argument("--years", type=int, default=DEFAULT_YEARS, help=f"years per city (default: {DEFAULT_YEARS})")
+    parser.add_argument("--start-year", type=int, default=DEFAULT_START_YEAR,
+                        help=f"first year (default: {DEFAULT_START_YEAR})")
+    parser.add_argument("--null-rate", type=float, default=DEFAULT_NULL_RATE,
+                        help=f"share of the measures stored as NULL (default: {DEFAULT_NULL_RATE})")
+    parser.add_argument("--gaps-per-year", type=float, default=DEFAULT_GAPS_PER_YEAR,
+                        help=f"average number of missing date ranges per city and year (default: {DEFAULT_GAPS_PER_YEAR})")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"random seed (default: {DEFAULT_SEED})")
+    parser.add_argument("--no-initialize", action="store_true",
+                        help="leave the database as submitted, without the indexes and derived tables of phase 3")
+    args = parser.parse_args(argv)
+
+    def print_progress(city_number, cities, rows):
+        if city_number == cities or city_number % 50 == 0:
+            print(f"{city_number} of {cities} cities generated ({rows} rows)")
+
+    generation_start = time.perf_counter()
+    try:
+        rows = generate_database(args.db, args.cities, args.years, args.start_year, args.null_rate,
+                                 args.gaps_per_year, args.seed, not args.no_initialize, print_progress)
+    except (ValueError, sqlite3.Error) as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    print(f"{rows} rows written to {args.db} in {time.perf_counter() - generation_start:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
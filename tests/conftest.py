@@ -0,0 +1,75 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE SHARED TEST FIXTURES
+##############################################################################
+import os
+import sys
+import sqlite3
+import pytest
+
+# The modules of the project live in the parent directory of the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connections import close_connections
+from phase_3 import initialize_db
+from synthetic_db import create_base_schema
+
+
+##############################################################################
+# DATABASES WITH THE SCHEMA OF THE SUBMITTED DATABASE
+##############################################################################
+def open_database(db_path=":memory:"):
+    """
+    Opens a database with the schema of the submitted database, before initialize_db is run.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    create_base_schema(connection)
+    connection.commit()
+    return connection
+
+
+##############################################################################
+# OPEN-METEO RESPONSES
+##############################################################################
+def daily_data(dates, min_temp, max_temp, mean_temp, precipitation, sw_radiation):
+    """
+    Builds the "daily" section of an Open-Meteo response, one list per variable.
+    """
+    return {
+        "time": list(dates),
+        "temperature_2m_min": list(min_temp),
+        "temperature_2m_max": list(max_temp),
+        "temperature_2m_mean": list(mean_temp),
+        "precipitation_sum": list(precipitation),
+        "shortwave_radiation_sum": list(sw_radiation),
+    }
+
+
+##############################################################################
+# DATABASE FIXTURES
+##############################################################################
+@pytest.fixture
+def memory_db():
+    """
+    An in-memory database initialized by initialize_db.
+    """
+    connection = open_database()
+    initialize_db(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def weather_db_path(tmp_path):
+    """
+    Path to a database file initialized by initialize_db, for the code opening its own connections.
+    """
+    db_path = str(tmp_path / "weather.db")
+    connection = open_database(db_path)
+    initialize_db(connection)
+    connection.close()
+    yield db_path
+    close_connections()
@@ -0,0 +1,84 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE LTTB DOWNSAMPLING
+##############################################################################
+import numpy as np
+import pytest
+from downsampling import lttb_indices
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+# Ten points with a peak at index 3 and a trough at index 6. With 4 points kept, the buckets are [1, 5)
+# and [5, 9): index 3 forms the largest triangle with the first point and the average of the next bucket,
+# then index 6 with index 3 and the last point.
+PEAK_X = np.arange(10, dtype=np.float64)
+PEAK_Y = np.array([0, 0, 0, 10, 0, 0, -10, 0, 0, 0], dtype=np.float64)
+
+
+##############################################################################
+# TESTS OF lttb_indices
+##############################################################################
+def test_lttb_keeps_the_peak_and_the_trough():
+    """
+    The known LTTB selection of a small series.
+    """
+    assert lttb_indices(PEAK_X, PEAK_Y, 4).tolist() == [0, 3, 6, 9]
+
+
+def test_lttb_skips_nan_values():
+    """
+    NaN values are never kept and the other points are selected as if the NaN values were absent.
+    """
+    x = np.array([-1, 0, 1, 1.5, 2, 3, 4, 5, 6, 7, 8, 9, 10], dtype=np.float64)
+    y = np.array([np.nan, 0, 0, np.nan, 0, 10, 0, 0, -10, 0, 0, 0, np.nan], dtype=np.float64)
+
+    assert lttb_indices(x, y, 4).tolist() == [1, 5, 8, 11]
+
+
+@pytest.mark.parametrize("threshold", [3, 4, 5, 10, 50])
+def test_lttb_always_keeps_the_first_and_last_points(threshold):
+    """
+    The first and last points are kept, and exactly threshold increasing indices are returned.
+    """
+    rng = np.random.default_rng(7)
+    x = np.arange(100, dtype=np.float64)
+    y = rng.normal(size=100)
+
+    kept = lttb_indices(x, y, threshold)
+
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == 99
+    assert np.all(np.diff(kept) > 0)
+
+
+@pytest.mark.parametrize("threshold", [10, 11, 100])
+def test_lttb_returns_every_point_when_the_threshold_is_not_lower(threshold):
+    """
+    A series no longer than the threshold is returned whole, NaN values included.
+    """
+    y = PEAK_Y.copy()
+    y[2] = np.nan
+
+    assert lttb_indices(PEAK_X, y, threshold).tolist() == list(range(10))
+
+
+@pytest.mark.parametrize("threshold", [0, 1, 2])
+def test_lttb_returns_every_point_below_three_points(threshold):
+    """
+    A threshold below three leaves no bucket between the first and the last point, so nothing is removed.
+    """
+    assert lttb_indices(PEAK_X, PEAK_Y, threshold).tolist() == list(range(10))
+
+
+def test_lttb_returns_the_finite_points_when_they_fit_the_threshold():
+    """
+    When the points left once the NaN values are removed fit the threshold, they are all returned.
+    """
+    y = PEAK_Y.copy()
+    y[[1, 2, 4, 5]] = np.nan
+
+    assert lttb_indices(PEAK_X, y, 6).tolist() == [0, 3, 6, 7, 8, 9]
@@ -0,0 +1,125 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE GEOCODING CACHE
+##############################################################################
+import sqlite3
+import pytest
+import phase_3
+import weather_ingestion
+from phase_3 import cache_city_details, get_cached_city_details, get_city_details, save_city_and_country
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+BIRMINGHAM = {"latitude": 52.48, "longitude": -1.89, "country": "Great Britain", "timezone": "Europe/London"}
+GEOCODED_LEEDS = {"latitude": 53.8, "longitude": -1.55, "country": "Great Britain", "timezone": "Europe/London"}
+
+
+def age_cache_entry(connection, days):
+    """
+    Moves the cached_at of every geocoding cache entry the given number of days into the past.
+    """
+    with connection:
+        connection.execute("UPDATE geocode_cache SET cached_at = datetime('now', ?);", (f"-{days} days",))
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    """
+    Replaces Nominatim with a geocoder that only knows Leeds and records the cities it was asked for.
+    """
+    geocoded_cities = []
+
+    def geocode_city(city_name):
+        geocoded_cities.append(city_name)
+        if city_name != "Leeds":
+            raise ValueError(f"City '{city_name}' not found.")
+        return dict(GEOCODED_LEEDS)
+
+    monkeypatch.setattr(phase_3, "geocode_city", geocode_city)
+    monkeypatch.setattr(weather_ingestion, "geocode_city", geocode_city)
+    return geocoded_cities
+
+
+##############################################################################
+# TESTS OF THE CACHE TIME TO LIVE
+##############################################################################
+def test_cache_entries_expire_after_their_time_to_live(memory_db):
+    """
+    An entry is returned while younger than ttl_days, and ignored once older.
+    """
+    cache_city_details(memory_db, "Birmingham", BIRMINGHAM)
+    age_cache_entry(memory_db, 40)
+
+    assert get_cached_city_details(memory_db, "Birmingham", ttl_days=30) is None
+    assert get_cached_city_details(memory_db, "  BIRMINGHAM ", ttl_days=60) == BIRMINGHAM
+
+
+##############################################################################
+# TESTS OF get_city_details
+##############################################################################
+def test_cached_city_is_not_geocoded(weather_db_path, geocoder):
+    """
+    A city with a valid cache entry is answered from the cache.
+    """
+    connection = sqlite3.connect(weather_db_path)
+    with connection:
+        cache_city_details(connection, "Birmingham", BIRMINGHAM)
+    connection.close()
+
+    assert get_city_details("Birmingham", weather_db_path) == BIRMINGHAM
+    assert geocoder == []
+
+
+def test_stored_city_is_not_geocoded_when_its_cache_entry_expired(weather_db_path, geocoder):
+    """
+    A stored city whose cache entry expired keeps its saved coordinates, and its cache entry is renewed.
+    """
+    connection = sqlite3.connect(weather_db_path)
+    with connection:
+        save_city_and_country(connection.cursor(), "Birmingham", BIRMINGHAM)
+        cache_city_details(connection, "Birmingham", BIRMINGHAM)
+    age_cache_entry(connection, 40)
+
+    city_details = get_city_details("Birmingham", weather_db_path, ttl_days=30)
+
+    assert geocoder == []
+    assert {key: float(city_details[key]) for key in ("latitude", "longitude")} == {"latitude": 52.48,
+                                                                                     "longitude": -1.89}
+    assert (city_details["country"], city_details["timezone"]) == ("Great Britain", "Europe/London")
+    assert get_cached_city_details(connection, "Birmingham", ttl_days=30) == BIRMINGHAM
+    connection.close()
+
+
+def test_unknown_city_is_geocoded_and_cached(weather_db_path, geocoder):
+    """
+    A city neither cached nor stored is geocoded once, then answered from the cache.
+    """
+    assert get_city_details("Leeds", weather_db_path) == GEOCODED_LEEDS
+    assert get_city_details("Leeds", weather_db_path) == GEOCODED_LEEDS
+    assert geocoder == ["Leeds"]
+
+    with pytest.raises(ValueError):
+        get_city_details("Atlantis", weather_db_path)
+
+
+##############################################################################
+# TESTS OF THE CITY RESOLUTION OF THE CONCURRENT INGESTION
+##############################################################################
+def test_resolve_city_reuses_the_stored_city(weather_db_path, geocoder):
+    """
+    The ingestion reads a stored city without geocoding it, and leaves its caching to the writer thread.
+    """
+    connection = sqlite3.connect(weather_db_path)
+    with connection:
+        save_city_and_country(connection.cursor(), "Birmingham", BIRMINGHAM)
+    connection.close()
+
+    city_details, needs_caching = weather_ingestion.resolve_city(weather_db_path, "Birmingham")
+
+    assert geocoder == []
+    assert needs_caching
+    assert city_details["country"] == "Great Britain"
@@ -0,0 +1,62 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE DATABASE INITIALIZATION
+##############################################################################
+from conftest import open_database
+from phase_3 import initialize_db
+
+
+##############################################################################
+# TESTS OF THE MERGE OF THE DUPLICATE DAILY ROWS
+##############################################################################
+def test_duplicate_daily_rows_are_merged_into_the_lowest_id():
+    """
+    Each zero or NULL measure of the kept row takes the first non-zero, non-NULL value of its duplicates.
+    """
+    connection = open_database()
+    connection.executemany("""
+    INSERT INTO daily_weather_entries (id, date, min_temp, max_temp, mean_temp, precipitation, city_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?);
+    """, [
+        (1, "2020-01-01", 0, None, 5.0, 0, 1),
+        (2, "2020-01-01", 1.5, 9.0, 6.0, 0, 1),
+        (3, "2020-01-01", 2.5, 8.0, 7.0, 3.2, 1),
+        (4, "2020-01-02", 4.0, 10.0, 7.0, 0.4, 1),
+        (5, "2020-01-01", 0, 11.0, 0, 1.0, 2),
+    ])
+    connection.commit()
+
+    initialize_db(connection)
+
+    rows = connection.execute("""
+    SELECT id, city_id, date, min_temp, max_temp, mean_temp, precipitation
+    FROM daily_weather_entries ORDER BY id;
+    """).fetchall()
+    assert [tuple(row) for row in rows] == [
+        (1, 1, "2020-01-01", 1.5, 9.0, 5.0, 3.2),
+        (4, 1, "2020-01-02", 4.0, 10.0, 7.0, 0.4),
+        (5, 2, "2020-01-01", 0, 11.0, 0, 1.0),
+    ]
+    indexes = [index["name"] for index in connection.execute("PRAGMA index_list(daily_weather_entries);")]
+    assert "idx_daily_weather_city_date" in indexes
+    connection.close()
+
+
+def test_initialize_db_twice_keeps_the_rows():
+    """
+    A second initialization finds the indexes and leaves the daily rows as they are.
+    """
+    connection = open_database()
+    connection.execute("""
+    INSERT INTO daily_weather_entries (date, min_temp, max_temp, mean_temp, precipitation, city_id)
+    VALUES ('2020-01-01', 1.0, 2.0, 1.5, 0.0, 1);
+    """)
+    connection.commit()
+
+    initialize_db(connection)
+    initialize_db(connection)
+
+    assert connection.execute("SELECT COUNT(*) FROM daily_weather_entries;").fetchone()[0] == 1
+    connection.close()
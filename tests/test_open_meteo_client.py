@@ -0,0 +1,97 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE ARCHIVE CLIENT
+##############################################################################
+import io
+import gzip
+import json
+import pytest
+import requests
+import urllib3
+from ingestion_metrics import CityMetrics
+from open_meteo_client import ArchiveRequestError, OpenMeteoArchiveClient, response_size
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+DAILY_RESPONSE = json.dumps({"daily": {"time": ["2020-01-01"], "temperature_2m_mean": [3.5]}}).encode("utf-8")
+
+
+def http_response(status_code, body, headers=None):
+    """
+    Builds a requests response over a urllib3 response, as returned by requests.Session.get.
+    """
+    raw = urllib3.HTTPResponse(body=io.BytesIO(body), headers=headers or {}, status=status_code,
+                               preload_content=False)
+    response = requests.Response()
+    response.raw = raw
+    response.status_code = status_code
+    response.headers = requests.structures.CaseInsensitiveDict(raw.headers)
+    return response
+
+
+class SequenceSession:
+    """
+    Session answering the requests with the given responses, in order.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, params=None, timeout=None):
+        return self.responses.pop(0)
+
+
+##############################################################################
+# TESTS OF response_size
+##############################################################################
+def test_response_size_counts_the_compressed_body():
+    """
+    A gzip-encoded body counts its bytes as received, not once decoded.
+    """
+    compressed_body = gzip.compress(DAILY_RESPONSE * 50)
+    response = http_response(200, compressed_body, {"Content-Encoding": "gzip"})
+
+    assert response.content == DAILY_RESPONSE * 50
+    assert response_size(response) == len(compressed_body)
+
+
+##############################################################################
+# TESTS OF THE REQUEST METRICS
+##############################################################################
+def test_retried_responses_are_counted_in_the_downloaded_bytes():
+    """
+    The bodies of the retried HTTP 429 and 5xx responses are added to the bytes of the final response.
+    """
+    error_body = b"<html>Service Unavailable</html>"
+    session = SequenceSession([
+        http_response(503, error_body, {"Retry-After": "0"}),
+        http_response(429, error_body, {"Retry-After": "0"}),
+        http_response(200, DAILY_RESPONSE),
+    ])
+    client = OpenMeteoArchiveClient(session=session, max_retries=2, backoff_seconds=0)
+    city_metrics = CityMetrics("Birmingham")
+
+    daily_weather = client.get_daily(52.48, -1.89, "2020-01-01", "2020-01-01", "Europe/London",
+                                     ["temperature_2m_mean"], city_metrics)
+
+    assert daily_weather["daily"]["temperature_2m_mean"] == [3.5]
+    assert city_metrics.requests == 3
+    assert city_metrics.bytes_downloaded == 2 * len(error_body) + len(DAILY_RESPONSE)
+
+
+def test_failed_request_still_counts_its_bytes():
+    """
+    The bytes of a request ending in an error are recorded too.
+    """
+    error_body = b"Bad Request"
+    client = OpenMeteoArchiveClient(session=SequenceSession([http_response(400, error_body)]), max_retries=2)
+    city_metrics = CityMetrics("Birmingham")
+
+    with pytest.raises(ArchiveRequestError):
+        client.request({"latitude": 52.48}, city_metrics)
+
+    assert (city_metrics.requests, city_metrics.bytes_downloaded) == (1, len(error_body))
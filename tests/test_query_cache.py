@@ -0,0 +1,96 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE QUERY RESULT CACHE
+##############################################################################
+import pytest
+from conftest import daily_data
+from phase_1 import average_annual_temperature
+from phase_3 import save_weather_data
+from query_cache import bump_data_generations, data_generation, query_result_cache
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+CITY_DETAILS = {"latitude": 52.48, "longitude": -1.89, "country": "Great Britain", "timezone": "Europe/London"}
+
+
+def save_mean_temperatures(connection, mean_temperatures):
+    """
+    Saves Birmingham with the given mean temperature on each date, and returns the city ID.
+    """
+    dates = list(mean_temperatures)
+    readings = [1.0] * len(dates)
+    with connection:
+        save_weather_data(connection, "Birmingham", CITY_DETAILS,
+                          daily_data(dates, readings, readings, mean_temperatures.values(), readings, readings),
+                          dates[0], dates[-1])
+    return connection.execute("SELECT id FROM cities WHERE name = 'Birmingham';").fetchone()[0]
+
+
+def annual_mean_temperature(connection, city_id, year):
+    """
+    Returns the annual mean temperature given by the cached phase 1 query.
+    """
+    return average_annual_temperature(connection, city_id, year).fetchone()["annual_mean_temperature"]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """
+    Starts and ends every test with an empty cache, shared by the whole process.
+    """
+    query_result_cache.clear()
+    yield
+    query_result_cache.clear()
+
+
+##############################################################################
+# TESTS OF THE DATA GENERATIONS
+##############################################################################
+def test_bump_data_generations_counts_the_saves_of_every_year(memory_db):
+    """
+    Every save bumps the generation of each year it covers, and only those.
+    """
+    bump_data_generations(memory_db, 1, "2019-12-30", "2020-01-02")
+    bump_data_generations(memory_db, 1, "2020-06-01", "2020-06-30")
+    bump_data_generations(memory_db, 2, "2020-01-01", "2020-01-01")
+
+    assert data_generation(memory_db, 1, "2019", "2019") == 1
+    assert data_generation(memory_db, 1, "2020", "2020") == 2
+    assert data_generation(memory_db, 1) == 3
+    assert data_generation(memory_db, None, "2020", "2020") == 3
+    assert data_generation(memory_db, 3) == 0
+
+
+##############################################################################
+# TESTS OF cached_query
+##############################################################################
+def test_cached_result_is_served_until_its_data_is_saved_again(memory_db):
+    """
+    A phase 1 result is read from the cache while its city and year are unchanged, and computed again
+    after save_weather_data writes into them.
+    """
+    city_id = save_mean_temperatures(memory_db, {"2020-01-01": 2.0, "2020-01-02": 4.0})
+
+    assert annual_mean_temperature(memory_db, city_id, 2020) == pytest.approx(3.0)
+    assert annual_mean_temperature(memory_db, city_id, 2020) == pytest.approx(3.0)
+    assert (query_result_cache.hits, query_result_cache.misses) == (1, 1)
+
+    # A change the data generations do not know about is not seen, the cached rows are served
+    with memory_db:
+        memory_db.execute("UPDATE yearly_weather_rollups SET mean_temp_sum = mean_temp_sum + 100;")
+    assert annual_mean_temperature(memory_db, city_id, 2020) == pytest.approx(3.0)
+    assert (query_result_cache.hits, query_result_cache.misses) == (2, 1)
+
+    # Saving another year of the city keeps the cached result
+    save_mean_temperatures(memory_db, {"2021-01-01": 8.0})
+    assert annual_mean_temperature(memory_db, city_id, 2020) == pytest.approx(3.0)
+    assert (query_result_cache.hits, query_result_cache.misses) == (3, 1)
+
+    # Saving into 2020 bumps its generation, the result is computed again from the refreshed rollups
+    save_mean_temperatures(memory_db, {"2020-01-03": 9.0})
+    assert annual_mean_temperature(memory_db, city_id, 2020) == pytest.approx(5.0)
+    assert (query_result_cache.hits, query_result_cache.misses) == (3, 2)
@@ -0,0 +1,53 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE QUERY COMMAND
+##############################################################################
+import io
+import os
+import sys
+import sqlite3
+from query_cli import TABLE_COLUMN_WIDTH, RowWriter, main
+
+
+##############################################################################
+# TESTS OF THE TABLE OUTPUT
+##############################################################################
+def test_table_columns_fit_their_names():
+    """
+    A column name longer than TABLE_COLUMN_WIDTH is written whole and widens its column.
+    """
+    output_file = io.StringIO()
+    writer = RowWriter(output_file, "table")
+    writer.write_header(["city_id", "average_seven_day_precipitation"])
+    writer.write_rows([(1, 2.345)])
+
+    header, separator, row = output_file.getvalue().splitlines()
+    assert header == "city_id".ljust(TABLE_COLUMN_WIDTH) + " average_seven_day_precipitation"
+    assert separator == "-" * len(header)
+    assert row == "1".ljust(TABLE_COLUMN_WIDTH) + " 2.35"
+    assert header.index("average") == row.index("2.35")
+
+
+##############################################################################
+# TESTS OF main
+##############################################################################
+def test_closed_console_pipe_exits_quietly(weather_db_path, monkeypatch, capsys):
+    """
+    A reader of the console output that stops early, like head, ends the command without a traceback.
+    """
+    connection = sqlite3.connect(weather_db_path)
+    with connection:
+        connection.executemany("INSERT INTO countries (name, timezone) VALUES (?, 'Europe/London');",
+                               [(f"Country {country}",) for country in range(5000)])
+    connection.close()
+
+    read_end, write_end = os.pipe()
+    os.close(read_end)
+    with open(write_end, "w", encoding="utf-8") as closed_pipe:
+        monkeypatch.setattr(sys, "stdout", closed_pipe)
+        exit_status = main(["countries", "--db", weather_db_path, "--format", "csv"])
+
+    assert exit_status == 1
+    assert capsys.readouterr().err == ""
@@ -0,0 +1,129 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE SYNC PLANNER
+##############################################################################
+from datetime import date, timedelta
+import pytest
+from sync_planner import city_coverage_gaps, merge_intervals, plan_incremental_sync
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+CITY_ID = 1
+CITY_NAME = "Birmingham"
+
+
+def store_days(connection, days, null_days=()):
+    """
+    Stores Birmingham and a complete daily entry for each of the given day numbers (see day_date), with a
+    NULL precipitation on the null_days.
+    """
+    with connection:
+        connection.execute("INSERT INTO countries (id, name, timezone) VALUES (1, 'Great Britain', 'Europe/London');")
+        connection.execute("INSERT INTO cities (id, name, longitude, latitude, country_id) "
+                           "VALUES (?, ?, -1.89, 52.48, 1);", (CITY_ID, CITY_NAME))
+        connection.executemany("""
+        INSERT INTO daily_weather_entries (date, min_temp, max_temp, mean_temp, precipitation, sw_radiation, city_id)
+        VALUES (?, 1.0, 2.0, 1.5, ?, 3.0, ?);
+        """, [(day_date(day), None if day in null_days else 0.5, CITY_ID) for day in days])
+
+
+def day_date(day):
+    """
+    Returns the YYYY-MM-DD date of a day number, day 1 being 2020-01-01.
+    """
+    return (date(2020, 1, 1) + timedelta(days=day - 1)).isoformat()
+
+
+def day_intervals(*intervals):
+    """
+    Turns (first_day, last_day) pairs of day numbers into (start_date, end_date) tuples.
+    """
+    return [(day_date(first_day), day_date(last_day)) for first_day, last_day in intervals]
+
+
+##############################################################################
+# TESTS OF city_coverage_gaps
+##############################################################################
+@pytest.mark.parametrize("stored_days, null_days, date_range, expected_gaps", [
+    pytest.param([], (), (1, 10), [(1, 10)], id="empty city"),
+    pytest.param(range(5, 11), (), (1, 10), [(1, 4)], id="leading gap"),
+    pytest.param(range(1, 7), (), (1, 10), [(7, 10)], id="trailing gap"),
+    pytest.param([1, 2, 5, 9, 10], (), (1, 10), [(3, 4), (6, 8)], id="interior gaps"),
+    pytest.param(range(1, 11), (5,), (1, 10), [(5, 5)], id="null measure"),
+    pytest.param(range(1, 11), (), (1, 10), [], id="complete"),
+    pytest.param(range(1, 11), (), (3, 6), [], id="range inside the stored days"),
+    pytest.param([2, 8], (), (1, 10), [(1, 1), (3, 7), (9, 10)], id="leading, interior and trailing gaps"),
+])
+def test_city_coverage_gaps(memory_db, stored_days, null_days, date_range, expected_gaps):
+    """
+    The missing and partially NULL days of the range are returned as intervals.
+    """
+    store_days(memory_db, stored_days, null_days)
+
+    gaps = city_coverage_gaps(memory_db, CITY_ID, day_date(date_range[0]), day_date(date_range[1]))
+
+    assert gaps == day_intervals(*expected_gaps)
+
+
+##############################################################################
+# TESTS OF merge_intervals
+##############################################################################
+@pytest.mark.parametrize("intervals, merge_gap_days, expected_intervals", [
+    pytest.param([], 7, [], id="no interval"),
+    pytest.param([(1, 2)], 7, [(1, 2)], id="single interval"),
+    pytest.param([(1, 2), (5, 6)], 7, [(1, 6)], id="close intervals merged"),
+    pytest.param([(1, 1), (8, 9)], 7, [(1, 9)], id="six days apart merged"),
+    pytest.param([(1, 1), (9, 9)], 7, [(1, 1), (9, 9)], id="seven days apart kept"),
+    pytest.param([(1, 2), (3, 4)], 0, [(1, 2), (3, 4)], id="no merging"),
+    pytest.param([(1, 10), (3, 5)], 7, [(1, 10)], id="contained interval"),
+    pytest.param([(1, 2), (4, 5), (20, 21), (23, 24)], 3, [(1, 5), (20, 24)], id="two groups"),
+])
+def test_merge_intervals(intervals, merge_gap_days, expected_intervals):
+    """
+    Intervals fewer than merge_gap_days days apart are requested together.
+    """
+    merged = merge_intervals(day_intervals(*intervals), merge_gap_days)
+
+    assert merged == day_intervals(*expected_intervals)
+
+
+##############################################################################
+# TESTS OF plan_incremental_sync
+##############################################################################
+@pytest.mark.parametrize("stored_days, date_from, date_to, expected_plan", [
+    pytest.param([], 1, 10, [(1, 10)], id="empty city with a start date"),
+    pytest.param(range(5, 21), 1, 25, [(1, 4), (21, 25)], id="leading and trailing gaps"),
+    pytest.param(range(1, 11), None, 15, [(11, 15)], id="trailing gap from the first stored day"),
+    pytest.param([1, 2, *range(20, 31)], None, 40, [(3, 19), (31, 40)], id="interior and trailing gaps"),
+    pytest.param([1, 2, 3, 4, 5, 10], None, 20, [(6, 20)], id="gaps closer than a week merged"),
+    pytest.param(range(1, 11), None, 5, [], id="date_to before the last stored day"),
+    pytest.param([1, 2, 3, 6, 7, 8, 9, 10], None, 7, [(4, 5)], id="gap before date_to"),
+    pytest.param(range(1, 11), 12, 5, [], id="date_from after date_to"),
+])
+def test_plan_incremental_sync(memory_db, stored_days, date_from, date_to, expected_plan):
+    """
+    A stored city is extended up to date_to, from date_from or from its first stored day.
+    """
+    store_days(memory_db, stored_days)
+
+    sync_plan, unplanned_cities = plan_incremental_sync(
+        memory_db, [CITY_NAME], None if date_from is None else day_date(date_from), date_to=day_date(date_to))
+
+    assert sync_plan == {CITY_NAME: day_intervals(*expected_plan)}
+    assert unplanned_cities == []
+
+
+def test_plan_incremental_sync_without_data_or_start_date(memory_db):
+    """
+    A city with no stored data and no start date cannot be planned.
+    """
+    store_days(memory_db, [])
+
+    sync_plan, unplanned_cities = plan_incremental_sync(memory_db, [CITY_NAME, "Leeds"], date_to=day_date(10))
+
+    assert sync_plan == {CITY_NAME: [], "Leeds": []}
+    assert unplanned_cities == [CITY_NAME, "Leeds"]
@@ -0,0 +1,103 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE BATCHED UPSERT
+##############################################################################
+from conftest import daily_data
+from phase_3 import build_daily_weather_rows, save_weather_data, upsert_daily_weather_entries
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+CITY_DETAILS = {"latitude": 52.48, "longitude": -1.89, "country": "Great Britain", "timezone": "Europe/London"}
+
+
+def stored_rows(connection, city_id=1):
+    """
+    Returns the stored (date, measures...) rows of a city in date order.
+    """
+    return [tuple(row) for row in connection.execute("""
+    SELECT date, min_temp, max_temp, mean_temp, precipitation, sw_radiation
+    FROM daily_weather_entries WHERE city_id = ? ORDER BY date;
+    """, (city_id,))]
+
+
+##############################################################################
+# TESTS OF upsert_daily_weather_entries
+##############################################################################
+def test_upsert_inserts_new_days(memory_db):
+    """
+    Days with no stored row are inserted.
+    """
+    cursor = memory_db.cursor()
+    rows = build_daily_weather_rows(1, daily_data(
+        ["2020-01-01", "2020-01-02"], [1.0, 2.0], [5.0, 6.0], [3.0, 4.0], [0.5, 0.0], [None, 7.5]))
+
+    assert upsert_daily_weather_entries(cursor, rows) == 2
+    # A missing sw_radiation is saved as the default of the column
+    assert stored_rows(memory_db) == [
+        ("2020-01-01", 1.0, 5.0, 3.0, 0.5, 0),
+        ("2020-01-02", 2.0, 6.0, 4.0, 0.0, 7.5),
+    ]
+
+
+def test_upsert_only_replaces_zero_or_null_columns(memory_db):
+    """
+    A stored day only takes the new values of its zero or NULL columns.
+    """
+    cursor = memory_db.cursor()
+    upsert_daily_weather_entries(cursor, build_daily_weather_rows(1, daily_data(
+        ["2020-01-01"], [1.0], [None], [0.0], [2.5], [0.0])))
+
+    changed_rows = upsert_daily_weather_entries(cursor, build_daily_weather_rows(1, daily_data(
+        ["2020-01-01"], [9.0], [8.0], [7.0], [6.0], [5.0])))
+
+    assert changed_rows == 1
+    assert stored_rows(memory_db) == [("2020-01-01", 1.0, 8.0, 7.0, 2.5, 5.0)]
+
+
+def test_upsert_skips_fully_filled_rows(memory_db):
+    """
+    A stored day with no zero or NULL column is left untouched and not counted.
+    """
+    cursor = memory_db.cursor()
+    upsert_daily_weather_entries(cursor, build_daily_weather_rows(1, daily_data(
+        ["2020-01-01"], [1.0], [5.0], [3.0], [0.5], [7.5])))
+
+    changed_rows = upsert_daily_weather_entries(cursor, build_daily_weather_rows(1, daily_data(
+        ["2020-01-01"], [9.0], [8.0], [7.0], [6.0], [5.0])))
+
+    assert changed_rows == 0
+    assert stored_rows(memory_db) == [("2020-01-01", 1.0, 5.0, 3.0, 0.5, 7.5)]
+
+
+##############################################################################
+# TESTS OF THE ROW COUNTS OF save_weather_data
+##############################################################################
+def test_save_weather_data_counts_inserted_updated_and_skipped_rows(memory_db):
+    """
+    The row counts of save_weather_data follow what the upsert did with each day.
+    """
+    first_data = daily_data(["2020-01-01", "2020-01-02"], [1.0, 2.0], [5.0, 0.0], [3.0, 4.0], [0.5, 0.5],
+                            [7.5, 7.5])
+    row_counts = {}
+    with memory_db:
+        assert save_weather_data(memory_db, "Birmingham", CITY_DETAILS, first_data, "2020-01-01", "2020-01-02",
+                                 row_counts) == 2
+    assert row_counts == {"inserted": 2, "updated": 0, "skipped": 0}
+
+    # 2020-01-01 is complete, 2020-01-02 has a zero max_temp and 2020-01-03 is new
+    second_data = daily_data(["2020-01-01", "2020-01-02", "2020-01-03"], [1.1, 2.1, 3.1], [5.1, 6.1, 7.1],
+                             [3.1, 4.1, 5.1], [0.6, 0.6, 0.6], [7.6, 7.6, 7.6])
+    row_counts = {}
+    with memory_db:
+        save_weather_data(memory_db, "Birmingham", CITY_DETAILS, second_data, "2020-01-01", "2020-01-03", row_counts)
+
+    assert row_counts == {"inserted": 1, "updated": 1, "skipped": 1}
+    assert stored_rows(memory_db) == [
+        ("2020-01-01", 1.0, 5.0, 3.0, 0.5, 7.5),
+        ("2020-01-02", 2.0, 6.1, 4.0, 0.5, 7.5),
+        ("2020-01-03", 3.1, 7.1, 5.1, 0.6, 7.6),
+    ]
@@ -0,0 +1,138 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE WEATHER EXPORT
+##############################################################################
+import os
+import csv
+import gzip
+import json
+import sqlite3
+import pytest
+from conftest import daily_data
+from phase_3 import save_weather_data
+from weather_export import export_cities, write_export
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+CITIES = {
+    "Birmingham": {"latitude": 52.48, "longitude": -1.89, "country": "Great Britain", "timezone": "Europe/London"},
+    "Leeds": {"latitude": 53.8, "longitude": -1.55, "country": "Great Britain", "timezone": "Europe/London"},
+}
+DATES = ["2020-01-01", "2020-01-02", "2020-01-03", "2020-01-04"]
+
+
+def store_cities(db_path):
+    """
+    Saves four days of every city of CITIES, and returns the city IDs by name.
+    """
+    connection = sqlite3.connect(db_path)
+    with connection:
+        for city_number, (city_name, city_details) in enumerate(CITIES.items()):
+            readings = [city_number + day / 10 for day in range(len(DATES))]
+            save_weather_data(connection, city_name, city_details,
+                              daily_data(DATES, readings, readings, readings, readings, readings), DATES[0], DATES[-1])
+    city_ids = dict(connection.execute("SELECT name, id FROM cities;").fetchall())
+    connection.close()
+    return city_ids
+
+
+class FailingCursor:
+    """
+    Cursor returning one batch of rows, then failing as a lost connection would.
+    """
+
+    description = (("date",), ("city_id",))
+
+    def __init__(self):
+        self.batches = [[("2020-01-01", 1)]]
+
+    def fetchmany(self, size=1):
+        if not self.batches:
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.batches.pop()
+
+
+##############################################################################
+# TESTS OF export_cities
+##############################################################################
+def test_gzip_csv_export_reads_back(weather_db_path, tmp_path, monkeypatch):
+    """
+    A city exported as gzip-compressed CSV reads back with its rows, written under a .part name first.
+    """
+    city_ids = store_cities(weather_db_path)
+    output_dir = tmp_path / "exports"
+    replaced_files = []
+    real_replace = os.replace
+
+    def replace(source, destination):
+        replaced_files.append((os.path.basename(source), os.path.basename(destination)))
+        real_replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", replace)
+
+    summary = export_cities(weather_db_path, str(output_dir), city_ids=[city_ids["Leeds"]], date_from="2020-01-02",
+                            date_to="2020-01-03", compress=True)
+
+    city_summary = summary[city_ids["Leeds"]]
+    file_name = f"city_{city_ids['Leeds']}_Leeds.csv.gz"
+    assert city_summary["error"] is None
+    assert city_summary["file"] == str(output_dir / file_name)
+    assert city_summary["rows"] == 2
+    assert city_summary["bytes"] == os.path.getsize(city_summary["file"])
+    assert replaced_files == [(f"{file_name}.part", file_name)]
+    assert os.listdir(output_dir) == [file_name]
+
+    with gzip.open(city_summary["file"], "rt", encoding="utf-8", newline="") as export_file:
+        rows = list(csv.DictReader(export_file))
+    assert [row["date"] for row in rows] == ["2020-01-02", "2020-01-03"]
+    assert {row["city_name"] for row in rows} == {"Leeds"}
+    assert {row["country_name"] for row in rows} == {"Great Britain"}
+    assert [float(row["mean_temp"]) for row in rows] == [1.1, 1.2]
+    assert [float(row["sw_radiation"]) for row in rows] == [1.1, 1.2]
+
+
+def test_jsonl_export_of_every_city(weather_db_path, tmp_path):
+    """
+    Without city IDs every city is exported, each to its own JSON Lines file.
+    """
+    city_ids = store_cities(weather_db_path)
+
+    summary = export_cities(weather_db_path, str(tmp_path), output_format="jsonl", max_workers=2)
+
+    assert sorted(summary) == sorted(city_ids.values())
+    for city_name, city_id in city_ids.items():
+        with open(summary[city_id]["file"], encoding="utf-8") as export_file:
+            rows = [json.loads(line) for line in export_file]
+        assert [row["date"] for row in rows] == DATES
+        assert {row["city_name"] for row in rows} == {city_name}
+        assert summary[city_id]["rows"] == len(DATES)
+
+
+@pytest.mark.parametrize("date_from, date_to", [("20200102", None), (None, "2020-13-01"), ("2020-01-03", "2020-01-02")])
+def test_invalid_dates_are_rejected(weather_db_path, tmp_path, date_from, date_to):
+    """
+    Dates must be YYYY-MM-DD, and the start date cannot be after the end date.
+    """
+    with pytest.raises(ValueError):
+        export_cities(weather_db_path, str(tmp_path), date_from=date_from, date_to=date_to)
+
+
+##############################################################################
+# TESTS OF write_export
+##############################################################################
+def test_interrupted_export_keeps_the_previous_file(tmp_path):
+    """
+    An export failing part way removes its .part file and leaves the file of the previous export untouched.
+    """
+    file_path = tmp_path / "city_1_Birmingham.csv"
+    file_path.write_text("previous export\n", encoding="utf-8")
+
+    with pytest.raises(sqlite3.OperationalError):
+        write_export(FailingCursor(), str(file_path), batch_size=1)
+
+    assert file_path.read_text(encoding="utf-8") == "previous export\n"
+    assert os.listdir(tmp_path) == [file_path.name]
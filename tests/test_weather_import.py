@@ -0,0 +1,216 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE OFFLINE IMPORT
+##############################################################################
+import json
+import sqlite3
+import pytest
+import phase_3
+from phase_3 import save_city_and_country
+from weather_import import import_archive_files
+
+
+##############################################################################
+# TEST DATA
+##############################################################################
+CITIES = {
+    "Birmingham": {"latitude": 52.48, "longitude": -1.89, "country": "Great Britain", "timezone": "Europe/London"},
+    "Leeds": {"latitude": 53.8, "longitude": -1.55, "country": "Great Britain", "timezone": "Europe/London"},
+}
+DATES = ["2020-01-01", "2020-01-02", "2020-01-03"]
+VARIABLES = ("temperature_2m_min", "temperature_2m_max", "temperature_2m_mean", "precipitation_sum",
+             "shortwave_radiation_sum")
+
+
+def api_response(latitude, longitude, dates=DATES, first_reading=1.0):
+    """
+    Returns an archive API response of the given dates, every variable holding first_reading on the first day
+    and growing by 1 a day.
+    """
+    daily = {"time": list(dates)}
+    for variable in VARIABLES:
+        daily[variable] = [first_reading + day for day in range(len(dates))]
+    return {"latitude": latitude, "longitude": longitude, "timezone": "Europe/London", "daily": daily}
+
+
+def write_json(path, content):
+    """
+    Writes content as a JSON file and returns its path.
+    """
+    path.write_text(json.dumps(content), encoding="utf-8")
+    return str(path)
+
+
+def store_cities(db_path):
+    """
+    Saves the cities of CITIES, with no daily data.
+    """
+    connection = sqlite3.connect(db_path)
+    with connection:
+        for city_name, city_details in CITIES.items():
+            save_city_and_country(connection.cursor(), city_name, city_details)
+    connection.close()
+
+
+def stored_days(db_path):
+    """
+    Returns the stored (city name, date, mean_temp) rows in city and date order.
+    """
+    connection = sqlite3.connect(db_path)
+    rows = connection.execute("""
+    SELECT c.name, dw.date, dw.mean_temp
+    FROM daily_weather_entries AS dw
+    JOIN cities AS c
+    ON c.id = dw.city_id
+    ORDER BY c.name, dw.date;
+    """).fetchall()
+    connection.close()
+    return rows
+
+
+##############################################################################
+# TESTS OF THE FILE FORMATS
+##############################################################################
+def test_api_json_file_is_matched_to_the_nearest_city(weather_db_path, tmp_path):
+    """
+    A JSON body of the archive API is saved for the stored city nearest to its coordinates.
+    """
+    store_cities(weather_db_path)
+    file_path = write_json(tmp_path / "birmingham.json", api_response(52.5, -1.875))
+
+    summary = import_archive_files(weather_db_path, [file_path])
+
+    assert summary[file_path] == {"city": "Birmingham", "rows": 3, "date_from": "2020-01-01",
+                                  "date_to": "2020-01-03", "seconds": summary[file_path]["seconds"], "error": None}
+    assert stored_days(weather_db_path) == [("Birmingham", day, 1.0 + number) for number, day in enumerate(DATES)]
+
+
+def test_csv_download_with_location_block_and_units(weather_db_path, tmp_path):
+    """
+    A CSV download is read past its location block, with the units after the variable names ignored.
+    """
+    store_cities(weather_db_path)
+    file_path = tmp_path / "leeds.csv"
+    file_path.write_text(
+        "latitude,longitude,elevation,utc_offset_seconds,timezone,timezone_abbreviation\n"
+        "53.78,-1.56,110.0,0,Europe/London,GMT\n"
+        "\n"
+        "time,temperature_2m_min (°C),temperature_2m_max (°C),temperature_2m_mean (°C),precipitation_sum (mm),"
+        "shortwave_radiation_sum (MJ/m²)\n"
+        "2020-01-01,1.0,5.0,3.0,0.5,2.0\n"
+        "2020-01-02,2.0,6.0,4.0,,2.5\n",
+        encoding="utf-8",
+    )
+
+    summary = import_archive_files(weather_db_path, [str(file_path)])
+
+    assert summary[str(file_path)]["error"] is None
+    assert summary[str(file_path)]["city"] == "Leeds"
+    connection = sqlite3.connect(weather_db_path)
+    rows = connection.execute("""
+    SELECT date, min_temp, max_temp, mean_temp, precipitation, sw_radiation FROM daily_weather_entries ORDER BY date;
+    """).fetchall()
+    connection.close()
+    assert rows == [("2020-01-01", 1.0, 5.0, 3.0, 0.5, 2.0), ("2020-01-02", 2.0, 6.0, 4.0, None, 2.5)]
+
+
+def test_recorded_response_uses_the_requested_coordinates(weather_db_path, tmp_path):
+    """
+    A response recorded by phase 3 with --record-dir is matched on the coordinates it was requested for.
+    """
+    store_cities(weather_db_path)
+    params = {"latitude": 53.8, "longitude": -1.55, "start_date": DATES[0], "end_date": DATES[-1],
+              "daily": ",".join(VARIABLES), "timezone": "Europe/London"}
+    recordings_dir = tmp_path / "recordings"
+    recordings_dir.mkdir()
+    write_json(recordings_dir / "0123abcd.json", {"params": params, "body": json.dumps(api_response(60.0, 10.0))})
+
+    summary = import_archive_files(weather_db_path, [str(recordings_dir)])
+
+    assert [file_summary["city"] for file_summary in summary.values()] == ["Leeds"]
+    assert [row[0] for row in stored_days(weather_db_path)] == ["Leeds"] * 3
+
+
+##############################################################################
+# TESTS OF THE OFFLINE CITY MATCHING
+##############################################################################
+@pytest.mark.parametrize("max_degrees, expected_city", [(0.25, None), (0.5, "Birmingham")])
+def test_max_degrees_bounds_the_city_matching(weather_db_path, tmp_path, max_degrees, expected_city):
+    """
+    A file 0.42 degrees away from the nearest stored city is only matched with a larger max_degrees.
+    """
+    store_cities(weather_db_path)
+    file_path = write_json(tmp_path / "near_birmingham.json", api_response(52.9, -1.89))
+
+    summary = import_archive_files(weather_db_path, [file_path], max_degrees=max_degrees)
+
+    assert summary[file_path]["city"] == expected_city
+    if expected_city is None:
+        assert summary[file_path]["error"].startswith("No stored city near (52.9, -1.89)")
+        assert stored_days(weather_db_path) == []
+    else:
+        assert summary[file_path]["error"] is None
+
+
+def test_named_city_is_created_with_its_country(weather_db_path, tmp_path):
+    """
+    A city that is not stored yet is created at the coordinates of the file when its country is given.
+    """
+    file_path = write_json(tmp_path / "york.json", api_response(53.96, -1.08))
+
+    without_country = import_archive_files(weather_db_path, [file_path], city_name="York")
+    with_country = import_archive_files(weather_db_path, [file_path], city_name="York", country="Great Britain")
+
+    assert "--country" in without_country[file_path]["error"]
+    assert with_country[file_path]["error"] is None
+    assert [row[0] for row in stored_days(weather_db_path)] == ["York"] * 3
+
+
+##############################################################################
+# TESTS OF THE PER-FILE TRANSACTIONS
+##############################################################################
+@pytest.mark.parametrize("bad_daily, expected_error", [
+    pytest.param({"time": ["2020-01-04", "2020-01-5x"]}, "Invalid date 2020-01-5x", id="bad date"),
+    pytest.param({"temperature_2m_mean": [1.0]}, "temperature_2m_mean has 1 values for 2 dates",
+                 id="missing values"),
+])
+def test_malformed_file_is_rejected_without_partial_rows(weather_db_path, tmp_path, bad_daily, expected_error):
+    """
+    A malformed file saves none of its rows, and the files around it are still imported.
+    """
+    store_cities(weather_db_path)
+    malformed_response = api_response(52.48, -1.89, ["2020-01-04", "2020-01-05"])
+    malformed_response["daily"].update(bad_daily)
+    first_path = write_json(tmp_path / "1_birmingham.json", api_response(52.48, -1.89))
+    malformed_path = write_json(tmp_path / "2_malformed.json", malformed_response)
+    last_path = write_json(tmp_path / "3_leeds.json", api_response(53.8, -1.55))
+
+    summary = import_archive_files(weather_db_path, [str(tmp_path)])
+
+    assert list(summary) == [first_path, malformed_path, last_path]
+    assert expected_error in summary[malformed_path]["error"]
+    assert summary[first_path]["error"] is None and summary[last_path]["error"] is None
+    assert [(row[0], row[1]) for row in stored_days(weather_db_path)] == (
+        [("Birmingham", day) for day in DATES] + [("Leeds", day) for day in DATES])
+
+
+def test_failed_save_rolls_back_the_whole_file(weather_db_path, tmp_path, monkeypatch):
+    """
+    A database error after the daily rows of a file were written rolls back the file, its new city included.
+    """
+    def failing_bump(connection, city_id, date_from, date_to):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(phase_3, "bump_data_generations", failing_bump)
+    file_path = write_json(tmp_path / "york.json", api_response(53.96, -1.08))
+
+    summary = import_archive_files(weather_db_path, [file_path], city_name="York", country="Great Britain")
+
+    assert summary[file_path]["error"] == "database is locked"
+    connection = sqlite3.connect(weather_db_path)
+    assert connection.execute("SELECT COUNT(*) FROM daily_weather_entries;").fetchone()[0] == 0
+    assert connection.execute("SELECT COUNT(*) FROM cities;").fetchone()[0] == 0
+    assert connection.execute("SELECT COUNT(*) FROM rolling_weather_windows;").fetchone()[0] == 0
+    connection.close()
@@ -0,0 +1,99 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE TESTS OF THE CONCURRENT INGESTION
+##############################################################################
+import json
+import sqlite3
+import threading
+from datetime import date, timedelta
+import open_meteo_client
+from open_meteo_client import OpenMeteoArchiveClient
+from phase_3 import cache_city_details
+from weather_ingestion import ingest_cities
+
+
+##############################################################################
+# STUB OF THE ARCHIVE API
+##############################################################################
+# Cities of the test, told apart by the stub through their latitude
+CITIES = {
+    "Birmingham": {"latitude": 52.48, "longitude": -1.89, "country": "Great Britain", "timezone": "Europe/London"},
+    "Leeds": {"latitude": 53.8, "longitude": -1.55, "country": "Great Britain", "timezone": "Europe/London"},
+    "Failing": {"latitude": 10.0, "longitude": 10.0, "country": "Nowhere", "timezone": "Africa/Lagos"},
+    "Malformed": {"latitude": 20.0, "longitude": 20.0, "country": "Nowhere", "timezone": "Africa/Lagos"},
+}
+
+
+class StubResponse:
+    """
+    Response of the stubbed archive API, with the attributes read by open_meteo_client.
+    """
+
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = {}
+
+
+class StubArchiveSession:
+    """
+    Session answering HTTP 500 for the "Failing" city, a response with a missing variable for the
+    "Malformed" city and one reading per day for the other cities.
+    """
+
+    def get(self, url, params=None, timeout=None):
+        if params["latitude"] == CITIES["Failing"]["latitude"]:
+            return StubResponse(500)
+
+        first_day = date.fromisoformat(params["start_date"])
+        days = (date.fromisoformat(params["end_date"]) - first_day).days + 1
+        daily = {"time": [(first_day + timedelta(days=day)).isoformat() for day in range(days)]}
+        for variable in params["daily"].split(","):
+            daily[variable] = [1.5] * days
+        if params["latitude"] == CITIES["Malformed"]["latitude"]:
+            del daily["temperature_2m_max"]
+        return StubResponse(200, json.dumps({"daily": daily}))
+
+
+##############################################################################
+# TESTS OF ingest_cities
+##############################################################################
+def test_failed_and_malformed_cities_do_not_stop_the_others(weather_db_path, monkeypatch):
+    """
+    An HTTP error and a malformed response only fail their own city, and the writer thread exits.
+    """
+    monkeypatch.setattr(open_meteo_client, "_archive_client",
+                        OpenMeteoArchiveClient(session=StubArchiveSession(), max_retries=0))
+    connection = sqlite3.connect(weather_db_path)
+    with connection:
+        for city_name, city_details in CITIES.items():
+            cache_city_details(connection, city_name, city_details)
+    connection.close()
+    threads_before = set(threading.enumerate())
+
+    summary = ingest_cities(weather_db_path, list(CITIES), "2020-01-01", "2020-01-10", max_workers=2, batch_size=4,
+                            chunk_days=5)
+
+    assert set(threading.enumerate()) == threads_before
+    assert list(summary) == list(CITIES)
+    for city_name in ("Birmingham", "Leeds"):
+        assert summary[city_name]["status"] == "success"
+        assert summary[city_name]["error"] is None
+        assert summary[city_name]["rows"] == 10
+        assert summary[city_name]["saved_chunks"] == 2
+    assert summary["Failing"]["status"] == "failed"
+    assert "500" in summary["Failing"]["error"]
+    assert summary["Failing"]["saved_chunks"] == 0
+    assert summary["Malformed"]["status"] == "failed"
+    assert summary["Malformed"]["error"].startswith("Invalid weather data: KeyError")
+    assert summary["Malformed"]["saved_chunks"] == 0
+
+    connection = sqlite3.connect(weather_db_path)
+    stored_rows = dict(connection.execute("""
+    SELECT c.name, COUNT(*) FROM daily_weather_entries AS dw JOIN cities AS c ON c.id = dw.city_id GROUP BY c.name;
+    """).fetchall())
+    connection.close()
+    assert stored_rows == {"Birmingham": 10, "Leeds": 10}
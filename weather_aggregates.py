@@ -0,0 +1,404 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR DERIVED WEATHER TABLES
+##############################################################################
+from datetime import date, timedelta
+
+
+############################################
+# ROLLING WINDOW LENGTHS (IN DAYS)
+############################################
+ROLLING_WINDOW_DAYS = (7, 14, 30)
+
+############################################
+# MEASURES KEPT IN THE ROLLUP TABLES
+############################################
+ROLLUP_MEASURES = ("min_temp", "max_temp", "mean_temp", "precipitation", "sw_radiation")
+
+
+##############################################
+# FUNCTION TO CREATE THE ROLLING WINDOW TABLE
+##############################################
+def create_rolling_window_table(connection):
+    """
+    Creates the rolling_weather_windows table if it does not exist.
+
+    Each row holds the averages of one city over `window_days` days starting from `start_date`,
+    computed from the daily_weather_entries rows found in that period (`day_count` of them).
+
+    Args:
+        connection: SQLite database connection object.
+
+    Returns:
+        bool: True if the table was created, False if it already existed.
+    """
+    cursor = connection.cursor()
+    existing = cursor.execute("""
+    SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'rolling_weather_windows';
+    """).fetchone()
+    if existing:
+        return False
+
+    cursor.execute("""
+    CREATE TABLE rolling_weather_windows (
+        city_id INTEGER NOT NULL,
+        window_days INTEGER NOT NULL,
+        start_date TEXT NOT NULL,
+        day_count INTEGER NOT NULL,
+        average_precipitation REAL,
+        average_mean_temp REAL,
+        average_min_temp REAL,
+        average_max_temp REAL,
+        PRIMARY KEY (city_id, window_days, start_date)
+    ) WITHOUT ROWID;
+    """)
+    return True
+
+
+##########################################################
+# FUNCTION TO REFRESH THE ROLLING WINDOWS OF A DATE RANGE
+##########################################################
+def refresh_rolling_windows(connection, city_id=None, date_from=None, date_to=None, window_lengths=ROLLING_WINDOW_DAYS):
+    """
+    Recomputes the rolling windows affected by a change of the daily entries between date_from and date_to.
+
+    A change on day D affects every window starting from D - (window_days - 1) to D, so only the windows
+    starting in that widened range are deleted and rebuilt, using a SQLite window function over the
+    daily entries of the range and the (window_days - 1) days that follow it.
+    The caller is responsible for the transaction, so that the refresh is committed together with the
+    daily entries it is derived from.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int, optional): ID of the city to refresh. All the cities are refreshed when None.
+        date_from (str, optional): First changed date (YYYY-MM-DD). Defaults to the first date in the database.
+        date_to (str, optional): Last changed date (YYYY-MM-DD). Defaults to the last date in the database.
+        window_lengths (tuple): Window lengths, in days, to refresh.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    cursor = connection.cursor()
+
+    if date_from is None or date_to is None:
+        first_date, last_date = cursor.execute("""
+        SELECT MIN(date), MAX(date) FROM daily_weather_entries;
+        """).fetchone()
+        if first_date is None:
+            return
+        date_from = date_from or first_date[:10]
+        date_to = date_to or last_date[:10]
+
+    if city_id is None:
+        city_filter, city_params = "", ()
+    else:
+        city_filter, city_params = "AND city_id = ?", (city_id,)
+
+    for window_days in window_lengths:
+        window_days = int(window_days)
+        days_before = f"-{window_days - 1} days"
+        days_after = f"+{window_days} days"
+
+        cursor.execute(f"""
+        DELETE FROM rolling_weather_windows
+        WHERE window_days = ?
+        AND start_date >= date(?, ?)
+        AND start_date < date(?, '+1 day')
+        {city_filter};
+        """, (window_days, date_from, days_before, date_to) + city_params)
+
+        # The frame covers the rows whose date is at most (window_days - 1) days after the current row
+        cursor.execute(f"""
+        INSERT INTO rolling_weather_windows (
+            city_id, window_days, start_date, day_count,
+            average_precipitation, average_mean_temp, average_min_temp, average_max_temp
+        )
+        SELECT city_id, ?, start_date, day_count,
+               average_precipitation, average_mean_temp, average_min_temp, average_max_temp
+        FROM (
+            SELECT city_id,
+                   substr(date, 1, 10) AS start_date,
+                   COUNT(*) OVER window_frame AS day_count,
+                   AVG(precipitation) OVER window_frame AS average_precipitation,
+                   AVG(mean_temp) OVER window_frame AS average_mean_temp,
+                   AVG(min_temp) OVER window_frame AS average_min_temp,
+                   AVG(max_temp) OVER window_frame AS average_max_temp
+            FROM daily_weather_entries
+            WHERE date >= date(?, ?)
+            AND date < date(?, ?)
+            {city_filter}
+            WINDOW window_frame AS (
+                PARTITION BY city_id
+                ORDER BY julianday(substr(date, 1, 10))
+                RANGE BETWEEN CURRENT ROW AND {window_days - 1} FOLLOWING
+            )
+        )
+        WHERE start_date >= date(?, ?)
+        AND start_date < date(?, '+1 day');
+        """, (window_days, date_from, days_before, date_to, days_after) + city_params
+             + (date_from, days_before, date_to))
+
+
+def rebuild_rolling_windows(connection, window_lengths=ROLLING_WINDOW_DAYS):
+    """
+    Rebuilds the rolling windows of every city over the whole date range of the database.
+
+    Args:
+        connection: SQLite database connection object.
+        window_lengths (tuple): Window lengths, in days, to rebuild.
+    """
+    with connection:
+        connection.execute("DELETE FROM rolling_weather_windows;")
+        refresh_rolling_windows(connection, window_lengths=window_lengths)
+
+
+##############################################
+# FUNCTION TO CREATE THE ROLLUP TABLES
+##############################################
+def create_rollup_tables(connection):
+    """
+    Creates the monthly_weather_rollups and yearly_weather_rollups tables if they do not exist.
+
+    Each row holds, for one city and one month (YYYY-MM) or year (YYYY), the number of daily entries
+    (day_count) and, for every measure in ROLLUP_MEASURES, the sum, the count of non-null values,
+    the minimum and the maximum (for example mean_temp_sum, mean_temp_count, mean_temp_min, mean_temp_max).
+
+    Args:
+        connection: SQLite database connection object.
+
+    Returns:
+        bool: True if the tables were created, False if they already existed.
+    """
+    cursor = connection.cursor()
+    existing = cursor.execute("""
+    SELECT COUNT(*) FROM sqlite_master
+    WHERE type = 'table' AND name IN ('monthly_weather_rollups', 'yearly_weather_rollups');
+    """).fetchone()
+    if existing[0] == 2:
+        return False
+
+    measure_columns = []
+    for measure in ROLLUP_MEASURES:
+        measure_columns.append(
+            f"{measure}_sum REAL NOT NULL, {measure}_count INTEGER NOT NULL, {measure}_min REAL, {measure}_max REAL"
+        )
+    measure_columns = ",\n        ".join(measure_columns)
+
+    for table_name, period_column in (("monthly_weather_rollups", "month"), ("yearly_weather_rollups", "year")):
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            city_id INTEGER NOT NULL,
+            {period_column} TEXT NOT NULL,
+            day_count INTEGER NOT NULL,
+            {measure_columns},
+            PRIMARY KEY (city_id, {period_column})
+        ) WITHOUT ROWID;
+        """)
+        cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{table_name}_{period_column} ON {table_name} ({period_column});
+        """)
+    return True
+
+
+def weather_rollups_available(connection):
+    """
+    Checks if the rollup tables exist, so that the queries can be answered from them.
+
+    Args:
+        connection: SQLite database connection object.
+
+    Returns:
+        bool: True if both rollup tables exist, False otherwise.
+    """
+    existing = connection.execute("""
+    SELECT COUNT(*) FROM sqlite_master
+    WHERE type = 'table' AND name IN ('monthly_weather_rollups', 'yearly_weather_rollups');
+    """).fetchone()
+    return existing[0] == 2
+
+
+##########################################################
+# FUNCTION TO REFRESH THE ROLLUPS OF A DATE RANGE
+##########################################################
+def refresh_weather_rollups(connection, city_id=None, date_from=None, date_to=None):
+    """
+    Recomputes the monthly and yearly rollups of the months and years touched by date_from to date_to.
+
+    The months are rebuilt from the daily entries and the years are then rebuilt from the months.
+    The caller is responsible for the transaction, so that the refresh is committed together with the
+    daily entries it is derived from.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int, optional): ID of the city to refresh. All the cities are refreshed when None.
+        date_from (str, optional): First changed date (YYYY-MM-DD). Defaults to the first date in the database.
+        date_to (str, optional): Last changed date (YYYY-MM-DD). Defaults to the last date in the database.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    cursor = connection.cursor()
+
+    if date_from is None or date_to is None:
+        first_date, last_date = cursor.execute("""
+        SELECT MIN(date), MAX(date) FROM daily_weather_entries;
+        """).fetchone()
+        if first_date is None:
+            return
+        date_from = date_from or first_date[:10]
+        date_to = date_to or last_date[:10]
+
+    if city_id is None:
+        city_filter, city_params = "", ()
+    else:
+        city_filter, city_params = "AND city_id = ?", (city_id,)
+
+    first_month, last_month = date_from[:7], date_to[:7]
+    first_year, last_year = date_from[:4], date_to[:4]
+
+    measure_names = []
+    daily_aggregates = []
+    monthly_aggregates = []
+    for measure in ROLLUP_MEASURES:
+        measure_names.append(f"{measure}_sum, {measure}_count, {measure}_min, {measure}_max")
+        daily_aggregates.append(f"TOTAL({measure}), COUNT({measure}), MIN({measure}), MAX({measure})")
+        monthly_aggregates.append(
+            f"TOTAL({measure}_sum), SUM({measure}_count), MIN({measure}_min), MAX({measure}_max)"
+        )
+    measure_names = ", ".join(measure_names)
+    daily_aggregates = ", ".join(daily_aggregates)
+    monthly_aggregates = ", ".join(monthly_aggregates)
+
+    # Months, from the daily entries
+    cursor.execute(f"""
+    DELETE FROM monthly_weather_rollups
+    WHERE month >= ? AND month <= ?
+    {city_filter};
+    """, (first_month, last_month) + city_params)
+    cursor.execute(f"""
+    INSERT INTO monthly_weather_rollups (city_id, month, day_count, {measure_names})
+    SELECT city_id, substr(date, 1, 7) AS month, COUNT(*), {daily_aggregates}
+    FROM daily_weather_entries
+    WHERE date >= ? AND date < date(?, 'start of month', '+1 month')
+    {city_filter}
+    GROUP BY city_id, month;
+    """, (f"{first_month}-01", date_to[:10]) + city_params)
+
+    # Years, from the months
+    cursor.execute(f"""
+    DELETE FROM yearly_weather_rollups
+    WHERE year >= ? AND year <= ?
+    {city_filter};
+    """, (first_year, last_year) + city_params)
+    cursor.execute(f"""
+    INSERT INTO yearly_weather_rollups (city_id, year, day_count, {measure_names})
+    SELECT city_id, substr(month, 1, 4) AS year, SUM(day_count), {monthly_aggregates}
+    FROM monthly_weather_rollups
+    WHERE month >= ? AND month < ?
+    {city_filter}
+    GROUP BY city_id, year;
+    """, (f"{first_year}-01", f"{int(last_year) + 1:04d}-01") + city_params)
+
+
+#####################################################################
+# FUNCTIONS TO CREATE AND REFRESH ALL THE DERIVED TABLES TOGETHER
+#####################################################################
+def create_weather_aggregate_tables(connection):
+    """
+    Creates the rolling window and rollup tables, and fills the newly created ones from the daily entries.
+
+    Args:
+        connection: SQLite database connection object.
+    """
+    if create_rolling_window_table(connection):
+        refresh_rolling_windows(connection)
+    if create_rollup_tables(connection):
+        refresh_weather_rollups(connection)
+
+
+def refresh_weather_aggregates(connection, city_id, date_from, date_to):
+    """
+    Refreshes the rolling windows and the rollups affected by a change of the daily entries of a city
+    between date_from and date_to.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int): ID of the city whose daily entries changed.
+        date_from (str): First changed date (YYYY-MM-DD).
+        date_to (str): Last changed date (YYYY-MM-DD).
+    """
+    refresh_rolling_windows(connection, city_id, date_from, date_to)
+    refresh_weather_rollups(connection, city_id, date_from, date_to)
+
+
+#####################################################################
+# FUNCTION TO COMBINE THE MONTHLY ROLLUPS WITH THE RAW-ROW EDGES
+#####################################################################
+def measure_totals_query(measure, date_from, date_to, city_id=None):
+    """
+    Builds a query returning, per city, the sum and the count of non-null values of a measure from
+    date_from to date_to (both included).
+
+    The whole months inside the range are read from monthly_weather_rollups and only the partial
+    months at the edges of the range are read from daily_weather_entries. The average of the measure
+    is TOTAL(measure_total) / SUM(measure_count) over the rows of a city.
+
+    Args:
+        measure (str): One of ROLLUP_MEASURES.
+        date_from (str): Start date (YYYY-MM-DD) of the range.
+        date_to (str): End date (YYYY-MM-DD) of the range.
+        city_id (int, optional): ID of a single city. All the cities are included when None.
+
+    Returns:
+        tuple: (query, params), where the query returns the columns city_id, measure_total and measure_count,
+        possibly with several rows per city.
+
+    Raises:
+        ValueError: If the measure is not one of ROLLUP_MEASURES or a date is invalid.
+    """
+    if measure not in ROLLUP_MEASURES:
+        raise ValueError(f"Unknown measure '{measure}'. Choose from: {ROLLUP_MEASURES}.")
+
+    if city_id is None:
+        city_filter, city_params = "", ()
+    else:
+        city_filter, city_params = "AND city_id = ?", (city_id,)
+
+    range_start = date.fromisoformat(date_from[:10])
+    range_end = date.fromisoformat(date_to[:10]) + timedelta(days=1)
+
+    # First day of the first whole month, and first day of the month following the last whole month
+    first_whole_month = range_start if range_start.day == 1 else (range_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    end_whole_months = range_end.replace(day=1)
+
+    raw_query = f"""
+        SELECT city_id, TOTAL({measure}) AS measure_total, COUNT({measure}) AS measure_count
+        FROM daily_weather_entries
+        WHERE date >= ? AND date < ?
+        {city_filter}
+        GROUP BY city_id
+    """
+    rollup_query = f"""
+        SELECT city_id, TOTAL({measure}_sum) AS measure_total, SUM({measure}_count) AS measure_count
+        FROM monthly_weather_rollups
+        WHERE month >= ? AND month < ?
+        {city_filter}
+        GROUP BY city_id
+    """
+
+    if first_whole_month >= end_whole_months:
+        return raw_query, (range_start.isoformat(), range_end.isoformat()) + city_params
+
+    queries, params = [], ()
+    if range_start < first_whole_month:
+        queries.append(raw_query)
+        params += (range_start.isoformat(), first_whole_month.isoformat()) + city_params
+    queries.append(rollup_query)
+    params += (first_whole_month.isoformat()[:7], end_whole_months.isoformat()[:7]) + city_params
+    if end_whole_months < range_end:
+        queries.append(raw_query)
+        params += (end_whole_months.isoformat(), range_end.isoformat()) + city_params
+
+    return "UNION ALL".join(queries), params
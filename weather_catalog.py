@@ -0,0 +1,174 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE CATALOG OF THE STORED CITIES AND DATES
+##############################################################################
+import threading
+from bisect import bisect_left, bisect_right
+from query_cache import data_generation, database_file
+
+
+##############################################################################
+# CATALOG OF THE STORED CITIES AND DATES
+##############################################################################
+class WeatherCatalog:
+    """
+    Catalog of the cities and dates stored in a database, loaded once and answering the validation
+    questions with binary searches instead of queries.
+
+    The catalog holds:
+        - dates: sorted tuple of the distinct dates (YYYY-MM-DD) stored for any city.
+        - years: sorted list of the distinct years (YYYY) of these dates.
+        - cities: city ID mapped to the city name, ordered by ID.
+        - city_intervals: city ID mapped to the sorted (start_date, end_date) intervals of consecutive
+          stored days of that city.
+
+    It is loaded again by refresh only when the data generation of the database has changed.
+    """
+
+    def __init__(self):
+        self.signature = None
+        self.dates = ()
+        self.years = []
+        self.cities = {}
+        self.city_intervals = {}
+        self.city_interval_starts = {}
+
+    def refresh(self, connection):
+        """
+        Loads the catalog again if data was saved since the last load.
+
+        The data generation (see query_cache) is used when the data_generations table exists, otherwise
+        the data version of the connection and its own changes are used.
+
+        Args:
+            connection: SQLite database connection object.
+        """
+        generation = data_generation(connection)
+        if generation is not None:
+            signature = ("generation", generation)
+        else:
+            data_version = connection.execute("PRAGMA data_version;").fetchone()[0]
+            signature = ("data_version", id(connection), data_version, connection.total_changes)
+
+        if signature != self.signature:
+            self.load(connection)
+            self.signature = signature
+
+    def load(self, connection):
+        """
+        Loads the distinct dates, the cities and the per-city intervals of stored days.
+
+        Args:
+            connection: SQLite database connection object.
+        """
+        dates = []
+        for row in connection.execute("""
+        SELECT DISTINCT substr(date, 1, 10) AS day
+        FROM daily_weather_entries
+        ORDER BY day;
+        """):
+            dates.append(row[0])
+
+        years = []
+        for day in dates:
+            if not years or years[-1] != day[:4]:
+                years.append(day[:4])
+
+        cities = {}
+        for row in connection.execute("SELECT id, name FROM cities ORDER BY id;"):
+            cities[row[0]] = row[1]
+
+        # Consecutive days of a city share the same julianday(day) - ROW_NUMBER() value
+        city_intervals = {}
+        for row in connection.execute("""
+        SELECT city_id, MIN(day) AS start_date, MAX(day) AS end_date
+        FROM (
+            SELECT city_id, day, julianday(day) - ROW_NUMBER() OVER (PARTITION BY city_id ORDER BY day) AS island
+            FROM (SELECT DISTINCT city_id, substr(date, 1, 10) AS day FROM daily_weather_entries)
+        )
+        GROUP BY city_id, island
+        ORDER BY city_id, start_date;
+        """):
+            city_intervals.setdefault(row[0], []).append((row[1], row[2]))
+
+        self.dates = tuple(dates)
+        self.years = years
+        self.cities = cities
+        self.city_intervals = city_intervals
+        self.city_interval_starts = {city_id: [start for start, _ in intervals]
+                                     for city_id, intervals in city_intervals.items()}
+
+    def has_date(self, day):
+        """
+        Returns True if data is stored for the date (YYYY-MM-DD) in any city.
+        """
+        position = bisect_left(self.dates, day)
+        return position < len(self.dates) and self.dates[position] == day
+
+    def date_bounds(self):
+        """
+        Returns the (first_date, last_date) stored for any city, or (None, None) if the database is empty.
+        """
+        if not self.dates:
+            return None, None
+        return self.dates[0], self.dates[-1]
+
+    def dates_between(self, date_from, date_to):
+        """
+        Returns the number of distinct stored dates between date_from and date_to, both included.
+        """
+        return bisect_right(self.dates, date_to) - bisect_left(self.dates, date_from)
+
+    def has_city(self, city_id):
+        """
+        Returns True if the city ID exists.
+        """
+        return city_id in self.cities
+
+    def city_date_bounds(self, city_id):
+        """
+        Returns the (first_date, last_date) stored for a city, or (None, None) if the city has no data.
+        """
+        intervals = self.city_intervals.get(city_id)
+        if not intervals:
+            return None, None
+        return intervals[0][0], intervals[-1][1]
+
+    def city_covers(self, city_id, date_from, date_to):
+        """
+        Returns True if every day between date_from and date_to, both included, is stored for the city.
+        """
+        interval_starts = self.city_interval_starts.get(city_id)
+        if not interval_starts:
+            return False
+        position = bisect_right(interval_starts, date_from) - 1
+        if position < 0:
+            return False
+        interval_start, interval_end = self.city_intervals[city_id][position]
+        return interval_start <= date_from and date_to <= interval_end
+
+
+# One catalog per database file
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(connection):
+    """
+    Returns the catalog of the database of a connection, loaded again if data was saved since the last call.
+
+    Args:
+        connection: SQLite database connection object.
+
+    Returns:
+        WeatherCatalog: The up-to-date catalog.
+    """
+    catalog_key = database_file(connection)
+    with _catalogs_lock:
+        catalog = _catalogs.get(catalog_key)
+        if catalog is None:
+            catalog = _catalogs[catalog_key] = WeatherCatalog()
+        catalog.refresh(connection)
+    return catalog
@@ -0,0 +1,291 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE BULK EXPORT OF THE DAILY WEATHER
+##############################################################################
+import os
+import re
+import sys
+import gzip
+import time
+import argparse
+import sqlite3
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from db_connections import get_connection
+from query_cli import RowWriter, column_names, fetch_batches
+from weather_catalog import get_catalog
+
+
+############################################
+# DEFAULT EXPORT SETTINGS
+############################################
+DEFAULT_DB_PATH = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
+DEFAULT_OUTPUT_DIR = "exports"
+DEFAULT_MAX_WORKERS = 4
+
+# Rows fetched from the database and written at a time
+DEFAULT_EXPORT_BATCH_SIZE = 5000
+
+# The fastest gzip level, so the compression keeps up with the disk
+DEFAULT_COMPRESS_LEVEL = 1
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Measures exported when the column exists; sw_radiation is only added by phase 3
+EXPORT_MEASURES = ("min_temp", "max_temp", "mean_temp", "precipitation", "sw_radiation")
+
+
+##############################################################################
+# GENERATOR PIPELINE - DATABASE BATCHES TO AN (OPTIONALLY GZIPPED) FILE
+##############################################################################
+def export_measures(connection):
+    """
+    Returns the measures of EXPORT_MEASURES stored in the daily_weather_entries table.
+    """
+    stored_columns = {row[1] for row in connection.execute("PRAGMA table_info(daily_weather_entries);")}
+    return [measure for measure in EXPORT_MEASURES if measure in stored_columns]
+
+
+def query_city_weather(connection, city_id, date_from=None, date_to=None):
+    """
+    Runs the query of the daily weather of a city joined with its city and country, in date order.
+
+    The rows are read along the (city_id, date) index, so no sort is needed and the cursor can be read
+    a batch at a time.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int): ID of the city.
+        date_from (str, optional): First date (YYYY-MM-DD) exported, or None for no lower bound.
+        date_to (str, optional): Last date (YYYY-MM-DD) exported, or None for no upper bound.
+
+    Returns:
+        sqlite3.Cursor: The unread query results.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    measure_columns = "".join(f", dw.{measure} AS {measure}" for measure in export_measures(connection))
+    query = f"""
+        SELECT substr(dw.date, 1, 10) AS date, dw.city_id AS city_id, c.name AS city_name,
+               c.latitude AS latitude, c.longitude AS longitude, co.id AS country_id, co.name AS country_name
+               {measure_columns}
+        FROM daily_weather_entries AS dw
+        JOIN cities AS c
+        ON c.id = dw.city_id
+        JOIN countries AS co
+        ON co.id = c.country_id
+        WHERE dw.city_id = ?
+    """
+    params = [city_id]
+    if date_from is not None:
+        query += " AND dw.date >= ?"
+        params.append(date_from)
+    if date_to is not None:
+        # Half-open range, so dates stored with a time part on the last day are kept
+        query += " AND dw.date < date(?, '+1 day')"
+        params.append(date_to)
+    query += " ORDER BY dw.date"
+    return connection.execute(query, params)
+
+
+def open_export_file(file_path, compress=False, compress_level=DEFAULT_COMPRESS_LEVEL):
+    """
+    Opens a text file for the export, gzip-compressed when compress is True.
+    """
+    if compress:
+        return gzip.open(file_path, "wt", compresslevel=compress_level, encoding="utf-8", newline="")
+    return open(file_path, "w", encoding="utf-8", newline="")
+
+
+def write_export(cursor, file_path, output_format="csv", compress=False, compress_level=DEFAULT_COMPRESS_LEVEL,
+                 batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """
+    Streams a cursor to a file in fetchmany batches, so memory use does not grow with the number of rows.
+
+    The rows are written to a ".part" file renamed to file_path once complete, so an interrupted export
+    never leaves a truncated file behind under the final name.
+
+    Args:
+        cursor: The unread query results.
+        file_path (str): Path of the exported file.
+        output_format (str): "csv" or "jsonl".
+        compress (bool): Compresses the file with gzip.
+        compress_level (int): gzip level, from 1 (fastest) to 9 (smallest).
+        batch_size (int): Number of rows fetched at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    partial_path = f"{file_path}.part"
+    try:
+        with open_export_file(partial_path, compress, compress_level) as export_file:
+            writer = RowWriter(export_file, output_format)
+            writer.write_header(column_names(cursor))
+            for rows in fetch_batches(cursor, batch_size):
+                writer.write_rows(rows)
+        os.replace(partial_path, file_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return writer.rows_written
+
+
+def export_file_name(city_id, city_name, output_format="csv", compress=False):
+    """
+    Returns the file name of the export of a city, for example city_1_London.csv.gz.
+    """
+    safe_name = re.sub(r"[^A-Za-z0-9]+", "_", city_name).strip("_")
+    return f"city_{city_id}_{safe_name}.{output_format}{'.gz' if compress else ''}"
+
+
+##############################################################################
+# FUNCTIONS TO EXPORT MANY CITIES IN PARALLEL
+##############################################################################
+def export_cities(db_path, output_dir, city_ids=None, date_from=None, date_to=None, output_format="csv",
+                  compress=False, compress_level=DEFAULT_COMPRESS_LEVEL, max_workers=DEFAULT_MAX_WORKERS,
+                  batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """
+    Exports the daily weather of every city to its own file, with several cities exported at the same time.
+
+    Every worker thread reads through its own read-only connection, so the exports do not block, and are
+    not blocked by, phase 3 or 4 saving data.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        output_dir (str): Directory the files are written to.
+        city_ids (list, optional): IDs of the exported cities. Defaults to every city.
+        date_from (str, optional): First date (YYYY-MM-DD) exported. Defaults to the first stored date.
+        date_to (str, optional): Last date (YYYY-MM-DD) exported. Defaults to the last stored date.
+        output_format (str): "csv" or "jsonl".
+        compress (bool): Compresses the files with gzip.
+        compress_level (int): gzip level, from 1 (fastest) to 9 (smallest).
+        max_workers (int): Number of cities exported at the same time.
+        batch_size (int): Number of rows fetched at a time.
+
+    Returns:
+        dict: Per-city summary, in the order of city_ids. Each value is a dictionary with the keys "file",
+        "rows", "bytes", "seconds" and "error" (None on success).
+
+    Raises:
+        ValueError: If a city ID, a date or the output format is not valid.
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {output_format}. Choose from {', '.join(EXPORT_FORMATS)}.")
+    export_dates = []
+    for export_date in (date_from, date_to):
+        if export_date is not None:
+            try:
+                # Written back as YYYY-MM-DD, so "2020-1-5" compares correctly with the stored text dates
+                export_date = datetime.strptime(export_date, "%Y-%m-%d").date().isoformat()
+            except ValueError:
+                raise ValueError(f"Invalid date {export_date}. Please use the YYYY-MM-DD format.") from None
+        export_dates.append(export_date)
+    date_from, date_to = export_dates
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise ValueError("Start date cannot be after the end date.")
+
+    catalog = get_catalog(get_connection(db_path, read_only=True))
+    if city_ids is None:
+        city_ids = list(catalog.cities)
+    for city_id in city_ids:
+        if not catalog.has_city(city_id):
+            raise ValueError(f"Invalid City ID {city_id}. Please choose from the following IDs: {list(catalog.cities)}.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {}
+    for city_id in city_ids:
+        file_name = export_file_name(city_id, catalog.cities[city_id], output_format, compress)
+        summary[city_id] = {"file": os.path.join(output_dir, file_name), "rows": 0, "bytes": 0,
+                            "seconds": 0.0, "error": None}
+
+    def export_task(city_id):
+        city_summary = summary[city_id]
+        export_start = time.perf_counter()
+        try:
+            connection = get_connection(db_path, read_only=True)
+            cursor = query_city_weather(connection, city_id, date_from, date_to)
+            city_summary["rows"] = write_export(cursor, city_summary["file"], output_format, compress,
+                                                compress_level, batch_size)
+            city_summary["bytes"] = os.path.getsize(city_summary["file"])
+        except (sqlite3.Error, OSError) as ex:
+            city_summary["error"] = str(ex)
+        city_summary["seconds"] = time.perf_counter() - export_start
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        list(pool.map(export_task, city_ids))
+
+    return summary
+
+
+def print_export_summary(summary):
+    """
+    Prints the per-city export summary returned by export_cities.
+    """
+    exported = 0
+    for city_id, city_summary in summary.items():
+        if city_summary["error"] is None:
+            exported += 1
+            rows_per_second = city_summary["rows"] / city_summary["seconds"] if city_summary["seconds"] else 0.0
+            print(f"City {city_id}: {city_summary['rows']} rows written to {city_summary['file']} "
+                  f"({city_summary['bytes'] / 1048576:.2f} MB in {city_summary['seconds']:.2f}s, "
+                  f"{rows_per_second:.0f} rows/s)")
+        else:
+            print(f"City {city_id}: export failed: {city_summary['error']}")
+    print(f"{exported} of {len(summary)} cities exported.")
+
+
+#################################################################
+# EXPORT COMMAND - REFERENCED AS MAIN
+#################################################################
+def main(argv=None):
+    """
+    Exports the daily weather of the cities, for example:
+
+        python weather_export.py --cities 1 2 --date-from 2020-01-01 --date-to 2023-12-31 --gzip
+
+    Returns:
+        int: The exit status, 0 when every city was exported and 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Export the daily weather of the cities, joined with their city "
+                                                 "and country, to one CSV or JSON Lines file per city.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="path to the SQLite database")
+    parser.add_argument("--cities", type=int, nargs="+", help="city IDs (default: all cities)")
+    parser.add_argument("--date-from", help="first date (YYYY-MM-DD) exported (default: first stored date)")
+    parser.add_argument("--date-to", help="last date (YYYY-MM-DD) exported (default: last stored date)")
+    parser.add_argument("--format", dest="output_format", choices=EXPORT_FORMATS, default="csv",
+                        help="file format (default: csv)")
+    parser.add_argument("--gzip", action="store_true", help="compress the files with gzip")
+    parser.add_argument("--compress-level", type=int, choices=range(1, 10), default=DEFAULT_COMPRESS_LEVEL,
+                        metavar="1-9", help=f"gzip level (default: {DEFAULT_COMPRESS_LEVEL}, the fastest)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help=f"directory the files are written to (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"number of cities exported at the same time (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_EXPORT_BATCH_SIZE,
+                        help=f"rows fetched at a time (default: {DEFAULT_EXPORT_BATCH_SIZE})")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}", file=sys.stderr)
+        return 1
+    if args.batch_size < 1:
+        print("The batch size must be at least 1.", file=sys.stderr)
+        return 1
+
+    try:
+        summary = export_cities(args.db, args.output_dir, args.cities, args.date_from, args.date_to,
+                                args.output_format, args.gzip, args.compress_level, args.workers, args.batch_size)
+    except (ValueError, sqlite3.Error) as ex:
+        print(ex, file=sys.stderr)
+        return 1
+
+    print_export_summary(summary)
+    return 0 if all(city_summary["error"] is None for city_summary in summary.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
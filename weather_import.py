@@ -0,0 +1,322 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE OFFLINE IMPORT OF OPEN-METEO ARCHIVE FILES
+##############################################################################
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+import sqlite3
+from datetime import datetime
+from db_connections import get_connection
+from phase_3 import (
+    DAILY_WEATHER_COLUMNS,
+    get_cached_city_details,
+    initialize_db,
+    save_weather_data,
+    stored_city_details,
+)
+
+
+############################################
+# DEFAULT IMPORT SETTINGS
+############################################
+DEFAULT_DB_PATH = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
+IMPORT_EXTENSIONS = (".json", ".csv")
+
+# The Open-Meteo archive answers for the centre of its grid cell, a few kilometres from the requested
+# coordinates, so a file belongs to the stored city within this distance in degrees
+DEFAULT_MATCH_DEGREES = 0.25
+
+
+##############################################################################
+# FUNCTIONS TO READ THE OPEN-METEO FILES
+##############################################################################
+def empty_daily_data(dates):
+    """
+    Returns the "daily" section of a response with every variable of DAILY_WEATHER_COLUMNS set to None.
+    """
+    daily_data = {"time": list(dates)}
+    for _, open_meteo_variable in DAILY_WEATHER_COLUMNS:
+        daily_data[open_meteo_variable] = [None] * len(daily_data["time"])
+    return daily_data
+
+
+def read_json_file(file_path):
+    """
+    Reads an archive response saved as JSON: either the body returned by the API, or a response recorded
+    by phase 3 with --record-dir (see open_meteo_client).
+
+    Returns:
+        tuple: (location, daily) where location holds the "latitude", "longitude" and "timezone" of the
+        response, and daily its "daily" section.
+
+    Raises:
+        ValueError: If the file is not an Open-Meteo daily response.
+    """
+    with open(file_path, encoding="utf-8") as json_file:
+        response = json.load(json_file)
+
+    location = {}
+    if isinstance(response, dict) and "body" in response and "params" in response:
+        location = response["params"]
+        response = json.loads(response["body"])
+    if not isinstance(response, dict) or not isinstance(response.get("daily"), dict):
+        raise ValueError(f"{file_path} is not an Open-Meteo daily response.")
+
+    for key in ("latitude", "longitude", "timezone"):
+        if key in location:
+            continue
+        location[key] = response.get(key)
+    return location, response["daily"]
+
+
+def read_csv_file(file_path):
+    """
+    Reads an archive response downloaded as CSV. The location block written by Open-Meteo before the daily
+    rows (latitude, longitude, ..., timezone) is optional, and the units after the variable names, for example
+    "temperature_2m_min (°C)", are ignored.
+
+    Returns:
+        tuple: (location, daily) as returned by read_json_file.
+
+    Raises:
+        ValueError: If the file has no "time" column.
+    """
+    with open(file_path, encoding="utf-8-sig", newline="") as csv_file:
+        rows = [row for row in csv.reader(csv_file)]
+
+    location = {"latitude": None, "longitude": None, "timezone": None}
+    position = 0
+    while position < len(rows) and (not rows[position] or rows[position][0] != "time"):
+        header = rows[position]
+        if header and header[0] == "latitude" and position + 1 < len(rows):
+            values = dict(zip(header, rows[position + 1]))
+            location = {"latitude": float(values["latitude"]), "longitude": float(values["longitude"]),
+                        "timezone": values.get("timezone")}
+            position += 1
+        position += 1
+    if position == len(rows):
+        raise ValueError(f"{file_path} has no 'time' column.")
+
+    variables = [re.sub(r"\s*\(.*\)$", "", name.strip()) for name in rows[position]]
+    daily = {variable: [] for variable in variables}
+    for row in rows[position + 1:]:
+        if not row:
+            break
+        for variable, value in zip(variables, row):
+            daily[variable].append(value if variable == "time" else (float(value) if value.strip() else None))
+    return location, daily
+
+
+def read_archive_file(file_path):
+    """
+    Reads an Open-Meteo archive file, JSON or CSV, into the "daily" section saved by phase 3.
+
+    Returns:
+        tuple: (location, daily_data) where daily_data holds the "time" list and one list per variable of
+        DAILY_WEATHER_COLUMNS, None where the file has no value.
+
+    Raises:
+        ValueError: If the file is not an Open-Meteo daily response or its dates are not valid.
+    """
+    if file_path.lower().endswith(".csv"):
+        location, daily = read_csv_file(file_path)
+    else:
+        location, daily = read_json_file(file_path)
+
+    dates = []
+    for day in daily.get("time") or []:
+        try:
+            # Saved as YYYY-MM-DD text; a compact 20200101 would be stored as a number by the NUMERIC column
+            dates.append(datetime.strptime(str(day)[:10], "%Y-%m-%d").date().isoformat())
+        except ValueError:
+            raise ValueError(f"Invalid date {day} in {file_path}. Dates must use the YYYY-MM-DD format.") from None
+
+    daily_data = empty_daily_data(dates)
+    for _, open_meteo_variable in DAILY_WEATHER_COLUMNS:
+        values = daily.get(open_meteo_variable)
+        if values is not None:
+            if len(values) != len(dates):
+                raise ValueError(f"{open_meteo_variable} has {len(values)} values for {len(dates)} dates.")
+            daily_data[open_meteo_variable] = list(values)
+    return location, daily_data
+
+
+def find_archive_files(paths):
+    """
+    Lists the JSON and CSV files of the given files and directories, directories being searched recursively.
+
+    Returns:
+        list: The file paths, in name order within every directory.
+    """
+    archive_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, file_names in os.walk(path):
+                subdirectories.sort()
+                for file_name in sorted(file_names):
+                    if file_name.lower().endswith(IMPORT_EXTENSIONS):
+                        archive_files.append(os.path.join(directory, file_name))
+        else:
+            archive_files.append(path)
+    return archive_files
+
+
+##############################################################################
+# FUNCTIONS TO FIND THE CITY OF A FILE WITHOUT NETWORK ACCESS
+##############################################################################
+def match_city(connection, location, city_name=None, country=None, max_degrees=DEFAULT_MATCH_DEGREES):
+    """
+    Finds the city of an archive file without geocoding.
+
+    A named city is looked up in the cities table and then in the geocoding cache, and a new city is created
+    at the coordinates of the file when its country is given. Without a name, the stored city nearest to the
+    coordinates of the file, within max_degrees, is used.
+
+    Args:
+        connection: SQLite database connection object.
+        location (dict): "latitude", "longitude" and "timezone" of the file.
+        city_name (str, optional): Name of the city of the file.
+        country (str, optional): Country of a city not stored yet.
+        max_degrees (float): Largest latitude and longitude difference to a stored city.
+
+    Returns:
+        tuple: (city_name, city_details) as used by save_weather_data.
+
+    Raises:
+        ValueError: If no city can be found.
+    """
+    if city_name:
+        city_details = stored_city_details(connection, city_name).get(city_name)
+        if city_details is None:
+            # Any age is accepted, the coordinates of a city do not go out of date offline
+            city_details = get_cached_city_details(connection, city_name, ttl_days=36500)
+        if city_details is None and country and location.get("latitude") is not None and location.get("timezone"):
+            city_details = {"latitude": location["latitude"], "longitude": location["longitude"],
+                            "country": country, "timezone": location["timezone"]}
+        if city_details is None:
+            raise ValueError(f"{city_name} is not stored yet. Give its country with --country to create it.")
+        return city_name, city_details
+
+    if location.get("latitude") is None or location.get("longitude") is None:
+        raise ValueError("The file has no coordinates. Give its city with --city.")
+
+    nearest_city, nearest_distance = None, None
+    for stored_name, city_details in stored_city_details(connection).items():
+        distance = max(abs(float(city_details["latitude"]) - float(location["latitude"])),
+                       abs(float(city_details["longitude"]) - float(location["longitude"])))
+        if distance <= max_degrees and (nearest_distance is None or distance < nearest_distance):
+            nearest_city, nearest_distance = (stored_name, city_details), distance
+    if nearest_city is None:
+        raise ValueError(f"No stored city near ({location['latitude']}, {location['longitude']}). "
+                         f"Give its city with --city and --country.")
+    return nearest_city
+
+
+##############################################################################
+# FUNCTION TO IMPORT THE FILES - ONE TRANSACTION PER FILE
+##############################################################################
+def import_archive_files(db_path, paths, city_name=None, country=None, max_degrees=DEFAULT_MATCH_DEGREES):
+    """
+    Imports Open-Meteo archive files into the database, without network access.
+
+    Every file is saved in its own transaction through save_weather_data: one executemany upsert of the daily
+    rows, the refresh of the rolling windows and rollups of its dates, and the bump of its data generations.
+    A file that cannot be read or saved is rolled back and reported, and the next files are still imported.
+
+    Args:
+        db_path (str): Path to the SQLite database file. initialize_db must have been run on it.
+        paths (list): Files and directories to import.
+        city_name (str, optional): City of every file. By default the city is matched on the coordinates.
+        country (str, optional): Country of city_name when it is not stored yet.
+        max_degrees (float): Largest latitude and longitude difference to a stored city.
+
+    Returns:
+        dict: Per-file summary, in import order. Each value is a dictionary with the keys "city", "rows",
+        "date_from", "date_to", "seconds" and "error" (None on success).
+    """
+    connection = get_connection(db_path)
+    summary = {}
+    for file_path in find_archive_files(paths):
+        file_summary = summary[file_path] = {"city": None, "rows": 0, "date_from": None, "date_to": None,
+                                             "seconds": 0.0, "error": None}
+        import_start = time.perf_counter()
+        try:
+            location, daily_data = read_archive_file(file_path)
+            if daily_data["time"]:
+                file_city, city_details = match_city(connection, location, city_name, country, max_degrees)
+                date_from, date_to = min(daily_data["time"]), max(daily_data["time"])
+                with connection:
+                    file_summary["rows"] = save_weather_data(connection, file_city, city_details, daily_data,
+                                                             date_from, date_to)
+                file_summary.update({"city": file_city, "date_from": date_from, "date_to": date_to})
+        except (OSError, ValueError, KeyError, sqlite3.Error) as ex:
+            file_summary["error"] = str(ex)
+        file_summary["seconds"] = time.perf_counter() - import_start
+    return summary
+
+
+def print_import_summary(summary):
+    """
+    Prints the per-file import summary returned by import_archive_files.
+    """
+    imported = 0
+    for file_path, file_summary in summary.items():
+        if file_summary["error"] is not None:
+            print(f"{file_path}: import failed: {file_summary['error']}")
+            continue
+        imported += 1
+        if file_summary["rows"]:
+            print(f"{file_path}: {file_summary['rows']} rows of {file_summary['city']} saved from "
+                  f"{file_summary['date_from']} to {file_summary['date_to']} in {file_summary['seconds']:.2f}s")
+        else:
+            print(f"{file_path}: no daily rows.")
+    print(f"{imported} of {len(summary)} files imported.")
+
+
+#################################################################
+# IMPORT COMMAND - REFERENCED AS MAIN
+#################################################################
+def main(argv=None):
+    """
+    Imports Open-Meteo archive files, for example:
+
+        python weather_import.py downloads/ recordings/
+        python weather_import.py york_2020.csv --city York --country "Great Britain"
+
+    Returns:
+        int: The exit status, 0 when every file was imported and 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Import Open-Meteo archive files (JSON or CSV) into the database "
+                                                 "without network access.")
+    parser.add_argument("paths", nargs="+", help="files, or directories searched for .json and .csv files")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="path to the SQLite database")
+    parser.add_argument("--city", help="city of every file (default: the stored city nearest to the coordinates of each file)")
+    parser.add_argument("--country", help="country of --city when it is not stored yet")
+    parser.add_argument("--max-degrees", type=float, default=DEFAULT_MATCH_DEGREES,
+                        help=f"largest coordinate difference to a stored city (default: {DEFAULT_MATCH_DEGREES})")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}", file=sys.stderr)
+        return 1
+
+    try:
+        initialize_db(get_connection(args.db))
+    except sqlite3.Error as ex:
+        print(f"Database error: {ex}", file=sys.stderr)
+        return 1
+
+    summary = import_archive_files(args.db, args.paths, args.city, args.country, args.max_degrees)
+    print_import_summary(summary)
+    return 0 if all(file_summary["error"] is None for file_summary in summary.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR CONCURRENT WEATHER DATA INGESTION
+##############################################################################
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db_connections import connect, get_connection
+from phase_3 import (
+    DEFAULT_CHUNK_DAYS,
+    cache_city_details,
+    geocode_city,
+    fetch_weather_data,
+    lookup_city_details,
+    save_weather_data,
+    split_date_range,
+)
+
+
+############################################
+# DEFAULT INGESTION SETTINGS
+############################################
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_WRITE_BATCH_SIZE = 8
+
+# Nominatim allows a single request at a time per client, so the geocoding is serialized
+_geocoding_lock = threading.Lock()
+
+# Put on the results queue once all the cities have been fetched
+_END_OF_RESULTS = object()
+
+
+##############################################################
+# FUNCTION TO GET THE DETAILS OF A CITY - RUN BY THE THREAD POOL
+##############################################################
+def resolve_city(db_path, city_name):
+    """
+    Gets the details of a city, from the geocoding cache or the stored cities when possible.
+
+    Details that do not come from the cache are not cached here but by the writer thread, so that this
+    function never writes to the database.
+
+    Args:
+        db_path (str): Path to the SQLite database file holding the geocoding cache.
+        city_name (str): Name of the city.
+
+    Returns:
+        tuple: (city_details, needs_caching)
+
+    Raises:
+        ValueError: If the city is not found.
+    """
+    city_details, needs_caching = lookup_city_details(get_connection(db_path, read_only=True), city_name)
+    if city_details is None:
+        with _geocoding_lock:
+            city_details = geocode_city(city_name)
+    return city_details, needs_caching
+
+
+##############################################################
+# FUNCTION TO WRITE THE FETCHED DATA - RUN BY THE WRITER THREAD
+##############################################################
+def write_results(db_path, results_queue, summary, batch_size=DEFAULT_WRITE_BATCH_SIZE, progress_callback=None,
+                  metrics=None):
+    """
+    Saves the fetched chunks taken from the results queue, committing up to batch_size chunks per transaction.
+
+    This is the only thread writing to the database. Each chunk is saved inside its own savepoint, so a
+    database error or a malformed response only discards that chunk and not the rest of the batch.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        results_queue (queue.Queue): Queue of (city_name, city_details, daily_data, needs_caching, start_date,
+                                     end_date) tuples, ended by _END_OF_RESULTS.
+        summary (dict): Per-city summary, updated with the saved rows and chunks, the errors and the write time.
+        batch_size (int): Maximum number of chunks committed in one transaction.
+        progress_callback (callable, optional): Called from this thread after every committed chunk with
+            (city_name, chunk_start_date, chunk_end_date, rows).
+        metrics (IngestionMetrics, optional): Metrics of the run, given the write and commit times and the
+            inserted, updated and skipped rows of every committed chunk.
+    """
+    connection = connect(db_path, isolation_level=None)
+    try:
+        finished = False
+        while not finished:
+            # Wait for one result, then take whatever else is already waiting, up to batch_size
+            batch = [results_queue.get()]
+            while len(batch) < batch_size and batch[-1] is not _END_OF_RESULTS:
+                try:
+                    batch.append(results_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            saved_chunks = []
+            connection.execute("BEGIN")
+            for item in batch:
+                if item is _END_OF_RESULTS:
+                    finished = True
+                    continue
+
+                city_name, city_details, daily_data, needs_caching, start_date, end_date = item
+                write_start = time.perf_counter()
+                row_counts = {} if metrics is not None else None
+                connection.execute("SAVEPOINT city")
+                try:
+                    if needs_caching:
+                        cache_city_details(connection, city_name, city_details)
+                    rows = save_weather_data(connection, city_name, city_details, daily_data, start_date, end_date,
+                                             row_counts)
+                    connection.execute("RELEASE city")
+                    saved_chunks.append((city_name, start_date, end_date, rows, row_counts,
+                                         time.perf_counter() - write_start))
+                except Exception as ex:
+                    # A database error or a malformed response only discards this chunk, the writer carries on
+                    connection.execute("ROLLBACK TO city")
+                    connection.execute("RELEASE city")
+                    if isinstance(ex, sqlite3.Error):
+                        summary[city_name]["error"] = f"Database error: {ex}"
+                    else:
+                        summary[city_name]["error"] = f"Invalid weather data: {ex!r}"
+                    if metrics is not None:
+                        metrics.city(city_name).record_chunk(time.perf_counter() - write_start, failed=True)
+                summary[city_name]["write_seconds"] += time.perf_counter() - write_start
+
+            commit_start = time.perf_counter()
+            try:
+                connection.execute("COMMIT")
+            except sqlite3.Error as ex:
+                connection.execute("ROLLBACK")
+                for city_name, _, _, _, _, write_seconds in saved_chunks:
+                    summary[city_name]["error"] = f"Database error: {ex}"
+                    if metrics is not None:
+                        metrics.city(city_name).record_chunk(write_seconds, failed=True)
+                continue
+            finally:
+                if metrics is not None:
+                    metrics.add_commit_seconds(time.perf_counter() - commit_start)
+
+            for city_name, start_date, end_date, rows, row_counts, write_seconds in saved_chunks:
+                summary[city_name]["rows"] += rows
+                summary[city_name]["saved_chunks"] += 1
+                if metrics is not None:
+                    metrics.city(city_name).record_chunk(write_seconds, row_counts)
+                if progress_callback:
+                    progress_callback(city_name, start_date, end_date, rows)
+    finally:
+        connection.close()
+
+
+#####################################################################
+# FUNCTION TO INGEST MANY CITIES CONCURRENTLY
+#####################################################################
+def ingest_cities(db_path, city_names, start_date=None, end_date=None, max_workers=DEFAULT_MAX_WORKERS,
+                  batch_size=DEFAULT_WRITE_BATCH_SIZE, sync_plan=None, chunk_days=DEFAULT_CHUNK_DAYS,
+                  progress_callback=None, metrics=None):
+    """
+    Retrieves and stores the weather data of many cities, fetching them in parallel with a bounded
+    thread pool while a single writer thread saves them into the database.
+
+    Every date interval is requested in chunks of chunk_days days. The chunks go through a bounded queue,
+    so only a few of them are held in memory, and a failed chunk does not discard the other chunks.
+
+    Args:
+        db_path (str): Path to the SQLite database file. initialize_db must have been run on it.
+        city_names (list): Names of the cities.
+        start_date (str): Start date for the weather data to be retrieved (YYYY-MM-DD format).
+        end_date (str): End date for the weather data to be retrieved (YYYY-MM-DD format).
+        max_workers (int): Number of cities fetched at the same time.
+        batch_size (int): Maximum number of chunks committed in one transaction.
+        sync_plan (dict, optional): City name mapped to the list of (start_date, end_date) intervals to
+                                    retrieve, as returned by sync_planner. Replaces start_date and end_date.
+        chunk_days (int): Number of days requested at a time.
+        progress_callback (callable, optional): Called from the writer thread after every committed chunk
+            with (city_name, chunk_start_date, chunk_end_date, rows).
+        metrics (IngestionMetrics, optional): Metrics of the run (see ingestion_metrics), filled with the
+            geocoding, HTTP, decoding and write times, the bytes and the rows of every city, and finished
+            with the status of every city.
+
+    Returns:
+        dict: Per-city summary, in the order of city_names. Each value is a dictionary with the keys
+        "status" ("success", "up to date" or "failed"), "rows", "intervals", "chunks", "saved_chunks",
+        "error", "fetch_seconds" and "write_seconds".
+    """
+    summary = {}
+    for city_name in city_names:
+        intervals = sync_plan.get(city_name, []) if sync_plan is not None else [(start_date, end_date)]
+        chunks = []
+        for interval_start, interval_end in intervals:
+            chunks.extend(split_date_range(interval_start, interval_end, chunk_days))
+        summary[city_name] = {"status": "pending", "rows": 0, "intervals": list(intervals), "chunks": chunks,
+                              "saved_chunks": 0, "error": None, "fetch_seconds": 0.0, "write_seconds": 0.0}
+
+    # Bounded, so that the fetchers wait for the writer instead of holding every response in memory
+    results_queue = queue.Queue(maxsize=max(1, max_workers) * 2)
+    writer = threading.Thread(target=write_results,
+                              args=(db_path, results_queue, summary, batch_size, progress_callback, metrics),
+                              daemon=True)
+    writer.start()
+
+    def fetch_task(city_name):
+        chunks = summary[city_name]["chunks"]
+        if not chunks:
+            return
+        fetch_start = time.perf_counter()
+        city_metrics = metrics.city(city_name) if metrics is not None else None
+        if city_metrics is not None:
+            city_metrics.start()
+        try:
+            city_details, needs_caching = resolve_city(db_path, city_name)
+            if city_metrics is not None:
+                city_metrics.add_seconds("geocode", time.perf_counter() - fetch_start)
+            for chunk_start, chunk_end in chunks:
+                try:
+                    daily_data = fetch_weather_data(city_name, city_details, chunk_start, chunk_end, city_metrics)
+                except ValueError as ex:
+                    # Only this chunk is lost, the next ones are still requested
+                    summary[city_name]["error"] = str(ex)
+                    if city_metrics is not None:
+                        city_metrics.record_chunk(0.0, failed=True)
+                    continue
+
+                result = (city_name, city_details, daily_data, needs_caching, chunk_start, chunk_end)
+                while True:
+                    try:
+                        results_queue.put(result, timeout=1)
+                        break
+                    except queue.Full:
+                        if not writer.is_alive():
+                            raise RuntimeError("The database writer stopped before the data could be saved.")
+                # The city details are cached along with the first chunk
+                needs_caching = False
+        except Exception as ex:
+            summary[city_name]["error"] = str(ex)
+        summary[city_name]["fetch_seconds"] = time.perf_counter() - fetch_start
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            list(pool.map(fetch_task, city_names))
+    finally:
+        if writer.is_alive():
+            results_queue.put(_END_OF_RESULTS)
+            writer.join()
+
+    for city_summary in summary.values():
+        if not city_summary["chunks"]:
+            city_summary["status"] = "up to date"
+        elif city_summary["error"] is None and city_summary["saved_chunks"] == len(city_summary["chunks"]):
+            city_summary["status"] = "success"
+        else:
+            city_summary["status"] = "failed"
+            if city_summary["error"] is None:
+                city_summary["error"] = "The database writer stopped before the data could be saved."
+
+    if metrics is not None:
+        metrics.finish(summary)
+    return summary
+
+
+def print_ingestion_summary(summary):
+    """
+    Prints the per-city ingestion summary returned by ingest_cities.
+
+    Args:
+        summary (dict): Per-city summary returned by ingest_cities.
+    """
+    succeeded = 0
+    for city_name, city_summary in summary.items():
+        if city_summary["status"] == "up to date":
+            succeeded += 1
+            print(f"Weather data for {city_name} is already up to date.")
+        elif city_summary["status"] == "success":
+            succeeded += 1
+            print(f"Weather data for {city_name} saved successfully! ({city_summary['rows']} rows in "
+                  f"{len(city_summary['chunks'])} chunk(s), fetch {city_summary['fetch_seconds']:.2f}s, "
+                  f"write {city_summary['write_seconds']:.2f}s)")
+        else:
+            print(f"Failed to save weather data for {city_name}: {city_summary['error']} "
+                  f"({city_summary['saved_chunks']} of {len(city_summary['chunks'])} chunk(s) saved)")
+    print(f"{succeeded} of {len(summary)} cities saved successfully.")
+
+
+def print_chunk_progress(city_name, start_date, end_date, rows):
+    """
+    Progress callback of ingest_cities printing every committed chunk.
+    """
+    print(f"{city_name}: {start_date} to {end_date} saved ({rows} rows)")
@@ -0,0 +1,154 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE COLUMNAR WEATHER SERIES
+##############################################################################
+import numpy as np
+
+
+############################################
+# DEFAULT LOADER SETTINGS
+############################################
+# Measures of a series and their daily_weather_entries columns
+MEASURE_COLUMNS = {
+    "min_temperature": "min_temp",
+    "max_temperature": "max_temp",
+    "mean_temperature": "mean_temp",
+    "precipitation": "precipitation",
+    "sw_radiation": "sw_radiation",
+}
+
+# Measures loaded by default. sw_radiation is left out as it only exists once phase 3 has initialized the database
+SERIES_MEASURES = ("min_temperature", "max_temperature", "mean_temperature", "precipitation")
+DEFAULT_FETCH_SIZE = 1024
+
+
+##############################################################################
+# COLUMNAR DAILY WEATHER SERIES OF A CITY
+##############################################################################
+class WeatherSeries:
+    """
+    Daily weather of a city held as NumPy columns, one value per day in date order.
+
+    Attributes:
+        dates (numpy.ndarray): datetime64[D] dates.
+        min_temperature (numpy.ndarray): float32 minimum temperatures, NaN where missing.
+        max_temperature (numpy.ndarray): float32 maximum temperatures, NaN where missing.
+        mean_temperature (numpy.ndarray): float32 mean temperatures, NaN where missing.
+        precipitation (numpy.ndarray): float32 precipitation sums, NaN where missing.
+        sw_radiation (numpy.ndarray): float32 shortwave radiation sums, or None if not loaded.
+        measures (tuple): Names of the loaded measures.
+    """
+
+    def __init__(self, dates, measure_arrays):
+        """
+        Args:
+            dates (numpy.ndarray): datetime64[D] dates.
+            measure_arrays (dict): Measure name mapped to its float32 array, of the same length as dates.
+        """
+        self.dates = dates
+        self.measures = tuple(measure_arrays)
+        for measure in MEASURE_COLUMNS:
+            setattr(self, measure, measure_arrays.get(measure))
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def empty(cls, size=0, measures=SERIES_MEASURES):
+        """
+        Returns a series of size days with unset dates and NaN measures.
+        """
+        measure_arrays = {}
+        for measure in measures:
+            measure_arrays[measure] = np.full(size, np.nan, dtype=np.float32)
+        return cls(np.empty(size, dtype="datetime64[D]"), measure_arrays)
+
+    def resize(self, size):
+        """
+        Returns a copy of the series truncated, or extended with unset dates and NaN measures, to size days.
+        """
+        resized = WeatherSeries.empty(size, self.measures)
+        kept = min(size, len(self))
+        resized.dates[:kept] = self.dates[:kept]
+        for measure in self.measures:
+            getattr(resized, measure)[:kept] = getattr(self, measure)[:kept]
+        return resized
+
+    def between(self, date_from, date_to):
+        """
+        Returns the days between date_from and date_to, both included, as views of the same arrays.
+        """
+        first = np.searchsorted(self.dates, np.datetime64(date_from, "D"), side="left")
+        last = np.searchsorted(self.dates, np.datetime64(date_to, "D"), side="right")
+        measure_arrays = {}
+        for measure in self.measures:
+            measure_arrays[measure] = getattr(self, measure)[first:last]
+        return WeatherSeries(self.dates[first:last], measure_arrays)
+
+
+def load_weather_series(connection, city_id, date_from, date_to, fetch_size=DEFAULT_FETCH_SIZE,
+                        measures=SERIES_MEASURES):
+    """
+    Loads the daily weather of a city between date_from and date_to into a WeatherSeries.
+
+    The rows are counted first so the arrays are allocated once, then streamed with fetchmany and copied
+    into the arrays one batch at a time, without building a Python object per row.
+
+    Args:
+        connection: SQLite database connection object.
+        city_id (int): ID of the city.
+        date_from (str): Start date (YYYY-MM-DD) of the range.
+        date_to (str): End date (YYYY-MM-DD) of the range, included.
+        fetch_size (int): Number of rows copied at a time.
+        measures (tuple): Names of the measures to load, keys of MEASURE_COLUMNS.
+
+    Returns:
+        WeatherSeries: The daily weather, in date order.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    range_condition = """
+        WHERE dw.city_id = ?
+          AND dw.date >= ?
+          AND dw.date < date(?, '+1 day')
+    """
+    params = (city_id, date_from, date_to)
+
+    row_count = connection.execute(f"""
+        SELECT COUNT(*) FROM [daily_weather_entries] AS dw
+        {range_condition}
+    """, params).fetchone()[0]
+    series = WeatherSeries.empty(row_count, measures)
+
+    measure_selection = ""
+    for measure in measures:
+        measure_selection += f", dw.{MEASURE_COLUMNS[measure]} AS {measure}"
+    cursor = connection.execute(f"""
+        SELECT substr(dw.date, 1, 10) AS date{measure_selection}
+        FROM [daily_weather_entries] AS dw
+        {range_condition}
+        ORDER BY dw.date
+    """, params)
+
+    filled = 0
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        if filled + len(rows) > len(series):
+            # Rows saved between the count and the select
+            series = series.resize(filled + len(rows))
+
+        columns = list(zip(*rows))
+        batch_end = filled + len(rows)
+        series.dates[filled:batch_end] = np.array(columns[0], dtype="datetime64[D]")
+        for column, measure in enumerate(measures, start=1):
+            getattr(series, measure)[filled:batch_end] = np.array(columns[column], dtype=np.float32)
+        filled = batch_end
+
+    if filled < len(series):
+        series = series.resize(filled)
+    return series
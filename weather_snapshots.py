@@ -0,0 +1,237 @@
+# Author: <Olawale Francis Onaolapo>
+#
+
+##############################################################################
+# IMPORTED LIBRARIES - FOR THE MEMORY-MAPPED WEATHER SNAPSHOTS
+##############################################################################
+import os
+import json
+import shutil
+import argparse
+import sqlite3
+import numpy as np
+from db_connections import get_connection
+from query_cache import data_generation, database_file
+from weather_series import MEASURE_COLUMNS, WeatherSeries, load_weather_series
+
+
+############################################
+# SNAPSHOT SETTINGS
+############################################
+DEFAULT_DB_PATH = "db/CIS4044-N-SDI-OPENMETEO-PARTIAL.db"
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+# Ranges of at least this number of days are read from the snapshots when they are up to date
+SNAPSHOT_MIN_DAYS = 365
+
+
+def snapshot_directory(db_path):
+    """
+    Returns the snapshot directory of a database: the "snapshots" folder next to the database file.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "snapshots")
+
+
+def read_manifest(snapshot_dir):
+    """
+    Reads the manifest of a snapshot directory.
+
+    Returns:
+        dict: The manifest, with an empty "cities" dictionary if there is no usable manifest.
+    """
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format") == SNAPSHOT_FORMAT:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"format": SNAPSHOT_FORMAT, "generation": None, "cities": {}}
+
+
+def write_manifest(snapshot_dir, manifest):
+    """
+    Replaces the manifest of a snapshot directory in one step, so readers never see a partial manifest.
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    temporary_path = f"{manifest_path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temporary_path, manifest_path)
+
+
+##############################################################################
+# FUNCTIONS TO EXPORT AND REFRESH THE SNAPSHOTS
+##############################################################################
+def export_city_snapshot(connection, snapshot_dir, city_id, generation):
+    """
+    Writes the whole daily history of a city as one .npy file per column.
+
+    Every export goes to a new folder named after the city and its generation, so the files of the
+    previous export can still be memory-mapped by readers until the manifest points to the new folder.
+
+    Args:
+        connection: SQLite database connection object.
+        snapshot_dir (str): Snapshot directory.
+        city_id (int): ID of the city.
+        generation (int): Data generation of the city (see query_cache).
+
+    Returns:
+        dict: The manifest entry of the city.
+    """
+    first_date, last_date = connection.execute("""
+    SELECT substr(MIN(date), 1, 10), substr(MAX(date), 1, 10) FROM daily_weather_entries WHERE city_id = ?;
+    """, (city_id,)).fetchone()
+    if first_date is None:
+        series = WeatherSeries.empty(0, tuple(MEASURE_COLUMNS))
+    else:
+        series = load_weather_series(connection, city_id, first_date, last_date, measures=tuple(MEASURE_COLUMNS))
+
+    city_folder = f"city_{city_id}_g{generation}"
+    city_dir = os.path.join(snapshot_dir, city_folder)
+    os.makedirs(city_dir, exist_ok=True)
+    np.save(os.path.join(city_dir, "dates.npy"), series.dates)
+    for measure in series.measures:
+        np.save(os.path.join(city_dir, f"{measure}.npy"), getattr(series, measure))
+
+    return {
+        "generation": generation,
+        "folder": city_folder,
+        "rows": len(series),
+        "first_date": str(series.dates[0]) if len(series) else None,
+        "last_date": str(series.dates[-1]) if len(series) else None,
+    }
+
+
+def refresh_snapshots(db_path, rebuild=False):
+    """
+    Exports the cities whose data changed since the last export, and removes the cities no longer stored.
+
+    Args:
+        db_path (str): Path to the SQLite database file. initialize_db must have been run on it.
+        rebuild (bool): Exports every city again.
+
+    Returns:
+        list: IDs of the exported cities.
+
+    Raises:
+        ValueError: If the database has no data_generations table.
+    """
+    connection = get_connection(db_path, read_only=True)
+    if data_generation(connection) is None:
+        raise ValueError("The database has no data generations. Run phase 3 to initialize it first.")
+
+    snapshot_dir = snapshot_directory(db_path)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = {} if rebuild else read_manifest(snapshot_dir)
+    manifest_cities = manifest.get("cities", {})
+
+    exported_cities = []
+    cities = {}
+    for row in connection.execute("SELECT id FROM cities ORDER BY id;"):
+        city_id = row[0]
+        generation = data_generation(connection, city_id)
+        city_entry = manifest_cities.get(str(city_id))
+        if (city_entry is None or city_entry["generation"] != generation
+                or not os.path.isdir(os.path.join(snapshot_dir, city_entry["folder"]))):
+            city_entry = export_city_snapshot(connection, snapshot_dir, city_id, generation)
+            exported_cities.append(city_id)
+        cities[str(city_id)] = city_entry
+
+    write_manifest(snapshot_dir, {
+        "format": SNAPSHOT_FORMAT,
+        "database": os.path.basename(db_path),
+        "generation": data_generation(connection),
+        "cities": cities,
+    })
+
+    # Remove the folders of older exports. A folder still mapped by a reader may not be removable yet
+    used_folders = {city_entry["folder"] for city_entry in cities.values()}
+    for folder in os.listdir(snapshot_dir):
+        if folder.startswith("city_") and folder not in used_folders:
+            shutil.rmtree(os.path.join(snapshot_dir, folder), ignore_errors=True)
+
+    return exported_cities
+
+
+##############################################################################
+# FUNCTIONS TO READ THE SNAPSHOTS
+##############################################################################
+def load_snapshot_series(connection, city_id, date_from, date_to):
+    """
+    Reads the daily weather of a city from its memory-mapped snapshot, without copying the data.
+
+    Args:
+        connection: SQLite database connection object, used to check that the snapshot is up to date.
+        city_id (int): ID of the city.
+        date_from (str): Start date (YYYY-MM-DD) of the range.
+        date_to (str): End date (YYYY-MM-DD) of the range, included.
+
+    Returns:
+        WeatherSeries: Views over the memory-mapped columns, or None if the city has no up-to-date snapshot.
+    """
+    snapshot_dir = snapshot_directory(database_file(connection))
+    city_entry = read_manifest(snapshot_dir)["cities"].get(str(city_id))
+    if city_entry is None or city_entry["generation"] != data_generation(connection, city_id):
+        return None
+
+    city_dir = os.path.join(snapshot_dir, city_entry["folder"])
+    try:
+        dates = np.load(os.path.join(city_dir, "dates.npy"), mmap_mode="r")
+        measure_arrays = {}
+        for measure in MEASURE_COLUMNS:
+            measure_arrays[measure] = np.load(os.path.join(city_dir, f"{measure}.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    return WeatherSeries(dates, measure_arrays).between(date_from, date_to)
+
+
+def load_city_series(connection, city_id, date_from, date_to):
+    """
+    Loads the daily weather of a city, from its snapshot for ranges of at least SNAPSHOT_MIN_DAYS days
+    when the snapshot is up to date, and from the database otherwise.
+
+    Returns:
+        WeatherSeries: The daily weather, in date order.
+
+    Raises:
+        sqlite3.OperationalError: If a database query error occurs.
+    """
+    range_days = (np.datetime64(date_to, "D") - np.datetime64(date_from, "D")).astype(int) + 1
+    if range_days >= SNAPSHOT_MIN_DAYS:
+        series = load_snapshot_series(connection, city_id, date_from, date_to)
+        if series is not None:
+            return series
+    return load_weather_series(connection, city_id, date_from, date_to)
+
+
+#################################################################
+# SNAPSHOT EXPORT COMMAND - REFERENCED AS MAIN
+#################################################################
+def main():
+    """
+    Exports, or refreshes, the snapshots of the cities whose data changed since the last export.
+
+    A --db path is relative to the current working directory, and the default database is found next to
+    this script.
+    """
+    parser = argparse.ArgumentParser(description="Export the daily weather of every city to memory-mapped .npy files.")
+    parser.add_argument("--db", help=f"path to the SQLite database (default: {DEFAULT_DB_PATH} next to this script)")
+    parser.add_argument("--rebuild", action="store_true", help="export every city again")
+    args = parser.parse_args()
+
+    if args.db is None:
+        db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_DB_PATH)
+    else:
+        db_path = os.path.abspath(args.db)
+
+    try:
+        exported_cities = refresh_snapshots(db_path, rebuild=args.rebuild)
+        print(f"{len(exported_cities)} city snapshot(s) exported to {snapshot_directory(db_path)}.")
+    except (sqlite3.Error, ValueError, OSError) as ex:
+        print(f"The snapshots could not be exported: {ex}")
+
+
+if __name__ == "__main__":
+    main()